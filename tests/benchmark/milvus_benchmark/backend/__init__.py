@@ -0,0 +1,21 @@
+import logging
+import functools
+
+logger = logging.getLogger("milvus_benchmark.backend")
+
+BACKENDS = ["milvus", "local"]
+
+
+def get_backend(backend_name, latency=None):
+    """
+    Return the constructor of the client used by MilvusClient:
+    milvus: pymilvus Milvus, connected to the deployed server
+    local: in-process LocalMilvus, for developing runners without a cluster
+    """
+    if backend_name == "milvus":
+        from pymilvus import Milvus
+        return Milvus
+    elif backend_name == "local":
+        from .local import LocalMilvus
+        return functools.partial(LocalMilvus, latency=latency)
+    raise Exception("Backend: %s not supported" % backend_name)
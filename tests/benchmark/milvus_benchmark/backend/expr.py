@@ -0,0 +1,143 @@
+import re
+import numpy as np
+
+# numbers, identifiers, operators and punctuation of the boolean expressions used by search/query/delete
+TOKEN_PATTERN = re.compile(r"\s*(?:(\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)"
+                           r"|([A-Za-z_]\w*)|(&&|\|\||==|!=|>=|<=|[<>()\[\],!\-]))")
+COMPARE_OPS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal
+}
+
+
+def tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = TOKEN_PATTERN.match(expression, pos)
+        if not match or match.end() == pos:
+            raise Exception("Invalid expression: %s, at: %d" % (expression, pos))
+        number, name, op = match.groups()
+        if number is not None:
+            tokens.append(("number", float(number) if any(c in number for c in ".eE") else int(number)))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", op))
+        pos = match.end()
+    return tokens
+
+
+class ExprEvaluator(object):
+    """
+    Evaluate a boolean expression on the columns of a collection and return the row mask, supports:
+    comparisons (a > 1, 1 < a <= 5), term (a in [1, 2], a not in [3]), && / and, || / or, ! / not, parentheses
+    """
+
+    def __init__(self, expression, columns):
+        self._tokens = tokenize(expression)
+        self._pos = 0
+        self._columns = columns
+        self._rows = len(next(iter(columns.values()))) if columns else 0
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self._pos += 1
+        return token
+
+    def _expect(self, value):
+        kind, token = self._next()
+        if token != value:
+            raise Exception("Invalid expression, expect: %s, got: %s" % (value, token))
+
+    def evaluate(self):
+        mask = self._or()
+        if self._pos != len(self._tokens):
+            raise Exception("Invalid expression, unexpected token: %s" % str(self._peek()[1]))
+        return np.broadcast_to(mask, (self._rows,)).copy()
+
+    def _or(self):
+        mask = self._and()
+        while self._peek()[1] in ["||", "or"]:
+            self._next()
+            mask = np.logical_or(mask, self._and())
+        return mask
+
+    def _and(self):
+        mask = self._unary()
+        while self._peek()[1] in ["&&", "and"]:
+            self._next()
+            mask = np.logical_and(mask, self._unary())
+        return mask
+
+    def _unary(self):
+        if self._peek()[1] in ["!", "not"]:
+            self._next()
+            return np.logical_not(self._unary())
+        if self._peek()[1] == "(":
+            self._next()
+            mask = self._or()
+            self._expect(")")
+            return mask
+        return self._comparison()
+
+    def _operand(self):
+        kind, token = self._next()
+        if kind == "number":
+            return token
+        if token == "-":
+            kind, token = self._next()
+            if kind != "number":
+                raise Exception("Invalid expression, number expected after -")
+            return -token
+        if kind == "name":
+            if token not in self._columns:
+                raise Exception("Field: %s not existed" % token)
+            return self._columns[token]
+        raise Exception("Invalid expression, unexpected token: %s" % str(token))
+
+    def _list(self):
+        self._expect("[")
+        values = []
+        while self._peek()[1] != "]":
+            values.append(self._operand())
+            if self._peek()[1] == ",":
+                self._next()
+        self._expect("]")
+        return values
+
+    def _comparison(self):
+        left = self._operand()
+        negate = False
+        if self._peek()[1] == "not":
+            self._next()
+            negate = True
+            if self._peek()[1] != "in":
+                raise Exception("Invalid expression, in expected after not")
+        if self._peek()[1] == "in":
+            self._next()
+            mask = np.isin(left, self._list())
+            return np.logical_not(mask) if negate else mask
+        mask = None
+        while self._peek()[1] in COMPARE_OPS:
+            op = self._next()[1]
+            right = self._operand()
+            current = COMPARE_OPS[op](left, right)
+            mask = current if mask is None else np.logical_and(mask, current)
+            left = right
+        if mask is None:
+            raise Exception("Invalid expression, comparison expected")
+        return mask
+
+
+def evaluate(expression, columns):
+    """ Return the boolean row mask of the expression on the columns: {field name: array} """
+    return ExprEvaluator(expression, columns).evaluate()
@@ -0,0 +1,537 @@
+import os
+import time
+import copy
+import json
+import socket
+import logging
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pymilvus import DataType
+
+from milvus_benchmark.backend.expr import evaluate as evaluate_expr
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger("milvus_benchmark.backend.local")
+
+DEFAULT_PARTITION_NAME = "_default"
+VECTOR_TYPES = [DataType.FLOAT_VECTOR, DataType.BINARY_VECTOR]
+ASYNC_WORKERS = 16
+
+# collections are shared by all the clients of the process, like they are on a server
+_collections = dict()
+_lock = threading.RLock()
+_compaction_ids = itertools.count(1)
+# the _async searches are served concurrently, like by the query nodes
+_executor = ThreadPoolExecutor(max_workers=ASYNC_WORKERS)
+
+
+class LocalFuture(object):
+    """ Result of the _async calls, the call is already finished when the future is returned """
+
+    def __init__(self, value, callback=None):
+        self._value = value
+        if callback:
+            callback(value)
+
+    def result(self, **kwargs):
+        return self._value
+
+    def done(self):
+        return True
+
+    def cancel(self):
+        return False
+
+
+class LocalAsyncFuture(object):
+    """ Result of the _async searches, run on the executor of the backend like on a server """
+
+    def __init__(self, future, callback=None):
+        self._future = future
+        if callback:
+            future.add_done_callback(lambda f: callback(f.result()) if f.exception() is None else None)
+
+    def result(self, **kwargs):
+        return self._future.result()
+
+    def done(self):
+        return self._future.done()
+
+    def cancel(self):
+        return self._future.cancel()
+
+
+class LocalMutationResult(object):
+    def __init__(self, primary_keys, insert_count=0, delete_count=0):
+        self.primary_keys = primary_keys
+        self.insert_count = insert_count
+        self.delete_count = delete_count
+
+
+class LocalHits(object):
+    def __init__(self, ids, distances):
+        self.ids = ids
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class LocalSearchResult(list):
+    """ Same access pattern as the pymilvus search result: iterate on the hits of every query """
+
+    def __init__(self, hits, top_k, id_array=None, distance_array=None):
+        super(LocalSearchResult, self).__init__(hits)
+        self._nq = len(hits)
+        self._topk = top_k
+        # (nq, k) arrays of the hits, read by runners.results without walking the hits
+        self.id_array = id_array
+        self.distance_array = distance_array
+
+
+class LocalCompactionState(object):
+    def __init__(self, compaction_id):
+        self.compaction_id = compaction_id
+        self.state = "Completed"
+        self.in_executing = 0
+        self.in_timeout = 0
+        self.completed = 1
+
+
+class LocalStatus(object):
+    def __init__(self, error_code=0, reason=""):
+        self.error_code = error_code
+        self.reason = reason
+
+
+class LocalMetricsResponse(object):
+    """ GetMetrics response: json string of the metrics """
+    def __init__(self, response, error_code=0, reason=""):
+        self.status = LocalStatus(error_code, reason)
+        self.response = response
+
+
+def _process_memory():
+    """ Resident memory of the process in bytes """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_cpu_times = [time.time(), sum(os.times()[:2])]
+
+
+def _process_cpu_usage():
+    """ Cpu usage of the process since the previous call, in percent of the cores """
+    with _lock:
+        now, cpu = time.time(), sum(os.times()[:2])
+        elapsed = now - _cpu_times[0]
+        usage = (cpu - _cpu_times[1]) / elapsed / (os.cpu_count() or 1) * 100 if elapsed > 0 else 0.0
+        _cpu_times[0], _cpu_times[1] = now, cpu
+    return round(usage, 2)
+
+
+class LocalCollection(object):
+    def __init__(self, name, fields, auto_id=False):
+        self.name = name
+        self.fields = fields
+        self.auto_id = auto_id
+        self.partitions = [DEFAULT_PARTITION_NAME]
+        self.loaded = False
+        self.index = dict()
+        self._chunks = []
+        self._columns = None
+        self._deleted = set()
+        self._next_id = 0
+
+    @property
+    def primary_field(self):
+        for field in self.fields:
+            if field.get("is_primary"):
+                return field["name"]
+        raise Exception("Primary field not found in collection: %s" % self.name)
+
+    @property
+    def row_count(self):
+        return sum([len(chunk[self.primary_field]) for chunk in self._chunks])
+
+    def field(self, name):
+        for field in self.fields:
+            if field["name"] == name:
+                return field
+        raise Exception("Field: %s not existed in collection: %s" % (name, self.name))
+
+    def insert(self, entities, partition_name):
+        if partition_name not in self.partitions:
+            raise Exception("Partition: %s not existed in collection: %s" % (partition_name, self.name))
+        chunk = dict()
+        rows = None
+        for entity in entities:
+            field = self.field(entity["name"])
+            values = entity["values"]
+            if field["type"] == DataType.BINARY_VECTOR:
+                values = np.frombuffer(b"".join(values), dtype=np.uint8).reshape(len(values), -1)
+            elif field["type"] == DataType.FLOAT_VECTOR:
+                values = np.array(values, dtype=np.float32)
+            elif field["type"] in [DataType.FLOAT, DataType.DOUBLE]:
+                values = np.array(values, dtype=np.float64)
+            else:
+                values = np.array(values, dtype=np.int64)
+            if rows is not None and rows != len(values):
+                raise Exception("row num of all fields is not different")
+            rows = len(values)
+            chunk[field["name"]] = values
+        primary_field = self.primary_field
+        if self.auto_id:
+            chunk[primary_field] = np.arange(self._next_id, self._next_id + rows, dtype=np.int64)
+            self._next_id += rows
+        if primary_field not in chunk:
+            raise Exception("Primary field: %s should be given" % primary_field)
+        chunk["_partition"] = np.full(rows, self.partitions.index(partition_name), dtype=np.int32)
+        self._chunks.append(chunk)
+        self._columns = None
+        return chunk[primary_field].tolist()
+
+    def columns(self, partition_names=None):
+        """ All the not deleted rows of the collection as {field name: array} """
+        if self._columns is None:
+            if not self._chunks:
+                self._columns = {field["name"]: np.array([]) for field in self.fields}
+                self._columns["_partition"] = np.array([], dtype=np.int32)
+            else:
+                self._columns = {name: np.concatenate([chunk[name] for chunk in self._chunks])
+                                 for name in self._chunks[0]}
+                if self._deleted:
+                    alive = ~np.isin(self._columns[self.primary_field], list(self._deleted))
+                    self._columns = {name: values[alive] for name, values in self._columns.items()}
+        if not partition_names:
+            return self._columns
+        partitions = [self.partitions.index(name) for name in partition_names if name in self.partitions]
+        mask = np.isin(self._columns["_partition"], partitions)
+        return {name: values[mask] for name, values in self._columns.items()}
+
+    def delete(self, expression, partition_name=None):
+        columns = self.columns([partition_name] if partition_name else None)
+        mask = evaluate_expr(expression, columns)
+        ids = columns[self.primary_field][mask].tolist()
+        self._deleted.update(ids)
+        self._columns = None
+        return ids
+
+    def compact(self):
+        """ Physically remove the deleted rows """
+        if not self._deleted:
+            return
+        columns = self.columns()
+        self._chunks = [{name: values.copy() for name, values in columns.items()}] if len(columns["_partition"]) else []
+        self._deleted = set()
+        self._columns = None
+
+
+def _distances(query, base, metric_type):
+    """ Distances of every query to every base vector, sorted ascending is closer for every metric """
+    metric_type = metric_type.upper()
+    if metric_type in ["HAMMING", "JACCARD", "TANIMOTO"]:
+        query = np.unpackbits(query, axis=1).astype(np.float32)
+        base = np.unpackbits(base, axis=1).astype(np.float32)
+        dot = query @ base.T
+        union = query.sum(axis=1)[:, None] + base.sum(axis=1)[None, :]
+        if metric_type == "HAMMING":
+            return union - 2 * dot
+        union = union - dot
+        return 1 - np.divide(dot, union, out=np.ones_like(dot), where=union > 0)
+    dot = query @ base.T
+    if metric_type == "IP":
+        return -dot
+    return np.maximum((query ** 2).sum(axis=1)[:, None] - 2 * dot + (base ** 2).sum(axis=1)[None, :], 0)
+
+
+class LocalMilvus(object):
+    """
+    In-process stand-in of the pymilvus Milvus client used by MilvusClient:
+    the entities are kept in numpy arrays, search is exact (numpy or faiss IndexFlat) whatever the index,
+    and every call sleeps for the configured artificial latency
+    latency: seconds added to every call, or a dict of {call name: seconds} with an optional "default" key
+    """
+
+    def __init__(self, host=None, port=None, latency=None, **kwargs):
+        self._host = host
+        self._port = port
+        if isinstance(latency, dict):
+            self._latency = latency
+        else:
+            self._latency = {"default": float(latency) if latency else 0.0}
+        logger.debug("Local backend connected, host: %s, port: %s" % (host, port))
+
+    def _sleep(self, call):
+        latency = self._latency[call] if call in self._latency else self._latency.get("default", 0.0)
+        if latency:
+            time.sleep(latency)
+
+    def _get(self, collection_name):
+        if collection_name not in _collections:
+            raise Exception("Collection: %s not existed" % collection_name)
+        return _collections[collection_name]
+
+    def create_collection(self, collection_name, fields, timeout=None, **kwargs):
+        self._sleep("create_collection")
+        with _lock:
+            if collection_name in _collections:
+                raise Exception("Collection: %s already existed" % collection_name)
+            auto_id = fields["auto_id"] if "auto_id" in fields else False
+            schema = []
+            for i, field in enumerate(fields["fields"]):
+                field = copy.deepcopy(field)
+                field.setdefault("params", {})
+                field["field_id"] = 100 + i
+                schema.append(field)
+            _collections[collection_name] = LocalCollection(collection_name, schema, auto_id=auto_id)
+
+    def has_collection(self, collection_name, timeout=None, **kwargs):
+        self._sleep("has_collection")
+        return collection_name in _collections
+
+    def drop_collection(self, collection_name, timeout=None, **kwargs):
+        self._sleep("drop_collection")
+        with _lock:
+            self._get(collection_name)
+            del _collections[collection_name]
+
+    def list_collections(self, timeout=None, **kwargs):
+        self._sleep("list_collections")
+        return list(_collections.keys())
+
+    def describe_collection(self, collection_name, timeout=None, **kwargs):
+        self._sleep("describe_collection")
+        collection = self._get(collection_name)
+        return {
+            "collection_name": collection_name,
+            "auto_id": collection.auto_id,
+            "description": "",
+            "fields": copy.deepcopy(collection.fields)
+        }
+
+    def get_collection_stats(self, collection_name, timeout=None, **kwargs):
+        self._sleep("get_collection_stats")
+        with _lock:
+            return {"row_count": self._get(collection_name).row_count}
+
+    def create_partition(self, collection_name, partition_name, timeout=None, **kwargs):
+        self._sleep("create_partition")
+        with _lock:
+            collection = self._get(collection_name)
+            if partition_name in collection.partitions:
+                raise Exception("Partition: %s already existed" % partition_name)
+            collection.partitions.append(partition_name)
+
+    def has_partition(self, collection_name, partition_name, timeout=None, **kwargs):
+        self._sleep("has_partition")
+        return partition_name in self._get(collection_name).partitions
+
+    def list_partitions(self, collection_name, timeout=None, **kwargs):
+        self._sleep("list_partitions")
+        return list(self._get(collection_name).partitions)
+
+    def insert(self, collection_name, entities, partition_name=None, timeout=None, **kwargs):
+        self._sleep("insert")
+        with _lock:
+            ids = self._get(collection_name).insert(entities, partition_name or DEFAULT_PARTITION_NAME)
+        return LocalMutationResult(ids, insert_count=len(ids))
+
+    def delete(self, collection_name, expr, partition_name=None, timeout=None, **kwargs):
+        self._sleep("delete")
+        with _lock:
+            ids = self._get(collection_name).delete(expr, partition_name)
+        return LocalMutationResult(ids, delete_count=len(ids))
+
+    def flush(self, collection_names=None, timeout=None, _async=False, **kwargs):
+        self._sleep("flush")
+        for collection_name in collection_names or []:
+            self._get(collection_name)
+        return LocalFuture(None) if _async else None
+
+    def compact(self, collection_name, timeout=None, **kwargs):
+        self._sleep("compact")
+        with _lock:
+            self._get(collection_name).compact()
+        return next(_compaction_ids)
+
+    def get_compaction_state(self, compaction_id, timeout=None, **kwargs):
+        self._sleep("get_compaction_state")
+        return LocalCompactionState(compaction_id)
+
+    def wait_for_compaction_completed(self, compaction_id, timeout=None, **kwargs):
+        return self.get_compaction_state(compaction_id)
+
+    def create_index(self, collection_name, field_name, params, timeout=None, _async=False, _callback=None, **kwargs):
+        self._sleep("create_index")
+        with _lock:
+            collection = self._get(collection_name)
+            if collection.field(field_name)["type"] not in VECTOR_TYPES:
+                raise Exception("Index could only be created on vector field: %s" % field_name)
+            collection.index[field_name] = copy.deepcopy(params)
+        if _async:
+            return LocalFuture(True, _callback)
+        return True
+
+    def describe_index(self, collection_name, field_name=None, timeout=None, **kwargs):
+        self._sleep("describe_index")
+        collection = self._get(collection_name)
+        if field_name is None and collection.index:
+            field_name = list(collection.index.keys())[0]
+        if field_name not in collection.index:
+            return None
+        index = collection.index[field_name]
+        return {
+            "index_type": index["index_type"],
+            "metric_type": index["metric_type"],
+            "params": index["params"] if "params" in index else None,
+            "field_name": field_name
+        }
+
+    def drop_index(self, collection_name, field_name, timeout=None, **kwargs):
+        self._sleep("drop_index")
+        with _lock:
+            self._get(collection_name).index.pop(field_name, None)
+
+    def get_index_build_progress(self, collection_name, index_name=None, timeout=None, **kwargs):
+        self._sleep("get_index_build_progress")
+        row_count = self._get(collection_name).row_count
+        return {"total_rows": row_count, "indexed_rows": row_count}
+
+    def wait_for_creating_index(self, collection_name, index_name=None, timeout=None, **kwargs):
+        return True, ""
+
+    def load_collection(self, collection_name, timeout=None, _async=False, **kwargs):
+        self._sleep("load_collection")
+        self._get(collection_name).loaded = True
+        return LocalFuture(None) if _async else None
+
+    def release_collection(self, collection_name, timeout=None, **kwargs):
+        self._sleep("release_collection")
+        self._get(collection_name).loaded = False
+
+    def load_partitions(self, collection_name, partition_names, timeout=None, _async=False, **kwargs):
+        self._sleep("load_partitions")
+        collection = self._get(collection_name)
+        for partition_name in partition_names:
+            if partition_name not in collection.partitions:
+                raise Exception("Partition: %s not existed" % partition_name)
+        collection.loaded = True
+        return LocalFuture(None) if _async else None
+
+    def release_partitions(self, collection_name, partition_names, timeout=None, **kwargs):
+        self._sleep("release_partitions")
+        self._get(collection_name).loaded = False
+
+    def load_collection_progress(self, collection_name, timeout=None, **kwargs):
+        self._sleep("load_collection_progress")
+        collection = self._get(collection_name)
+        row_count = collection.row_count
+        return {"num_loaded_entities": row_count if collection.loaded else 0, "num_total_entities": row_count}
+
+    def load_partitions_progress(self, collection_name, partition_names, timeout=None, **kwargs):
+        self._sleep("load_partitions_progress")
+        collection = self._get(collection_name)
+        row_count = len(collection.columns(partition_names)["_partition"])
+        return {"num_loaded_entities": row_count if collection.loaded else 0, "num_total_entities": row_count}
+
+    def search(self, collection_name, data, anns_field, param, limit, expression=None, partition_names=None,
+               output_fields=None, timeout=None, round_decimal=-1, _async=False, _callback=None, **kwargs):
+        if _async:
+            future = _executor.submit(self.search, collection_name, data, anns_field, param, limit,
+                                      expression=expression, partition_names=partition_names,
+                                      output_fields=output_fields, round_decimal=round_decimal)
+            return LocalAsyncFuture(future, _callback)
+        self._sleep("search")
+        with _lock:
+            collection = self._get(collection_name)
+            if not collection.loaded:
+                raise Exception("Collection: %s not loaded into memory" % collection_name)
+            field = collection.field(anns_field)
+            columns = collection.columns(partition_names)
+        ids = columns[collection.primary_field]
+        base = columns[anns_field] if anns_field in columns else np.zeros((0, 0))
+        if expression:
+            mask = evaluate_expr(expression, columns)
+            ids, base = ids[mask], base[mask]
+        if field["type"] == DataType.BINARY_VECTOR:
+            if len(data) and isinstance(data[0], bytes):
+                query = np.frombuffer(b"".join(data), dtype=np.uint8).reshape(len(data), -1)
+            else:
+                query = np.array(data, dtype=np.uint8)
+        else:
+            query = np.array(data, dtype=np.float32)
+        metric_type = param["metric_type"] if "metric_type" in param else "L2"
+        k = min(limit, len(ids))
+        if not k:
+            id_array = np.zeros((len(query), 0), dtype=np.int64)
+            dist = np.zeros((len(query), 0), dtype=np.float32)
+        else:
+            if faiss is not None and metric_type.upper() in ["L2", "IP"] and field["type"] == DataType.FLOAT_VECTOR:
+                index = faiss.IndexFlatL2(base.shape[1]) if metric_type.upper() == "L2" else faiss.IndexFlatIP(base.shape[1])
+                index.add(np.ascontiguousarray(base))
+                dist, pos = index.search(query, k)
+                dist = dist if metric_type.upper() == "L2" else -dist
+            else:
+                dist = _distances(query, base, metric_type)
+                pos = np.argsort(dist, axis=1, kind="stable")[:, :k]
+                dist = np.take_along_axis(dist, pos, axis=1)
+            if metric_type.upper() == "IP":
+                dist = -dist
+            if round_decimal != -1:
+                dist = np.round(dist, round_decimal)
+            id_array = ids[pos].astype(np.int64, copy=False)
+            dist = dist.astype(np.float32, copy=False)
+        hits = [LocalHits(id_array[i].tolist(), dist[i].tolist()) for i in range(len(query))]
+        return LocalSearchResult(hits, limit, id_array=id_array, distance_array=dist)
+
+    def query(self, collection_name, expr, output_fields=None, partition_names=None, timeout=None, **kwargs):
+        self._sleep("query")
+        with _lock:
+            collection = self._get(collection_name)
+            if not collection.loaded:
+                raise Exception("Collection: %s not loaded into memory" % collection_name)
+            columns = collection.columns(partition_names)
+        mask = evaluate_expr(expr, columns)
+        fields = [collection.primary_field] + [name for name in (output_fields or []) if name != collection.primary_field]
+        selected = {name: columns[name][mask] for name in fields}
+        return [{name: (selected[name][i].tolist()) for name in fields} for i in range(int(mask.sum()))]
+
+    def close(self):
+        """ The collections are kept by the process, nothing to release """
+        pass
+
+    def get_metrics(self, request, timeout=None, **kwargs):
+        """ The process is reported as the single standalone node, only system_info is served """
+        self._sleep("get_metrics")
+        metric_type = json.loads(request)["metric_type"]
+        if metric_type != "system_info":
+            return LocalMetricsResponse("", error_code=1, reason="metric type %s not supported" % metric_type)
+        node = {
+            "identifier": 1,
+            "infos": {
+                "has_error": False,
+                "name": "local1",
+                "type": "Standalone",
+                "id": 1,
+                "hardware_infos": {
+                    "ip": socket.gethostname(),
+                    "cpu_core_count": os.cpu_count(),
+                    "cpu_core_usage": _process_cpu_usage(),
+                    "memory": os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"),
+                    "memory_usage": _process_memory()
+                },
+                "system_info": {"deploy_mode": "local", "system_version": "local"}
+            }
+        }
+        return LocalMetricsResponse(json.dumps({"nodes_info": [node]}))
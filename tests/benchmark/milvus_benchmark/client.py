@@ -1,12 +1,17 @@
+import json
 import random
 import logging
 import time
 import traceback
 from multiprocessing import Process
-from pymilvus import Milvus, DataType
+from pymilvus import DataType
 import utils as util
 import config
 from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import results
+from milvus_benchmark.runners import breakdown
+from milvus_benchmark.backend import get_backend
+from logs.log import global_params
 
 logger = logging.getLogger("milvus_benchmark.client")
 
@@ -29,6 +34,10 @@ INDEX_MAP = {
 epsilon = 0.1
 DEFAULT_WARM_QUERY_TOPK = 1
 DEFAULT_WARM_QUERY_NQ = 1
+COMPACTION_TIMEOUT = 1800
+COMPACTION_POLL_INTERVAL = 1
+# the name of the index created by create_index
+DEFAULT_INDEX_NAME = "_default_idx"
 
 
 def time_wrapper(func):
@@ -72,7 +81,7 @@ class MilvusClient(object):
         i = 0
         while time.time() < start_time + timeout:
             try:
-                self._milvus = Milvus(
+                self._milvus = get_backend(global_params.backend, global_params.backend_latency)(
                     host=host,
                     port=port,
                     try_connect=False,
@@ -153,10 +162,12 @@ class MilvusClient(object):
         self._milvus.create_partition(collection_name, tag)
 
     @time_wrapper
-    def insert(self, entities, collection_name=None, timeout=None):
+    def insert(self, entities, collection_name=None, partition_name=None, timeout=None):
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
         try:
-            insert_res = self._milvus.insert(tmp_collection_name, entities, timeout=timeout)
+            with breakdown.timer("insert", breakdown.TOTAL):
+                insert_res = self._milvus.insert(tmp_collection_name, entities, partition_name=partition_name,
+                                                 timeout=timeout)
             return insert_res.primary_keys
         except Exception as e:
             logger.error(str(e))
@@ -223,10 +234,14 @@ class MilvusClient(object):
         return get_res
 
     @time_wrapper
-    def delete(self, ids, collection_name=None):
-        # delete entity by id
+    def delete(self, ids, collection_name=None, partition_name=None, timeout=None):
+        # delete entity by the primary key expression, return the count of the deleted entities
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
-        self._milvus.delete_entity_by_id(tmp_collection_name, ids)
+        ids_expr = "id in %s" % str([int(_id) for _id in ids])
+        with breakdown.timer("delete", breakdown.TOTAL):
+            delete_res = self._milvus.delete(tmp_collection_name, ids_expr, partition_name=partition_name,
+                                             timeout=timeout)
+        return delete_res.delete_count
 
     def delete_rand(self):
         delete_id_length = random.randint(1, 100)
@@ -249,10 +264,36 @@ class MilvusClient(object):
         self._milvus.flush([tmp_collection_name], _async=_async, timeout=timeout)
 
     @time_wrapper
-    def compact(self, collection_name=None):
+    def compact(self, collection_name=None, timeout=None):
+        # trigger the compaction, return the compaction id
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
-        status = self._milvus.compact(tmp_collection_name)
-        self.check_status(status)
+        return self._milvus.compact(tmp_collection_name, timeout=timeout)
+
+    def get_compaction_state(self, compaction_id, timeout=None):
+        """ Return {"state", "executing", "timeout", "completed"} of the compaction """
+        res = self._milvus.get_compaction_state(compaction_id, timeout=timeout)
+        return {
+            "state": getattr(res.state, "name", str(res.state)),
+            "executing": res.in_executing,
+            "timeout": res.in_timeout,
+            "completed": res.completed
+        }
+
+    def wait_for_compaction(self, compaction_id, timeout=COMPACTION_TIMEOUT, interval=COMPACTION_POLL_INTERVAL):
+        """ Poll the compaction state until it is completed, return the last state and the polls """
+        start_time = time.time()
+        polls = 0
+        while True:
+            state = self.get_compaction_state(compaction_id)
+            polls += 1
+            if state["state"] == "Completed":
+                break
+            if time.time() - start_time > timeout:
+                raise Exception("Compaction: %s not completed in %ss, state: %s" % (
+                    str(compaction_id), str(timeout), json.dumps(state)))
+            time.sleep(interval)
+        state["polls"] = polls
+        return state
 
     # only support "in" in expr
     @time_wrapper
@@ -276,7 +317,14 @@ class MilvusClient(object):
             "metric_type": metric_type,
             "params": index_param
         }
-        self._milvus.create_index(self._collection_name, field_name, index_params, _async=_async)
+        # the future of the build is returned if _async
+        return self._milvus.create_index(self._collection_name, field_name, index_params, _async=_async)
+
+    def index_progress(self, index_name=DEFAULT_INDEX_NAME, collection_name=None, timeout=30):
+        """ Return (indexed_rows, total_rows) of the index being built """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        res = self._milvus.get_index_build_progress(tmp_collection_name, index_name, timeout=timeout)
+        return int(res["indexed_rows"]), int(res["total_rows"])
 
     # TODO: need to check
     def describe_index(self, field_name, collection_name=None):
@@ -298,18 +346,26 @@ class MilvusClient(object):
         return self._milvus.drop_index(self._collection_name, field_name)
 
     @time_wrapper
-    def query(self, vector_query, filter_query=None, collection_name=None, guarantee_timestamp=None, timeout=300):
-        """ This method corresponds to the search method of milvus """
+    def query(self, vector_query, filter_query=None, collection_name=None, guarantee_timestamp=None, timeout=300,
+              search_params=None):
+        """
+        This method corresponds to the search method of milvus
+        search_params: output of search_param_analysis built in advance, vector_query and filter_query are ignored
+        """
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
 
-        params = util.search_param_analysis(vector_query, filter_query)
-        params.update({"timeout": timeout})
+        with breakdown.timer("search", breakdown.TOTAL):
+            if search_params is not None:
+                params = dict(search_params)
+            else:
+                params = util.search_param_analysis(vector_query, filter_query)
+            params.update({"timeout": timeout})
 
-        if guarantee_timestamp is not None:
-            params.update({"guarantee_timestamp": guarantee_timestamp})
+            if guarantee_timestamp is not None:
+                params.update({"guarantee_timestamp": guarantee_timestamp})
 
-        # logger.debug("Params of search : %s" % str(params))
-        result = self._milvus.search(tmp_collection_name, **params)
+            # logger.debug("Params of search : %s" % str(params))
+            result = self._milvus.search(tmp_collection_name, **params)
 
         # must_params = [vector_query]
         # if filter_query:
@@ -320,6 +376,19 @@ class MilvusClient(object):
         # result = self._milvus.search(tmp_collection_name, query, timeout=timeout)
         return result
 
+    def query_async(self, vector_query, filter_query=None, collection_name=None, guarantee_timestamp=None,
+                    timeout=300, _callback=None):
+        """ Non-blocking search, return the future of the result, _callback is called with the result when done """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+
+        params = util.search_param_analysis(vector_query, filter_query)
+        params.update({"timeout": timeout, "_async": True})
+        if _callback is not None:
+            params.update({"_callback": _callback})
+        if guarantee_timestamp is not None:
+            params.update({"guarantee_timestamp": guarantee_timestamp})
+        return self._milvus.search(tmp_collection_name, **params)
+
     @time_wrapper
     def warm_query(self, index_field_name, search_param, metric_type, times=2):
         query_vectors = [[random.random() for _ in range(self._dimension)] for _ in range(DEFAULT_WARM_QUERY_NQ)]
@@ -358,17 +427,15 @@ class MilvusClient(object):
         # result = self._milvus.search(tmp_collection_name, query, timeout=timeout)
         return result
 
-    def get_ids(self, result):
-        # idss = result._entities.ids
-        ids = []
-        # len_idss = len(idss)
-        # len_r = len(result)
-        # top_k = len_idss // len_r
-        # for offset in range(0, len_idss, top_k):
-        #     ids.append(idss[offset: min(offset + top_k, len_idss)])
-        for res in result:
-            ids.append(res.ids)
-        return ids
+    def get_result_arrays(self, result, k=None):
+        """ Return the (nq, k) int64 ids and float32 distances of a search result, see runners.results """
+        return results.result_arrays(result, k)
+
+    def get_ids(self, result, k=None):
+        return results.result_arrays(result, k)[0]
+
+    def get_distances(self, result, k=None):
+        return results.result_arrays(result, k)[1]
 
     def query_rand(self, nq_max=100, timeout=None):
         # for ivf search
@@ -447,6 +514,21 @@ class MilvusClient(object):
     def get_stats(self):
         return self._milvus.get_collection_stats(self._collection_name)
 
+    def get_metrics(self, metric_type="system_info", timeout=30):
+        """ Return the parsed GetMetrics response of the metric_type: system_info/system_statistics/system_logs """
+        request = json.dumps({"metric_type": metric_type})
+        if hasattr(self._milvus, "get_metrics"):
+            # the local backend serves the metrics of its own process
+            response = self._milvus.get_metrics(request, timeout=timeout)
+        else:
+            # the metrics are only served by the stub, like MilvusSys of the python_client
+            from pymilvus.grpc_gen import milvus_pb2 as milvus_types
+            with self._milvus._connection() as handler:
+                response = handler._stub.GetMetrics(milvus_types.GetMetricsRequest(request=request), timeout=timeout)
+        if response.status.error_code != 0:
+            raise Exception("Get metrics: %s failed: %s" % (metric_type, response.status.reason))
+        return json.loads(response.response)
+
     def get_info(self, collection_name=None):
         if collection_name is None:
             collection_name = self._collection_name
@@ -461,15 +543,24 @@ class MilvusClient(object):
         res = self._milvus.has_collection(collection_name)
         return res
 
+    def close(self):
+        """ Close the channel of the connection, the client can not be used after """
+        try:
+            self._milvus.close()
+        except Exception as e:
+            logger.warning("Close connection failed: %s" % str(e))
+
     def clean_db(self):
         collection_names = self.show_collections()
         for name in collection_names:
             self.drop(collection_name=name)
 
     @time_wrapper
-    def load_collection(self, collection_name=None, timeout=3000):
+    def load_collection(self, collection_name=None, timeout=3000, _async=False):
         if collection_name is None:
             collection_name = self._collection_name
+        if _async:
+            return self._milvus.load_collection(collection_name, timeout=timeout, _async=True)
         return self._milvus.load_collection(collection_name, timeout=timeout)
 
     @time_wrapper
@@ -479,11 +570,31 @@ class MilvusClient(object):
         return self._milvus.release_collection(collection_name, timeout=timeout)
 
     @time_wrapper
-    def load_partitions(self, tag_names, collection_name=None, timeout=3000):
+    def load_partitions(self, tag_names, collection_name=None, timeout=3000, _async=False):
         if collection_name is None:
             collection_name = self._collection_name
+        if _async:
+            return self._milvus.load_partitions(collection_name, tag_names, timeout=timeout, _async=True)
         return self._milvus.load_partitions(collection_name, tag_names, timeout=timeout)
 
+    def load_progress(self, tag_names=None, collection_name=None, timeout=30):
+        """ Return (num_loaded_entities, num_total_entities) of the collection, or of the partitions if given """
+        if collection_name is None:
+            collection_name = self._collection_name
+        if tag_names:
+            res = self._milvus.load_partitions_progress(collection_name, tag_names, timeout=timeout)
+        else:
+            res = self._milvus.load_collection_progress(collection_name, timeout=timeout)
+        return int(res["num_loaded_entities"]), int(res["num_total_entities"])
+
+    def get_loaded_segments(self, collection_name=None, timeout=30):
+        """ Return the count of the segments loaded by the query nodes, None if the server does not expose it """
+        if collection_name is None:
+            collection_name = self._collection_name
+        if not hasattr(self._milvus, "get_query_segment_info"):
+            return None
+        return len(self._milvus.get_query_segment_info(collection_name, timeout=timeout))
+
     @time_wrapper
     def release_partitions(self, tag_names, collection_name=None, timeout=3000):
         if collection_name is None:
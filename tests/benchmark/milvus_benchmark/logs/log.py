@@ -27,6 +27,8 @@ class GlobalParams:
     log_file_path = FILE_NAME
     config_path = ''
     metric = None
+    backend = "milvus"
+    backend_latency = 0.0
 
 
 global_params = GlobalParams()
@@ -9,8 +9,12 @@ from milvus_benchmark.metrics.models.hardware import Hardware
 from milvus_benchmark.metrics.models.env import Env
 
 from milvus_benchmark.env import get_env
+from milvus_benchmark import backend
 from milvus_benchmark.runners import get_runner
-from milvus_benchmark.metrics import api
+from milvus_benchmark.runners.planner import CaseScheduler
+from milvus_benchmark.runners.sampler import ResourceSampler
+from milvus_benchmark.runners import breakdown
+from milvus_benchmark.metrics import api, sink
 from milvus_benchmark import config, utils
 from milvus_benchmark import parser
 from logs import log
@@ -44,6 +48,7 @@ def get_image_tag(image_version):
 
 
 def run_suite(run_type, suite, env_mode, env_params, timeout=None):
+    sampler = None
     try:
         start_status = False
         # Initialize the class of the reported metric
@@ -74,23 +79,38 @@ def run_suite(run_type, suite, env_mode, env_params, timeout=None):
             start_status = env.start_up(helm_path, helm_params)
         if start_status:
             metric.update_status(status="DEPLOYE_SUCC")
+            # cases sharing the same prepare fingerprint are prepared once, lanes of different collections
+            # could run concurrently up to max_parallel_groups
+            max_parallel_groups = suite["max_parallel_groups"] if "max_parallel_groups" in suite else 1
+            latency_breakdown = suite["latency_breakdown"] if "latency_breakdown" in suite else False
+            if latency_breakdown:
+                # the timed steps are recorded into every running case, the lanes would mix their calls
+                if max_parallel_groups > 1:
+                    raise Exception("latency_breakdown needs max_parallel_groups: 1, got: %s" % str(max_parallel_groups))
+                # installed before the clients of the runners are created
+                breakdown.install()
             logger.debug("Get runner")
             runner = get_runner(run_type, env, metric)
-            cases, case_metrics = runner.extract_cases(suite)
-            # TODO: only run when the as_group is equal to True
-            logger.info("Prepare to run cases")
-            runner.prepare(**cases[0])
+            # the server cpu and memory are sampled in background during prepare and run_case,
+            # only when the suite sets the interval: the GetMetrics calls add load on the measured server
+            sample_interval = suite["resource_sample_interval"] if "resource_sample_interval" in suite else None
+            if sample_interval:
+                sampler = ResourceSampler(env.hostname, env.port, interval=sample_interval,
+                                          statistics=suite["resource_statistics"] if "resource_statistics" in suite else False)
+                if not sampler.start():
+                    sampler = None
+            scheduler = CaseScheduler(runner, lambda: get_runner(run_type, env, metric), max_parallel_groups,
+                                      sampler=sampler, latency_breakdown=latency_breakdown)
             logger.info("Start run case")
             suite_status = True
-            for index, case in enumerate(cases):
-                case_metric = case_metrics[index]
-                result = None
-                err_message = ""
-                try:
-                    result = runner.run_case(case_metric, **case)
-                except Exception as e:
-                    err_message = str(e) + "\n" + traceback.format_exc()
-                    logger.error(traceback.format_exc())
+            if runner.lazy_cases and max_parallel_groups == 1:
+                # the cases and their metrics are generated on demand, not all kept in memory
+                items = scheduler.run_lazy(runner.iter_cases(suite))
+            else:
+                cases, case_metrics = runner.extract_cases(suite)
+                items = ((index, case_metrics[index], result, err_message)
+                         for index, result, err_message in scheduler.run(cases, case_metrics))
+            for index, case_metric, result, err_message in items:
                 logger.info(result)
                 if result:
                     # Save the result of this test as true, and save the related test value results
@@ -102,7 +122,7 @@ def run_suite(run_type, suite, env_mode, env_params, timeout=None):
                     case_metric.update_message(err_message)
                     suite_status = False
                 logger.debug(case_metric.metrics)
-                if deploy_mode:
+                if api.need_save(deploy_mode):
                     api.save(case_metric)
             if suite_status:
                 metric.update_status(status="RUN_SUCC")
@@ -116,9 +136,12 @@ def run_suite(run_type, suite, env_mode, env_params, timeout=None):
         logger.error(traceback.format_exc())
         metric.update_status(status="RUN_FAILED")
     finally:
-        if deploy_mode:
+        if sampler is not None:
+            sampler.stop()
+        if api.need_save(deploy_mode):
             # Save all reported data to the database
             api.save(metric)
+            api.flush()
         env.tear_down()
         if metric.status != "RUN_SUCC":
             return False
@@ -170,7 +193,35 @@ def main():
         help='load server config from FILE',
         default='')
 
+    # Client backend, local runs the suites in-process without a milvus server
+    arg_parser.add_argument(
+        '--backend',
+        choices=backend.BACKENDS,
+        help='client backend: milvus server or in-process local stand-in',
+        default='milvus')
+    arg_parser.add_argument(
+        '--backend-latency',
+        type=float,
+        help='artificial latency in seconds added to every call of the local backend',
+        default=0.0)
+
+    # Sink of the reported metrics
+    arg_parser.add_argument(
+        '--metrics-sink',
+        choices=sink.SINK_TYPES,
+        help='report the metrics into mongoDB, or into a local jsonl/parquet file',
+        default='mongo')
+    arg_parser.add_argument(
+        '--metrics-path',
+        metavar='FILE',
+        help='file of the jsonl/parquet metrics sink, in the log path by default',
+        default='')
+
     args = arg_parser.parse_args()
+    if args.metrics_sink != "mongo":
+        api.set_sink(sink.get_sink(args.metrics_sink, path=args.metrics_path))
+    global_params.backend = args.backend
+    global_params.backend_latency = args.backend_latency
 
     if args.schedule_conf:
         if args.local:
@@ -1,25 +1,43 @@
+import atexit
 import logging
-from pymongo import MongoClient
 
 from .models.env import Env
 from .models.hardware import Hardware
 from .models.metric import Metric
 from .models.server import Server
-from .config import DB, UNIQUE_ID_COLLECTION, DOC_COLLECTION
-from milvus_benchmark import config
+from .sink import MongoSink
 
-
-# Initialize the mongoDB client
-_client = MongoClient(config.MONGO_SERVER)
 logger = logging.getLogger("milvus_benchmark.metric.api")
 
+# mongoDB by default, the connection is only opened by the first report
+_sink = MongoSink()
+
+
+def set_sink(sink):
+    """ Replace the sink of the reported data, the documents buffered by the previous sink are flushed """
+    global _sink
+    _sink.close()
+    _sink = sink
+
+
+def get_sink():
+    return _sink
+
+
+def need_save(deploy_mode):
+    """ The results are reported if the server is deployed or the sink does not need a server """
+    return bool(deploy_mode) or _sink.offline
+
 
 def insert_or_get(md5):
-    collection = _client[DB][UNIQUE_ID_COLLECTION]
-    found = collection.find_one({'md5': md5})
-    if not found:
-        return collection.insert_one({'md5': md5}).inserted_id
-    return found['_id']
+    return _sink.insert_or_get(md5)
+
+
+def flush():
+    _sink.flush()
+
+
+atexit.register(lambda: _sink.close())
 
 
 def save(obj):
@@ -51,7 +69,6 @@ def save(obj):
     env_doc_id = insert_or_get(md5)
     obj.env = {"id": env_doc_id, "value": vars(obj.env)}
 
-    # insert data to mongoDB
+    # buffer the data, written by batch
     logger.debug(vars(obj))
-    collection = _client[DB][DOC_COLLECTION]
-    collection.insert_one(vars(obj))
+    _sink.save(dict(vars(obj)))
@@ -0,0 +1,244 @@
+import sys
+import json
+import logging
+from math import erfc, sqrt
+import numpy as np
+
+from .config import DB, DOC_COLLECTION
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+try:
+    from scipy import stats
+except ImportError:
+    stats = None
+
+logger = logging.getLogger("milvus_benchmark.metric.compare")
+
+DEFAULT_ALPHA = 0.05
+# relative change of the median under which a difference is not reported, even if significant
+DEFAULT_THRESHOLD = 0.05
+BOOTSTRAP_RESAMPLES = 2000
+# scalar results compared by their relative change only, True if higher is better
+SCALAR_METRICS = {
+    "search_time": False,
+    "avc_search_time": False,
+    "total_time": False,
+    "ni_time": False,
+    "build_time": False,
+    "flush_time": False,
+    "rps": True,
+    "qps": True,
+    "max_qps": True,
+    "max_sustained_rate": True,
+    "acc": True
+}
+HISTOGRAM_SUFFIX = "_histogram"
+REGRESSION = "regression"
+IMPROVEMENT = "improvement"
+UNCHANGED = "unchanged"
+
+
+def _decode(doc):
+    """ Nested fields of the parquet rows are json strings """
+    for key, value in doc.items():
+        if isinstance(value, str) and value[:1] in ["{", "["]:
+            try:
+                doc[key] = json.loads(value)
+            except ValueError:
+                pass
+    return doc
+
+
+def load_docs(source, run_id=None):
+    """ Load the reported documents from a jsonl/parquet file of the local sink, or from mongoDB if source is `mongo` """
+    if source == "mongo":
+        from .sink import MongoSink
+        condition = {"_type": "case"}
+        if run_id is not None:
+            condition["run_id"] = int(run_id)
+        return list(MongoSink().client[DB][DOC_COLLECTION].find(condition))
+    if source.endswith(".parquet"):
+        import pandas as pd
+        return [_decode(doc) for doc in pd.read_parquet(source).to_dict(orient="records")]
+    with open(source) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_run(source, run_id=None):
+    """ Return the case documents of the run, the latest run of the source if run_id is not given """
+    docs = [doc for doc in load_docs(source, run_id) if doc.get("_type") == "case"]
+    if run_id is None:
+        run_ids = [doc["run_id"] for doc in docs if doc.get("run_id") is not None]
+        if not run_ids:
+            raise Exception("No run found in: %s" % source)
+        run_id = max(run_ids)
+    docs = [doc for doc in docs if str(doc.get("run_id")) == str(run_id)]
+    if not docs:
+        raise Exception("Run: %s not found in: %s" % (run_id, source))
+    logger.info("Load %d cases of run: %s from: %s" % (len(docs), run_id, source))
+    return docs
+
+
+def case_key(doc):
+    """ Cases of two runs are matched by runner type, collection, index and search params """
+    metrics = doc["metrics"] if isinstance(doc.get("metrics"), dict) else {}
+    key = {
+        "type": metrics.get("type"),
+        "collection": doc.get("collection"),
+        "index": doc.get("index"),
+        "search": doc.get("search"),
+        "run_params": doc.get("run_params")
+    }
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+def mann_whitney(base, new):
+    """ Two sided p value of the Mann-Whitney U test, normal approximation with tie correction without scipy """
+    if stats is not None:
+        return float(stats.mannwhitneyu(base, new, alternative="two-sided").pvalue)
+    n1, n2 = len(base), len(new)
+    values = np.concatenate([base, new])
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values), dtype=np.float64)
+    sorted_values = values[order]
+    # average rank of the ties
+    _, first, counts = np.unique(sorted_values, return_index=True, return_counts=True)
+    average = first + (counts + 1) / 2.0
+    ranks[order] = np.repeat(average, counts)
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+    tie_term = (counts ** 3 - counts).sum() / float((n1 + n2) * (n1 + n2 - 1))
+    sigma = np.sqrt(n1 * n2 / 12.0 * ((n1 + n2 + 1) - tie_term))
+    if not sigma:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / sigma
+    return float(erfc(max(z, 0) / sqrt(2)))
+
+
+def bootstrap(base, new, resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """ Two sided p value of the difference of the medians, by resampling both samples """
+    rng = np.random.default_rng(seed)
+    base_medians = np.median(rng.choice(base, (resamples, len(base))), axis=1)
+    new_medians = np.median(rng.choice(new, (resamples, len(new))), axis=1)
+    diff = new_medians - base_medians
+    p = 2 * min((diff <= 0).mean(), (diff >= 0).mean())
+    return float(min(p, 1.0))
+
+
+def _verdict(change, higher_is_better, threshold, significant=True):
+    if not significant or abs(change) < threshold:
+        return UNCHANGED
+    worse = change < 0 if higher_is_better else change > 0
+    return REGRESSION if worse else IMPROVEMENT
+
+
+def _relative_change(base, new):
+    if not base:
+        return 0.0 if not new else float("inf")
+    return (new - base) / float(abs(base))
+
+
+def compare_samples(base, new, alpha=DEFAULT_ALPHA, threshold=DEFAULT_THRESHOLD, test="mannwhitney"):
+    """ Compare two latency samples, lower is better """
+    base_median = float(np.median(base))
+    new_median = float(np.median(new))
+    p_value = mann_whitney(base, new) if test == "mannwhitney" else bootstrap(base, new)
+    change = _relative_change(base_median, new_median)
+    return {
+        "base": round(base_median, 6),
+        "new": round(new_median, 6),
+        "change": round(change, 4),
+        "p_value": round(p_value, 6),
+        "verdict": _verdict(change, False, threshold, significant=p_value < alpha)
+    }
+
+
+def compare_cases(base_doc, new_doc, alpha=DEFAULT_ALPHA, threshold=DEFAULT_THRESHOLD, test="mannwhitney"):
+    """
+    Compare the results of a case: the latency histograms with a significance test on their samples,
+    the known scalar results by their relative change
+    """
+    base_value = base_doc["metrics"]["value"] or {}
+    new_value = new_doc["metrics"]["value"] or {}
+    result = dict()
+    for name in sorted(set(base_value) & set(new_value)):
+        if name.endswith(HISTOGRAM_SUFFIX):
+            base_samples = LatencyHistogram.from_dict(base_value[name]).samples()
+            new_samples = LatencyHistogram.from_dict(new_value[name]).samples()
+            if len(base_samples) and len(new_samples):
+                result[name[:-len(HISTOGRAM_SUFFIX)]] = compare_samples(
+                    base_samples, new_samples, alpha=alpha, threshold=threshold, test=test)
+        elif name in SCALAR_METRICS and isinstance(base_value[name], (int, float)) \
+                and isinstance(new_value[name], (int, float)):
+            # compared by their histogram if any
+            if name + HISTOGRAM_SUFFIX in base_value and name + HISTOGRAM_SUFFIX in new_value:
+                continue
+            change = _relative_change(base_value[name], new_value[name])
+            result[name] = {
+                "base": base_value[name],
+                "new": new_value[name],
+                "change": round(change, 4),
+                "p_value": None,
+                "verdict": _verdict(change, SCALAR_METRICS[name], threshold)
+            }
+    return result
+
+
+def compare_runs(base_docs, new_docs, alpha=DEFAULT_ALPHA, threshold=DEFAULT_THRESHOLD, test="mannwhitney"):
+    """ Match the successful cases of both runs and compare them, return the report """
+    base_cases = {case_key(doc): doc for doc in base_docs if doc.get("status") == "RUN_SUCC"}
+    new_cases = {case_key(doc): doc for doc in new_docs if doc.get("status") == "RUN_SUCC"}
+    report = {"cases": [], "only_base": [], "only_new": [], "regressions": 0, "improvements": 0}
+    for key in sorted(set(base_cases) | set(new_cases)):
+        if key not in new_cases:
+            report["only_base"].append(json.loads(key))
+            continue
+        if key not in base_cases:
+            report["only_new"].append(json.loads(key))
+            continue
+        metrics = compare_cases(base_cases[key], new_cases[key], alpha=alpha, threshold=threshold, test=test)
+        report["cases"].append({"case": json.loads(key), "metrics": metrics})
+        for item in metrics.values():
+            if item["verdict"] == REGRESSION:
+                report["regressions"] += 1
+            elif item["verdict"] == IMPROVEMENT:
+                report["improvements"] += 1
+    return report
+
+
+def print_report(report, out=sys.stdout):
+    for case in report["cases"]:
+        flagged = {name: item for name, item in case["metrics"].items() if item["verdict"] != UNCHANGED}
+        if not flagged:
+            continue
+        out.write("%s\n" % json.dumps(case["case"], sort_keys=True, default=str))
+        for name, item in sorted(flagged.items()):
+            out.write("    %-12s %-24s %s -> %s (%+.2f%%, p=%s)\n" % (
+                item["verdict"], name, item["base"], item["new"], item["change"] * 100, item["p_value"]))
+    out.write("cases: %d, regressions: %d, improvements: %d, only in base: %d, only in new: %d\n" % (
+        len(report["cases"]), report["regressions"], report["improvements"],
+        len(report["only_base"]), len(report["only_new"])))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Compare the cases of two benchmark runs, exit with 1 if any regression is found")
+    arg_parser.add_argument("--base", required=True, help="jsonl/parquet file of the local sink, or mongo")
+    arg_parser.add_argument("--new", required=True, help="jsonl/parquet file of the local sink, or mongo")
+    arg_parser.add_argument("--base-run-id", default=None, help="latest run of the source by default")
+    arg_parser.add_argument("--new-run-id", default=None, help="latest run of the source by default")
+    arg_parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="significance level of the test")
+    arg_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help="minimal relative change of the median to report")
+    arg_parser.add_argument("--test", default="mannwhitney", choices=["mannwhitney", "bootstrap"])
+    arg_parser.add_argument("--output", metavar='FILE', default='', help="write the full report as json")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    report = compare_runs(load_run(args.base, args.base_run_id), load_run(args.new, args.new_run_id),
+                          alpha=args.alpha, threshold=args.threshold, test=args.test)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    print_report(report)
+    sys.exit(1 if report["regressions"] else 0)
@@ -1,3 +1,5 @@
 DB = 'test'
 UNIQUE_ID_COLLECTION = 'unique_id'
 DOC_COLLECTION = 'doc'
+# count of documents buffered before insert_many
+BATCH_SIZE = 100
@@ -0,0 +1,154 @@
+import os
+import json
+import logging
+
+from .config import DB, UNIQUE_ID_COLLECTION, DOC_COLLECTION, BATCH_SIZE
+from milvus_benchmark import config
+
+logger = logging.getLogger("milvus_benchmark.metric.sink")
+
+SINK_TYPES = ["mongo", "jsonl", "parquet"]
+
+
+class BaseSink(object):
+    """
+    Destination of the reported documents, the documents are buffered and written by batch:
+    insert_or_get returns the id of a unique document (server, hardware, env) from its md5,
+    save buffers a metric document, flush writes the buffered documents
+    """
+    # an offline sink does not need a deployed server to report, so it is used in every mode
+    offline = False
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self._batch_size = batch_size
+        self._ids = dict()
+        self._docs = []
+
+    def insert_or_get(self, md5):
+        if md5 not in self._ids:
+            self._ids[md5] = self._get_id(md5)
+        return self._ids[md5]
+
+    def save(self, doc):
+        self._docs.append(doc)
+        if len(self._docs) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._docs:
+            return
+        docs = self._docs
+        self._docs = []
+        self._write(docs)
+        logger.debug("Flush %d documents to %s" % (len(docs), self.__class__.__name__))
+
+    def close(self):
+        self.flush()
+
+    def _get_id(self, md5):
+        raise NotImplementedError()
+
+    def _write(self, docs):
+        raise NotImplementedError()
+
+
+class MongoSink(BaseSink):
+    """ Documents are written into mongoDB, the client is created by the first write """
+
+    def __init__(self, server=config.MONGO_SERVER, batch_size=BATCH_SIZE):
+        super(MongoSink, self).__init__(batch_size=batch_size)
+        self._server = server
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from pymongo import MongoClient
+            self._client = MongoClient(self._server)
+        return self._client
+
+    def _get_id(self, md5):
+        collection = self.client[DB][UNIQUE_ID_COLLECTION]
+        found = collection.find_one({'md5': md5})
+        if not found:
+            return collection.insert_one({'md5': md5}).inserted_id
+        return found['_id']
+
+    def _write(self, docs):
+        self.client[DB][DOC_COLLECTION].insert_many(docs)
+
+    def close(self):
+        super(MongoSink, self).close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class LocalSink(BaseSink):
+    """
+    Documents are written into a local file, without mongoDB:
+    jsonl: one json document per line, appended by every flush
+    parquet: one row per document, the nested fields are json strings, the rows are appended to the
+    <path>.jsonl spool by every flush and converted into the parquet file by close (needs pandas and pyarrow)
+    the ids of the unique documents are their md5
+    """
+    offline = True
+
+    def __init__(self, path, file_format="jsonl", batch_size=BATCH_SIZE):
+        if file_format not in ["jsonl", "parquet"]:
+            raise Exception("File format: %s not supported" % file_format)
+        super(LocalSink, self).__init__(batch_size=batch_size)
+        self._path = path
+        self._format = file_format
+        self._spool_path = path + ".jsonl" if file_format == "parquet" else path
+        # rows spooled since the last parquet conversion
+        self._spooled = 0
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+
+    @property
+    def path(self):
+        return self._path
+
+    def _get_id(self, md5):
+        return md5
+
+    def _write(self, docs):
+        with open(self._spool_path, "a") as f:
+            for doc in docs:
+                if self._format == "parquet":
+                    doc = {k: json.dumps(v, default=str) if isinstance(v, (dict, list)) else v
+                           for k, v in doc.items()}
+                f.write(json.dumps(doc, default=str) + "\n")
+        self._spooled += len(docs)
+
+    def close(self):
+        super(LocalSink, self).close()
+        if self._format == "parquet" and self._spooled:
+            # the spool is kept, the parquet file is written again from all its rows by a later close
+            # only if rows were spooled since this conversion
+            import pandas as pd
+            pd.read_json(self._spool_path, lines=True, dtype=False).to_parquet(self._path, index=False)
+            self._spooled = 0
+
+
+def check_parquet_engine():
+    """ Raise if pandas or pyarrow, needed to write parquet files, are not installed """
+    for module in ["pandas", "pyarrow"]:
+        try:
+            __import__(module)
+        except ImportError:
+            raise Exception("Parquet metrics sink needs %s, install it with: pip install %s" % (module, module))
+
+
+def get_sink(sink_type, path=None, batch_size=BATCH_SIZE):
+    if sink_type == "mongo":
+        return MongoSink(batch_size=batch_size)
+    elif sink_type in ["jsonl", "parquet"]:
+        if sink_type == "parquet":
+            check_parquet_engine()
+        if not path:
+            path = os.path.join(config.LOG_PATH, "metrics.%s" % sink_type)
+        return LocalSink(path, file_format=sink_type, batch_size=batch_size)
+    raise Exception("Metrics sink: %s not supported" % sink_type)
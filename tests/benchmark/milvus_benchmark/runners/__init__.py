@@ -6,6 +6,13 @@ from .get import InsertGetRunner
 from .accuracy import AccuracyRunner
 from .accuracy import AccAccuracyRunner
 from .chaos import SimpleChaosRunner
+from .qps import QPSRunner
+from .pareto import AnnParetoRunner
+from .filter_search import FilterSearchRunner
+from .churn import ChurnRunner
+from .load import LoadRunner
+from .build_matrix import BuildMatrixRunner
+from .tenant import TenantScalingRunner
 
 
 def get_runner(name, env, metric):
@@ -22,5 +29,12 @@ def get_runner(name, env, metric):
         "build_performance": BuildRunner(env, metric),
         "accuracy": AccuracyRunner(env, metric),
         "ann_accuracy": AccAccuracyRunner(env, metric),
-        "simple_chaos": SimpleChaosRunner(env, metric)
+        "simple_chaos": SimpleChaosRunner(env, metric),
+        "qps_performance": QPSRunner(env, metric),
+        "ann_pareto": AnnParetoRunner(env, metric),
+        "filter_search_performance": FilterSearchRunner(env, metric),
+        "churn_performance": ChurnRunner(env, metric),
+        "load_performance": LoadRunner(env, metric),
+        "build_matrix_performance": BuildMatrixRunner(env, metric),
+        "tenant_scaling_performance": TenantScalingRunner(env, metric)
     }.get(name)
@@ -1,11 +1,13 @@
 import time
-import copy
 import logging
 import numpy as np
 
 from milvus_benchmark import parser
 from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import recall
+from milvus_benchmark.runners import ground_truth
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.insert_pipeline import ParallelInserter, parse_insert_concurrency
 
 logger = logging.getLogger("milvus_benchmark.runners.accuracy")
 INSERT_INTERVAL = 50000
@@ -17,6 +19,10 @@ class AccuracyRunner(BaseRunner):
 
     def __init__(self, env, metric):
         super(AccuracyRunner, self).__init__(env, metric)
+        # build time of the index created by the prepare of the ann accuracy cases
+        self.build_time = None
+        # ground truth ids of the largest nq and top_k of the collection, keyed by collection name
+        self._true_ids = dict()
 
     def extract_cases(self, collection):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
@@ -60,17 +66,13 @@ class AccuracyRunner(BaseRunner):
                             "query": query_vectors,
                             "metric_type": utils.metric_type_trans(metric_type),
                             "params": search_param}
-                        # TODO: only update search_info
-                        case_metric = copy.deepcopy(self.metric)
-                        # set metric type as case
-                        case_metric.set_case_metric_type()
-                        case_metric.search = {
+                        case_metric = self.new_case_metric(search={
                             "nq": nq,
                             "topk": top_k,
                             "search_param": search_param,
                             "filter": filter_param,
                             "guarantee_timestamp": guarantee_timestamp
-                        }
+                        })
                         vector_query = {"vector": {index_field_name: search_info}}
                         case = {
                             "collection_name": collection_name,
@@ -80,6 +82,8 @@ class AccuracyRunner(BaseRunner):
                             "metric_type": metric_type,
                             "vector_type": vector_type,
                             "collection_size": collection_size,
+                            "ground_truth_query": base_query_vectors[0:max(nqs)],
+                            "ground_truth_top_k": max(top_ks),
                             "filter_query": filter_query,
                             "vector_query": vector_query,
                             "guarantee_timestamp": guarantee_timestamp
@@ -95,18 +99,27 @@ class AccuracyRunner(BaseRunner):
             logger.info("collection not exist")
         self.milvus.load_collection(timeout=600)
 
+    def get_true_ids(self, **case_param):
+        """ Ground truth from the ivecs files or the exact search cache, computed once per collection """
+        collection_name = case_param["collection_name"]
+        if collection_name not in self._true_ids:
+            true_ids, _ = ground_truth.get_ground_truth(
+                case_param["data_type"], case_param["dimension"], case_param["collection_size"],
+                case_param["metric_type"], case_param["ground_truth_query"], case_param["ground_truth_top_k"])
+            self._true_ids[collection_name] = true_ids
+        return self._true_ids[collection_name]
+
     def run_case(self, case_metric, **case_param):
-        collection_size = case_param["collection_size"]
         nq = case_metric.search["nq"]
         top_k = case_metric.search["topk"]
         query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
                                       guarantee_timestamp=case_param["guarantee_timestamp"])
-        true_ids = utils.get_ground_truth_ids(collection_size)
+        true_ids = self.get_true_ids(**case_param)
         logger.debug({"true_ids": [len(true_ids[0]), len(true_ids[0])]})
-        result_ids = self.milvus.get_ids(query_res)
-        logger.debug({"result_ids": len(result_ids[0])})
-        acc_value = utils.get_recall_value(true_ids[:nq, :top_k].tolist(), result_ids)
-        tmp_result = {"acc": acc_value}
+        result_ids = self.milvus.get_ids(query_res, top_k)
+        logger.debug({"result_ids": result_ids.shape})
+        per_query = recall.recall_at_k(true_ids[:nq, :top_k], result_ids, top_k)
+        tmp_result = recall.recall_summary(per_query)
         return tmp_result
 
 
@@ -117,11 +130,15 @@ class AccAccuracyRunner(AccuracyRunner):
     2. one collection test different index
     """
     name = "ann_accuracy"
+    lazy_cases = True
 
     def __init__(self, env, metric):
         super(AccAccuracyRunner, self).__init__(env, metric)
 
     def extract_cases(self, collection):
+        return self.collect_cases(collection)
+
+    def iter_cases(self, collection):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, dimension, metric_type) = parser.parse_ann_collection_name(collection_name)
         # hdf5_source_file: The path of the source data file saved on the NAS
@@ -132,6 +149,7 @@ class AccAccuracyRunner(AccuracyRunner):
         nqs = collection["nqs"]
         guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
         search_params = collection["search_params"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
         dataset = utils.get_dataset(hdf5_source_file)
@@ -141,16 +159,18 @@ class AccAccuracyRunner(AccuracyRunner):
             "dataset_name": collection_name
         }
         filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
         # Convert list data into a set of dictionary data
         search_params = utils.generate_combinations(search_params)
         index_params = utils.generate_combinations(index_params)
-        cases = list()
-        case_metrics = list()
         self.init_metric(self.name, collection_info, {}, search_info=None)
 
         # true_ids: The data set used to verify the results returned by query
         true_ids = np.array(dataset["neighbors"])
+        # true_distances: used for the distance tie aware recall when the dataset provides it
+        true_distances = np.array(dataset["distances"]) if "distances" in dataset else None
+        # the query vectors are normalized once, the cases share views of them
+        base_query_vectors = utils.read_only(utils.normalize(metric_type, np.array(dataset["test"][:max(nqs)])))
+        dataset.close()
         for index_type in index_types:
             for index_param in index_params:
                 index_info = {
@@ -161,6 +181,7 @@ class AccAccuracyRunner(AccuracyRunner):
                     if not filters:
                         filters.append(None)
                     for filter in filters:
+                        filter_query = []
                         filter_param = []
                         if isinstance(filter, dict) and "range" in filter:
                             filter_query.append(eval(filter["range"]))
@@ -169,29 +190,24 @@ class AccAccuracyRunner(AccuracyRunner):
                             filter_query.append(eval(filter["term"]))
                             filter_param.append(filter["term"])
                         for nq in nqs:
-                            query_vectors = utils.normalize(metric_type, np.array(dataset["test"][:nq]))
+                            query_vectors = base_query_vectors[:nq]
                             for top_k in top_ks:
                                 search_info = {
                                     "topk": top_k,
                                     "query": query_vectors,
                                     "metric_type": utils.metric_type_trans(metric_type),
                                     "params": search_param}
-                                # TODO: only update search_info
-                                case_metric = copy.deepcopy(self.metric)
-                                # set metric type as case
-                                case_metric.set_case_metric_type()
-                                case_metric.index = index_info
-                                case_metric.search = {
+                                case_metric = self.new_case_metric(index=index_info, search={
                                     "nq": nq,
                                     "topk": top_k,
                                     "search_param": search_param,
                                     "filter": filter_param,
                                     "guarantee_timestamp": guarantee_timestamp
-                                }
+                                })
                                 vector_query = {"vector": {index_field_name: search_info}}
                                 case = {
                                     "collection_name": collection_name,
-                                    "dataset": dataset,
+                                    "source_file": hdf5_source_file,
                                     "index_field_name": index_field_name,
                                     "dimension": dimension,
                                     "data_type": data_type,
@@ -202,12 +218,12 @@ class AccAccuracyRunner(AccuracyRunner):
                                     "filter_query": filter_query,
                                     "vector_query": vector_query,
                                     "true_ids": true_ids,
+                                    "true_distances": true_distances,
+                                    "insert_concurrency": insert_concurrency,
                                     "guarantee_timestamp": guarantee_timestamp
                                 }
                                 # Obtain the parameters of the use case to be tested
-                                cases.append(case)
-                                case_metrics.append(case_metric)
-        return cases, case_metrics
+                                yield case, case_metric
 
     def prepare(self, **case_param):
         """ According to the test case parameters, initialize the test """
@@ -224,32 +240,43 @@ class AccAccuracyRunner(AccuracyRunner):
         if self.milvus.exists_collection(collection_name):
             logger.info("Re-create collection: %s" % collection_name)
             self.milvus.drop()
-        dataset = case_param["dataset"]
+        # the hdf5 file is opened by the prepare, the cases only carry its path
+        dataset = utils.get_dataset(case_param["source_file"])
         self.milvus.create_collection(dimension, data_type=vector_type)
         # Get the data set train for inserting into the collection
         insert_vectors = utils.normalize(metric_type, np.array(dataset["train"]))
-        if len(insert_vectors) != dataset["train"].shape[0]:
+        train_size = dataset["train"].shape[0]
+        dataset.close()
+        if len(insert_vectors) != train_size:
             raise Exception("Row count of insert vectors: %d is not equal to dataset size: %d" % (
-                len(insert_vectors), dataset["train"].shape[0]))
+                len(insert_vectors), train_size))
         logger.debug("The row count of entities to be inserted: %d" % len(insert_vectors))
         # Insert batch once
         # milvus_instance.insert(insert_vectors)
         info = self.milvus.get_info(collection_name)
         loops = len(insert_vectors) // INSERT_INTERVAL + 1
-        for i in range(loops):
-            start = i * INSERT_INTERVAL
-            end = min((i + 1) * INSERT_INTERVAL, len(insert_vectors))
-            if start < end:
-                # Insert up to INSERT_INTERVAL=50000 at a time
-                tmp_vectors = insert_vectors[start:end]
-                ids = [i for i in range(start, end)]
-                if not isinstance(tmp_vectors, list):
-                    entities = utils.generate_entities(info, tmp_vectors.tolist(), ids)
-                    res_ids = self.milvus.insert(entities)
-                else:
-                    entities = utils.generate_entities(tmp_vectors, ids)
-                    res_ids = self.milvus.insert(entities)
-                assert res_ids == ids
+        concurrency = parse_insert_concurrency(case_param["insert_concurrency"]) \
+            if "insert_concurrency" in case_param else None
+        if concurrency:
+            batches = ((i * INSERT_INTERVAL, insert_vectors[i * INSERT_INTERVAL:(i + 1) * INSERT_INTERVAL])
+                       for i in range(loops) if i * INSERT_INTERVAL < len(insert_vectors))
+            inserter = ParallelInserter(self.hostname, self.port, collection_name, info, **concurrency)
+            inserter.run(batches)
+        else:
+            for i in range(loops):
+                start = i * INSERT_INTERVAL
+                end = min((i + 1) * INSERT_INTERVAL, len(insert_vectors))
+                if start < end:
+                    # Insert up to INSERT_INTERVAL=50000 at a time
+                    tmp_vectors = insert_vectors[start:end]
+                    ids = [i for i in range(start, end)]
+                    if not isinstance(tmp_vectors, list):
+                        entities = utils.generate_entities(info, tmp_vectors.tolist(), ids)
+                        res_ids = self.milvus.insert(entities)
+                    else:
+                        entities = utils.generate_entities(tmp_vectors, ids)
+                        res_ids = self.milvus.insert(entities)
+                    assert res_ids == ids
         logger.debug("End insert, start flush")
         self.milvus.flush()
         logger.debug("End flush")
@@ -260,7 +287,9 @@ class AccAccuracyRunner(AccuracyRunner):
         if self.milvus.describe_index(index_field_name):
             self.milvus.drop_index(index_field_name)
             logger.info("Re-create index: %s" % collection_name)
+        start_time = time.time()
         self.milvus.create_index(index_field_name, index_type, metric_type, index_param=index_param)
+        self.build_time = round(time.time() - start_time, 2)
         logger.info(self.milvus.describe_index(index_field_name))
         logger.info("Start load collection: %s" % collection_name)
         # self.milvus.release_collection()
@@ -281,10 +310,15 @@ class AccAccuracyRunner(AccuracyRunner):
             start_time = time.time()
         query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
                                       guarantee_timestamp=case_param["guarantee_timestamp"])
-        result_ids = self.milvus.get_ids(query_res)
+        result_ids, result_distances = self.milvus.get_result_arrays(query_res, top_k)
         # Calculate the accuracy of the result of query
-        acc_value = utils.get_recall_value(true_ids[:nq, :top_k].tolist(), result_ids)
-        tmp_result = {"acc": acc_value}
+        per_query = recall.recall_at_k(true_ids[:nq, :top_k], result_ids, top_k)
+        tmp_result = recall.recall_summary(per_query)
+        true_distances = case_param["true_distances"] if "true_distances" in case_param else None
+        if true_distances is not None:
+            result_distances = recall.convert_distances(result_distances, case_param["metric_type"])
+            tie_per_query = recall.tie_aware_recall(true_distances[:nq], result_distances, top_k)
+            tmp_result.update(recall.recall_summary(tie_per_query, prefix="tie_acc"))
         # Return accuracy results for reporting
         return tmp_result
 
@@ -0,0 +1,147 @@
+import time
+import logging
+import itertools
+import threading
+import traceback
+
+from milvus_benchmark.runners.pool import ConnectionPool
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.async_search")
+
+DEFAULT_DURATION = 10
+# how often the requests without completion callback are checked for errors
+REAP_INTERVAL = 0.05
+
+
+def parse_search_concurrency(search_concurrency):
+    """ The `search_concurrency` suite key: an int or a list of in-flight requests per connection """
+    if search_concurrency is None:
+        return []
+    if isinstance(search_concurrency, int):
+        search_concurrency = [search_concurrency]
+    for concurrency in search_concurrency:
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise Exception("Invalid search_concurrency: %s" % str(search_concurrency))
+    return list(search_concurrency)
+
+
+class PipelinedSearcher(object):
+    """
+    Keep `concurrency` searches in flight on every connection with the pymilvus _async futures:
+    a new request is sent as soon as one completes, the latency is measured from sending
+    to the completion callback, so that it is not delayed by the other requests in flight
+    """
+
+    def __init__(self, host, port, collection_name, connections=1, concurrency=1, timeout=300):
+        self._pool = ConnectionPool(host, port, collection_name=collection_name, size=connections)
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._histogram = LatencyHistogram()
+        self._completed = 0
+        self._errors = 0
+        self._last_error = None
+        self._request_ids = itertools.count()
+
+    def _error(self, e):
+        with self._lock:
+            self._errors += 1
+            self._last_error = e
+
+    def _run_connection(self, vector_query, filter_query, guarantee_timestamp, deadline):
+        # every thread pipelines its requests on its own connection of the pool
+        with self._pool.borrow() as client:
+            self._pipeline(client, vector_query, filter_query, guarantee_timestamp, deadline)
+
+    def _pipeline(self, client, vector_query, filter_query, guarantee_timestamp, deadline):
+        slots = threading.Semaphore(self._concurrency)
+        # request id -> (future, send time), the future is None until query_async returns
+        in_flight = dict()
+
+        def on_done(request_id):
+            def callback(result):
+                end_time = time.time()
+                with self._lock:
+                    if request_id not in in_flight:
+                        return
+                    _, start_time = in_flight.pop(request_id)
+                    self._histogram.record(end_time - start_time)
+                    self._completed += 1
+                slots.release()
+            return callback
+
+        def reap():
+            """ Release the slots of the failed requests, their callback is never called """
+            with self._lock:
+                done = [(request_id, future) for request_id, (future, _) in in_flight.items()
+                        if future is not None and future.done()]
+            for request_id, future in done:
+                try:
+                    future.result()
+                except Exception as e:
+                    with self._lock:
+                        if in_flight.pop(request_id, None) is None:
+                            continue
+                    self._error(e)
+                    slots.release()
+
+        while time.time() < deadline:
+            if not slots.acquire(timeout=REAP_INTERVAL):
+                reap()
+                continue
+            request_id = next(self._request_ids)
+            with self._lock:
+                in_flight[request_id] = (None, time.time())
+            try:
+                future = client.query_async(vector_query, filter_query=filter_query,
+                                            guarantee_timestamp=guarantee_timestamp,
+                                            timeout=self._timeout, _callback=on_done(request_id))
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                with self._lock:
+                    in_flight.pop(request_id, None)
+                self._error(e)
+                slots.release()
+                continue
+            with self._lock:
+                # the callback may have been called before query_async returns
+                if request_id in in_flight:
+                    in_flight[request_id] = (future, in_flight[request_id][1])
+        # drain the requests in flight
+        drain_deadline = time.time() + self._timeout
+        while in_flight and time.time() < drain_deadline:
+            reap()
+            time.sleep(REAP_INTERVAL)
+        if in_flight:
+            logger.warning("%d requests not completed in timeout: %s" % (len(in_flight), self._timeout))
+
+    def run(self, vector_query, filter_query=None, guarantee_timestamp=None, duration=DEFAULT_DURATION):
+        """ Search for duration seconds and return the throughput and the completion latency distribution """
+        start_time = time.time()
+        deadline = start_time + duration
+        threads = [threading.Thread(target=self._run_connection,
+                                    args=(vector_query, filter_query, guarantee_timestamp, deadline),
+                                    daemon=True) for _ in range(self._pool.size)]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            # the searcher is built for one case, its connections are not reused
+            self._pool.close()
+        total_time = time.time() - start_time
+        if self._errors and not self._completed:
+            raise self._last_error
+        result = {
+            "connections": self._pool.size,
+            "concurrency": self._concurrency,
+            "requests": self._completed,
+            "errors": self._errors,
+            "total_time": round(total_time, 2),
+            "qps": round(self._completed / total_time, 2) if total_time else 0.0
+        }
+        result.update(self._histogram.summary("search_time"))
+        logger.info(result)
+        return result
@@ -1,4 +1,5 @@
 import time
+import copy
 import pdb
 import logging
 import traceback
@@ -7,13 +8,21 @@ import numpy as np
 
 from milvus_benchmark.env import get_env
 from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.runners.insert_pipeline import ParallelInserter, parse_insert_concurrency
+from milvus_benchmark.runners.histogram import LatencyHistogram
 from . import utils
+from . import synthetic
 
 logger = logging.getLogger("milvus_benchmark.runners.base")
 
 
 class BaseRunner(object):
     """runner is actually the executors"""
+    # case params that decide what prepare() builds, cases with the same values share one prepare
+    prepare_keys = ["collection_name", "data_type", "dimension", "collection_size", "ni_per", "other_fields",
+                    "metric_type", "index_type", "index_param", "build_index", "before_steps"]
+    # iter_cases yields the cases on demand, ordered so that the cases sharing a prepare are consecutive
+    lazy_cases = False
 
     def __init__(self, env, metric):
         self._metric = metric
@@ -65,11 +74,38 @@ class BaseRunner(object):
             "value": self._result
         }
 
+    def iter_cases(self, collection):
+        """ Yield (case, case_metric) of the suite, the runners with lazy_cases generate them on demand """
+        cases, case_metrics = self.extract_cases(collection)
+        for case, case_metric in zip(cases, case_metrics):
+            yield case, case_metric
+
+    def collect_cases(self, collection):
+        """ extract_cases of the lazy runners: the cases and the metrics of iter_cases as lists """
+        cases = list()
+        case_metrics = list()
+        for case, case_metric in self.iter_cases(collection):
+            cases.append(case)
+            case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def new_case_metric(self, **fields):
+        """
+        Shallow copy of the metric set by init_metric with its own result value,
+        the other fields are shared by the cases, pass the fields of the case instead of updating them
+        """
+        case_metric = copy.copy(self.metric)
+        case_metric.set_case_metric_type()
+        case_metric.metrics = {"type": self.metric.metrics["type"], "value": copy.deepcopy(self.metric.metrics["value"])}
+        for key, value in fields.items():
+            setattr(case_metric, key, value)
+        return case_metric
+
     # TODO: need an easy method to change value in metric
     def update_metric(self, key, value):
         pass
 
-    def insert_core(self, milvus, info, start_id, vectors):
+    def insert_core(self, milvus, info, start_id, vectors, partition_name=None):
         # start insert vectors
         end_id = start_id + len(vectors)
         logger.debug("Start id: %s, end id: %s" % (start_id, end_id))
@@ -77,7 +113,7 @@ class BaseRunner(object):
         entities = utils.generate_entities(info, vectors, ids)
         ni_start_time = time.time()
         try:
-            _res_ids = milvus.insert(entities)
+            _res_ids = milvus.insert(entities, partition_name=partition_name)
         except Exception as e:
             logger.error("Insert failed")
             logger.error(traceback.format_exc())
@@ -89,12 +125,19 @@ class BaseRunner(object):
         return ni_end_time-ni_start_time
 
     # TODO: need to improve
-    def insert(self, milvus, collection_name, data_type, dimension, size, ni):
-        """ insert data to collection before testing """
+    def insert(self, milvus, collection_name, data_type, dimension, size, ni, insert_concurrency=None):
+        """
+        insert data to collection before testing
+        insert_concurrency: the `insert_concurrency` suite key, insert with a multi-connection pipeline if set
+        """
         total_time = 0.0
         rps = 0.0
         ni_time = 0.0
-        vectors_per_file = utils.get_len_vectors_per_file(data_type, dimension)
+        if data_type == "local" or not data_type:
+            # the synthetic vectors are generated per batch, only the batches need to divide the size
+            vectors_per_file = ni
+        else:
+            vectors_per_file = utils.get_len_vectors_per_file(data_type, dimension)
         if size % vectors_per_file or size % ni:
             """ 
             An error is reported when 
@@ -102,57 +145,30 @@ class BaseRunner(object):
             """
             logger.error("Not invalid collection size or ni")
             return False
-        i = 0
         info = milvus.get_info(collection_name)
         if data_type == "local" or not data_type:
-            # insert local
-            info = milvus.get_info(collection_name)
-            while i < (size // vectors_per_file):
-                vectors = []
-                for j in range(vectors_per_file // ni):
-                    # vectors = src_vectors[j * ni:(j + 1) * ni]
-                    vectors = utils.generate_vectors(ni, dimension)
-                    if vectors:
-                        start_id = i * vectors_per_file + j * ni
-                        ni_time = self.insert_core(milvus, info, start_id, vectors)
-                        total_time = total_time+ni_time
-                i += 1
+            # insert seeded synthetic vectors, the same vectors are generated in every run
+            batches = synthetic.VectorGenerator(dimension).iter_batches(size, ni)
         else:
-            # insert from file
-            while i < (size // vectors_per_file):
-                vectors = []
-                if vectors_per_file >= ni:
-                    # Get the path of the specified file
-                    file_name = utils.gen_file_name(i, dimension, data_type)
-                    # logger.info("Load npy file: %s start" % file_name)
-                    # Load file content
-                    data = np.load(file_name)
-                    # logger.info("Load npy file: %s end" % file_name)
-                    for j in range(vectors_per_file // ni):
-                        vectors = data[j * ni:(j + 1) * ni].tolist()
-                        if vectors:
-                            start_id = i * vectors_per_file + j * ni
-                            ni_time = self.insert_core(milvus, info, start_id, vectors)
-                            total_time = total_time+ni_time
-                    i += 1
-                else:
-                    vectors.clear()
-                    loops = ni // vectors_per_file
-                    for j in range(loops):
-                        file_name = utils.gen_file_name(loops * i + j, dimension, data_type)
-                        data = np.load(file_name)
-                        vectors.extend(data.tolist())
-                    if vectors:
-                        start_id = i * vectors_per_file
-                        ni_time = self.insert_core(milvus, info, start_id, vectors)
-                        total_time = total_time+ni_time
-                    i += loops
+            # insert from memory-mapped files, the array views are passed to the client without list conversion
+            batches = utils.iter_vector_batches(data_type, dimension, size, ni)
+        concurrency = parse_insert_concurrency(insert_concurrency)
+        if concurrency:
+            logger.info("Insert with concurrency: %s" % str(concurrency))
+            inserter = ParallelInserter(self.hostname, self.port, collection_name, info, **concurrency)
+            return inserter.run(batches)
+        histogram = LatencyHistogram()
+        for start_id, vectors in batches:
+            ni_time = self.insert_core(milvus, info, start_id, vectors)
+            histogram.record(ni_time)
+            total_time = total_time+ni_time
         rps = round(size / total_time, 2)
         ni_time = round(total_time / (size / ni), 2)
         result = {
             "total_time": round(total_time, 2),
             "rps": rps,
-            "ni_time": ni_time
+            "ni_time": ni_time,
+            "ni_time_histogram": histogram.to_dict()
         }
         logger.info(result)
         return result
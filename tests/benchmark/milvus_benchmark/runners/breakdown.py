@@ -0,0 +1,211 @@
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.breakdown")
+
+# encode: pymilvus builds the request message, rpc: serialization, network, server and response parsing by grpc,
+# decode: pymilvus wraps the response, total: the whole MilvusClient call
+ENCODE = "encode"
+RPC = "rpc"
+DECODE = "decode"
+TOTAL = "total"
+PHASES = [ENCODE, RPC, DECODE, TOTAL]
+# (module, class, attribute, call name, phase) of the pymilvus steps timed when installed
+PYMILVUS_STEPS = [
+    ("pymilvus.client.prepare", "Prepare", "search_requests_with_expr", "search", ENCODE),
+    ("pymilvus.client.prepare", "Prepare", "bulk_insert_param", "insert", ENCODE),
+    ("pymilvus.client.prepare", "Prepare", "query_request", "query", ENCODE),
+    ("pymilvus.client.abstract", "ChunkedQueryResult", "__init__", "search", DECODE),
+    ("pymilvus.client.abstract", "QueryResult", "__init__", "search", DECODE),
+    ("pymilvus.client.abstract", "MutationResult", "__init__", "insert", DECODE),
+]
+
+_lock = threading.Lock()
+# the recorders of the running cases, every timed step is recorded into all of them
+_recorders = []
+_installed = False
+
+
+class LatencyBreakdown(object):
+    """ Per call histograms of the phases of the client calls, and the request/response sizes of the rpcs """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = dict()
+        self._bytes = dict()
+
+    def record(self, call, phase, seconds):
+        with self._lock:
+            key = (call, phase)
+            if key not in self._histograms:
+                self._histograms[key] = LatencyHistogram()
+            self._histograms[key].record(seconds)
+
+    def record_bytes(self, call, request_bytes, response_bytes):
+        with self._lock:
+            total = self._bytes.setdefault(call, [0, 0, 0])
+            total[0] += 1
+            total[1] += request_bytes
+            total[2] += response_bytes
+
+    def summary(self):
+        """
+        {call: {"count", "<phase>_avg", "<phase>_p50", "<phase>_p99", "client_other_avg",
+                "request_bytes_avg", "response_bytes_avg"}}, times in seconds,
+        client_other_avg is the time of the client call not spent in the other phases
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            sizes = dict(self._bytes)
+        result = dict()
+        for (call, phase), histogram in sorted(histograms.items()):
+            item = result.setdefault(call, {"count": 0})
+            item["count"] = max(item["count"], histogram.count)
+            item["%s_avg" % phase] = round(histogram.mean, 6)
+            item["%s_p50" % phase] = round(histogram.value_at_percentile(50), 6)
+            item["%s_p99" % phase] = round(histogram.value_at_percentile(99), 6)
+        for call, item in result.items():
+            if "%s_avg" % TOTAL in item:
+                other = item["%s_avg" % TOTAL] - sum([item.get("%s_avg" % phase, 0.0) for phase in [ENCODE, RPC, DECODE]])
+                item["client_other_avg"] = round(max(other, 0.0), 6)
+            if call in sizes:
+                count, request_bytes, response_bytes = sizes[call]
+                item["request_bytes_avg"] = int(request_bytes / count)
+                item["response_bytes_avg"] = int(response_bytes / count)
+        return result
+
+
+def record(call, phase, seconds):
+    if not _recorders:
+        return
+    with _lock:
+        recorders = list(_recorders)
+    for recorder in recorders:
+        recorder.record(call, phase, seconds)
+
+
+def record_bytes(call, request_bytes, response_bytes):
+    if not _recorders:
+        return
+    with _lock:
+        recorders = list(_recorders)
+    for recorder in recorders:
+        recorder.record_bytes(call, request_bytes, response_bytes)
+
+
+@contextmanager
+def timer(call, phase):
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        record(call, phase, time.time() - start_time)
+
+
+@contextmanager
+def recording():
+    """
+    Record the breakdown of the calls of the block, calls of concurrent cases are recorded by all of them,
+    so run_suite refuses latency_breakdown with max_parallel_groups > 1
+    """
+    recorder = LatencyBreakdown()
+    with _lock:
+        _recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        with _lock:
+            _recorders.remove(recorder)
+
+
+def _rpc_name(method):
+    """ /milvus.proto.milvus.MilvusService/Search -> search """
+    if isinstance(method, bytes):
+        method = method.decode("utf-8")
+    return method.rsplit("/", 1)[-1].lower()
+
+
+def _interceptor_class():
+    import grpc
+
+    class BreakdownInterceptor(grpc.UnaryUnaryClientInterceptor):
+        """ Time the unary rpcs from the call to the response, the futures are timed until they are done """
+
+        def intercept_unary_unary(self, continuation, client_call_details, request):
+            call = _rpc_name(client_call_details.method)
+            request_bytes = request.ByteSize() if _recorders else 0
+            start_time = time.time()
+            outcome = continuation(client_call_details, request)
+
+            def done(future):
+                record(call, RPC, time.time() - start_time)
+                if future.exception() is None:
+                    record_bytes(call, request_bytes, future.result().ByteSize())
+            outcome.add_done_callback(done)
+            return outcome
+
+    return BreakdownInterceptor
+
+
+def _timed(func, call, phase):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _recorders:
+            return func(*args, **kwargs)
+        with timer(call, phase):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _patch_step(module_name, class_name, attr, call, phase):
+    import importlib
+    owner = getattr(importlib.import_module(module_name), class_name)
+    original = owner.__dict__[attr]
+    if isinstance(original, classmethod):
+        setattr(owner, attr, classmethod(_timed(original.__func__, call, phase)))
+    elif isinstance(original, staticmethod):
+        setattr(owner, attr, staticmethod(_timed(original.__func__, call, phase)))
+    else:
+        setattr(owner, attr, _timed(original, call, phase))
+
+
+def _patch_channel(interceptor):
+    """ Intercept the channel of every grpc handler created by pymilvus """
+    import grpc
+    from pymilvus.client.grpc_handler import GrpcHandler
+    from pymilvus.grpc_gen import milvus_pb2_grpc
+    setup = GrpcHandler._setup_grpc_channel
+
+    @functools.wraps(setup)
+    def setup_grpc_channel(handler, *args, **kwargs):
+        setup(handler, *args, **kwargs)
+        handler._channel = grpc.intercept_channel(handler._channel, interceptor)
+        handler._stub = milvus_pb2_grpc.MilvusServiceStub(handler._channel)
+    GrpcHandler._setup_grpc_channel = setup_grpc_channel
+
+
+def install():
+    """
+    Install the grpc interceptor and the timers of the pymilvus encode and decode steps, once per process,
+    before the clients are created; the steps missing in the installed pymilvus are not timed
+    """
+    global _installed
+    with _lock:
+        if _installed:
+            return
+        _installed = True
+    try:
+        _patch_channel(_interceptor_class()())
+    except (ImportError, AttributeError) as e:
+        logger.warning("Grpc interceptor not installed: %s" % str(e))
+    for module_name, class_name, attr, call, phase in PYMILVUS_STEPS:
+        try:
+            _patch_step(module_name, class_name, attr, call, phase)
+        except (ImportError, AttributeError, KeyError) as e:
+            logger.warning("Step %s.%s not timed: %s" % (class_name, attr, str(e)))
+    logger.info("Latency breakdown installed")
@@ -0,0 +1,308 @@
+import time
+import json
+import logging
+
+from milvus_benchmark import config
+from milvus_benchmark import parser
+from milvus_benchmark import utils as util
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import synthetic
+from milvus_benchmark.runners import ground_truth
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.sampler import ResourceSampler
+from milvus_benchmark.runners.pareto import sweep_point, cheapest_setting, DEFAULT_TARGET_RECALL
+
+try:
+    from minio import Minio
+except ImportError:
+    Minio = None
+
+logger = logging.getLogger("milvus_benchmark.runners.build_matrix")
+
+DEFAULT_RUN_COUNT = 10
+DEFAULT_WARM_UP_COUNT = 2
+DEFAULT_PROGRESS_INTERVAL = 1
+DEFAULT_MEMORY_SAMPLE_INTERVAL = 1
+# the nodes building the index, the peak memory is taken on them if they are reported
+BUILD_NODE_TYPES = ["IndexNode", "Standalone"]
+BUILD_PHASE = "build"
+RANKING_HEADERS = ["index", "build_time", "index_bytes", "peak_memory", "acc", "qps", "search_time_p50",
+                   "build_rank", "search_rank"]
+
+
+class IndexStorage(object):
+    """
+    The objects written into the minio bucket of the server, the bytes of an index are the sizes of
+    the objects created under the prefix while it is built
+    """
+
+    def __init__(self, host=config.MINIO_HOST, port=config.MINIO_PORT, access_key=config.MINIO_ACCESS_KEY,
+                 secret_key=config.MINIO_SECRET_KEY, bucket=config.MINIO_BUCKET_NAME, prefix=""):
+        self._client = Minio("%s:%s" % (host, port), access_key=access_key, secret_key=secret_key, secure=False)
+        self._bucket = bucket
+        self._prefix = prefix
+        if not self._client.bucket_exists(bucket):
+            raise Exception("Bucket: %s not existed" % bucket)
+
+    def objects(self):
+        """ {object name: size} of the objects under the prefix """
+        return {obj.object_name: obj.size
+                for obj in self._client.list_objects(self._bucket, prefix=self._prefix, recursive=True)}
+
+
+def connect_storage(storage_config):
+    """ Return the IndexStorage of the `minio` suite key, None if disabled, not installed or not reachable """
+    if storage_config is False:
+        return None
+    if Minio is None:
+        logger.warning("Index bytes not measured, minio is not installed")
+        return None
+    try:
+        return IndexStorage(**(storage_config or {}))
+    except Exception as e:
+        logger.warning("Index bytes not measured, minio not reachable: %s" % str(e))
+        return None
+
+
+def peak_memory(resources):
+    """ The peak memory (GB) of the building nodes during the build phase, and the peak of every node """
+    nodes = resources[BUILD_PHASE]["nodes"] if BUILD_PHASE in resources else {}
+    node_peaks = {name: series["memory_max"] for name, series in nodes.items()}
+    builders = [series for series in nodes.values() if series["type"] in BUILD_NODE_TYPES] or list(nodes.values())
+    peaks = [series["memory_max"] for series in builders if series["memory_max"] is not None]
+    # the memory growth of the node from the first sample of the build
+    growth = [series["memory_max"] - series["memory"][0] for series in builders
+              if series["memory_max"] is not None and series["memory"] and series["memory"][0] is not None]
+    return (max(peaks) if peaks else None), (round(max(growth), 3) if growth else None), node_peaks
+
+
+def rank_builds(rows):
+    """ Rank the builds by build time (cheapest first) and by the qps of their best search, the table rows """
+    for rank, row in enumerate(sorted(rows, key=lambda r: r["build_time"]), 1):
+        row["build_rank"] = rank
+    for rank, row in enumerate(sorted(rows, key=lambda r: -(r["qps"] or 0)), 1):
+        row["search_rank"] = rank
+    return sorted(rows, key=lambda r: r["build_rank"])
+
+
+class BuildMatrixRunner(BaseRunner):
+    """
+    run the builds of the index types and params on the same inserted collection:
+    1. the collection is inserted and flushed once
+    2. every case drops the index, creates the next one asynchronously and polls the build progress,
+       the peak memory of the nodes and the bytes of the index files are recorded
+    3. the collection is loaded and searched with every search param, recall against the exact top_k
+    4. the builds are ranked by build cost and by search performance
+    """
+    name = "build_matrix_performance"
+    # the index is rebuilt by run_case, the collection is inserted once for all the builds
+    prepare_keys = ["collection_name", "data_type", "dimension", "collection_size", "ni_per", "other_fields",
+                    "metric_type"]
+
+    def __init__(self, env, metric):
+        super(BuildMatrixRunner, self).__init__(env, metric)
+        self.insert_result = None
+        self._true_ids = None
+        self._storage = None
+        self._built_index = False
+        self._rows = []
+        # the cases run so far, failed builds included
+        self._builds = 0
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
+        other_fields = collection["other_fields"] if "other_fields" in collection else None
+        index_types = collection["index_types"]
+        index_params = utils.generate_combinations(collection["index_params"])
+        search_params = utils.generate_combinations(collection["search_params"])
+        top_k = collection["top_k"] if "top_k" in collection else 10
+        nq = collection["nq"] if "nq" in collection else 100
+        run_count = collection["run_count"] if "run_count" in collection else DEFAULT_RUN_COUNT
+        warm_up_count = collection["warm_up_count"] if "warm_up_count" in collection else DEFAULT_WARM_UP_COUNT
+        target_recall = collection["target_recall"] if "target_recall" in collection else DEFAULT_TARGET_RECALL
+        guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        progress_interval = collection["progress_interval"] if "progress_interval" in collection \
+            else DEFAULT_PROGRESS_INTERVAL
+        memory_sample_interval = collection["memory_sample_interval"] if "memory_sample_interval" in collection \
+            else DEFAULT_MEMORY_SAMPLE_INTERVAL
+        storage_config = collection["minio"] if "minio" in collection else None
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "other_fields": other_fields,
+            "ni_per": ni_per
+        }
+        run_params = {
+            "search_params": search_params,
+            "run_count": run_count,
+            "warm_up_count": warm_up_count,
+            "target_recall": target_recall
+        }
+        self.init_metric(self.name, collection_info, {}, None, run_params)
+        if data_type == "local" or not data_type:
+            # seeded, so that the ground truth can be computed from the same generator as the inserted vectors
+            query_vectors = synthetic.VectorGenerator(dimension).queries(nq)
+        else:
+            query_vectors = utils.get_vectors_from_binary(nq, dimension, data_type)
+        query_vectors = utils.read_only(query_vectors)
+        self._rows = []
+        self._builds = 0
+        cases = list()
+        case_metrics = list()
+        for index_type in index_types:
+            for index_param in index_params:
+                case_metrics.append(self.new_case_metric(index={
+                    "index_type": index_type,
+                    "index_param": index_param
+                }, search={
+                    "nq": nq,
+                    "topk": top_k,
+                    "search_param": search_params,
+                    "guarantee_timestamp": guarantee_timestamp
+                }))
+                cases.append({
+                    "collection_name": collection_name,
+                    "data_type": data_type,
+                    "dimension": dimension,
+                    "collection_size": collection_size,
+                    "ni_per": ni_per,
+                    "insert_concurrency": insert_concurrency,
+                    "metric_type": metric_type,
+                    "vector_type": vector_type,
+                    "other_fields": other_fields,
+                    "index_field_name": index_field_name,
+                    "index_type": index_type,
+                    "index_param": index_param,
+                    "search_params": search_params,
+                    "query_vectors": query_vectors,
+                    "nq": nq,
+                    "top_k": top_k,
+                    "run_count": run_count,
+                    "warm_up_count": warm_up_count,
+                    "target_recall": target_recall,
+                    "guarantee_timestamp": guarantee_timestamp,
+                    "progress_interval": progress_interval,
+                    "memory_sample_interval": memory_sample_interval,
+                    "minio": storage_config,
+                    "build_count": len(index_types) * len(index_params)
+                })
+        return cases, case_metrics
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        dimension = case_param["dimension"]
+        self.milvus.set_collection(collection_name)
+        if self.milvus.exists_collection():
+            logger.debug("Start drop collection")
+            self.milvus.drop()
+            time.sleep(utils.DELETE_INTERVAL_TIME)
+        self.milvus.create_collection(dimension, data_type=case_param["vector_type"],
+                                      other_fields=case_param["other_fields"])
+        self.insert_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension,
+                                         case_param["collection_size"], case_param["ni_per"],
+                                         insert_concurrency=case_param["insert_concurrency"])
+        self.milvus.flush()
+        logger.debug({"collection count": self.milvus.count()})
+        self._true_ids = self.get_true_ids(**case_param)
+        self._storage = connect_storage(case_param["minio"])
+        self._built_index = False
+
+    def get_true_ids(self, **case_param):
+        true_ids, _ = ground_truth.get_ground_truth(case_param["data_type"], case_param["dimension"],
+                                                    case_param["collection_size"], case_param["metric_type"],
+                                                    case_param["query_vectors"], case_param["top_k"],
+                                                    ni=case_param["ni_per"])
+        return true_ids
+
+    def build(self, **case_param):
+        """ Create the index asynchronously and poll the progress until the build is done """
+        timeline = []
+        start_time = time.time()
+        future = self.milvus.create_index(case_param["index_field_name"], case_param["index_type"],
+                                          case_param["metric_type"], _async=True,
+                                          index_param=case_param["index_param"])
+        while True:
+            try:
+                indexed, total = self.milvus.index_progress()
+                timeline.append([round(time.time() - start_time, 3), indexed, total])
+            except Exception as e:
+                # the server does not expose the progress, wait for the build
+                logger.warning("Index progress not available: %s" % str(e))
+                timeline = None
+                break
+            # a failed build is done before all the rows are indexed
+            if future.done():
+                break
+            time.sleep(case_param["progress_interval"])
+        # raise the error of the build if any
+        future.result()
+        return time.time() - start_time, timeline
+
+    def run_case(self, case_metric, **case_param):
+        index_field_name = case_param["index_field_name"]
+        self._builds += 1
+        if self._built_index:
+            self.milvus.release_collection()
+            self.milvus.drop_index(index_field_name)
+        objects_before = self._storage.objects() if self._storage else None
+        sampler = ResourceSampler(self.hostname, self.port, interval=case_param["memory_sample_interval"])
+        sampled = sampler.start()
+        # the index of a failed build is dropped by the next case too
+        self._built_index = True
+        try:
+            with sampler.phase(BUILD_PHASE, 0):
+                build_time, timeline = self.build(**case_param)
+        finally:
+            sampler.stop()
+        memory, memory_growth, node_memory = peak_memory(sampler.case_resources(0)) if sampled \
+            else (None, None, None)
+        index_bytes = None
+        if self._storage:
+            objects_after = self._storage.objects()
+            index_bytes = sum([size for name, size in objects_after.items() if name not in objects_before])
+        logger.info(self.milvus.describe_index(index_field_name))
+        start_time = time.time()
+        self.milvus.load_collection(timeout=1200)
+        load_time = time.time() - start_time
+        points = [sweep_point(self.milvus, search_param, true_ids=self._true_ids, **case_param)
+                  for search_param in case_param["search_params"]]
+        best = cheapest_setting(points, case_param["target_recall"])
+        if best is None:
+            logger.warning("No search param reaches the target recall: %s" % case_param["target_recall"])
+            best = max(points, key=lambda p: (p["acc"], p["qps"]))
+        self._rows.append({
+            "index": "%s %s" % (case_param["index_type"], json.dumps(case_param["index_param"], sort_keys=True)),
+            "build_time": round(build_time, 2),
+            "index_bytes": index_bytes,
+            "peak_memory": memory,
+            "acc": best["acc"],
+            "qps": best["qps"],
+            "search_time_p50": best["search_time_p50"]
+        })
+        tmp_result = {
+            "insert": self.insert_result,
+            "build_time": round(build_time, 2),
+            "build_timeline": timeline,
+            "index_bytes": index_bytes,
+            "peak_memory": memory,
+            "peak_memory_growth": memory_growth,
+            "node_peak_memory": node_memory,
+            "load_time": round(load_time, 2),
+            "points": points,
+            "target_recall": case_param["target_recall"],
+            "best": best
+        }
+        # the ranking of the builds done so far, complete in the last case of the matrix
+        ranking = rank_builds([dict(row) for row in self._rows])
+        if self._builds == case_param["build_count"]:
+            util.print_table(RANKING_HEADERS, [row["index"] for row in ranking],
+                             [[str(row[header]) for header in RANKING_HEADERS[1:]] for row in ranking])
+        tmp_result["ranking"] = ranking
+        return tmp_result
@@ -0,0 +1,354 @@
+import math
+import time
+import json
+import logging
+import numpy as np
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import recall
+from milvus_benchmark.runners import synthetic
+from milvus_benchmark.runners import ground_truth
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
+from milvus_benchmark.runners.search import InsertSearchRunner, run_search_rounds, DEFAULT_WARM_UP_COUNT
+
+logger = logging.getLogger("milvus_benchmark.runners.churn")
+
+INSERT = "insert"
+DELETE = "delete"
+SEARCH = "search"
+OPS = [INSERT, DELETE, SEARCH]
+DEFAULT_DELETE_FRACTIONS = [0.1, 0.2, 0.3, 0.5]
+DEFAULT_INSERT_BATCH = 1000
+DEFAULT_DELETE_BATCH = 1000
+DEFAULT_MAX_OPS = 100000
+DEFAULT_SEED = 0
+# the vectors inserted by the churn of the local data type, independent of the base batches
+CHURN_VECTOR_SEED = synthetic.DEFAULT_SEED + 1
+# base candidates of the ground truth per alive top k entity at the largest delete fraction
+BASE_CANDIDATE_FACTOR = 2
+
+
+def parse_churn(churn):
+    """ {"insert": 1, "delete": 2, "search": 7} -> (ops, probabilities) of the operations mix """
+    if not isinstance(churn, dict) or not churn:
+        raise Exception("churn should be a dict of operation ratios: %s" % str(churn))
+    for op in churn:
+        if op not in OPS:
+            raise Exception("Churn operation: %s not supported, supported: %s" % (op, OPS))
+    if not churn.get(DELETE):
+        raise Exception("Churn without delete never reaches the delete fractions: %s" % str(churn))
+    ops = [op for op in OPS if churn.get(op)]
+    weights = np.array([float(churn[op]) for op in ops])
+    return ops, weights / weights.sum()
+
+
+def dataset_vectors(data_type, dimension, start, rows):
+    """ The rows [start, start + rows) of the data_type shards, read across the shard boundaries """
+    vectors_per_file = utils.get_len_vectors_per_file(data_type, dimension)
+    parts = []
+    position = start
+    while position < start + rows:
+        offset = position % vectors_per_file
+        data = utils.load_vectors_file(utils.gen_file_name(position // vectors_per_file, dimension, data_type))
+        take = min(start + rows - position, vectors_per_file - offset)
+        if len(data) < offset + take:
+            raise Exception("Not enough vectors in the %s shards for the churn inserts, at: %d" % (data_type, position))
+        parts.append(np.asarray(data[offset:offset + take]))
+        position += take
+    return np.concatenate(parts)
+
+
+class ChurnRunner(InsertSearchRunner):
+    """
+    run a mixed insert/delete/search churn on the inserted collection:
+    1. search at the baseline
+    2. insert, delete by primary key expression and search at the ratios of the churn mix,
+       until every delete fraction (deleted / inserted entities) is reached, then search again
+    3. flush, compact and wait for the compaction, then search again
+    every stage reports the search latency and recall, and their drift from the baseline
+    """
+    name = "churn_performance"
+    # the churn changes the collection, every churn mix is run on its own prepared collection
+    prepare_keys = BaseRunner.prepare_keys + ["churn"]
+
+    def __init__(self, env, metric):
+        super(ChurnRunner, self).__init__(env, metric)
+        self._alive = None
+        self._next_id = 0
+        self._churn_vectors = []
+        self._base_candidates = None
+
+    def iter_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        build_index = collection["build_index"] if "build_index" in collection else False
+        index_type = collection["index_type"] if "index_type" in collection else None
+        index_param = collection["index_param"] if "index_param" in collection else None
+        other_fields = collection["other_fields"] if "other_fields" in collection else None
+        ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
+        guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        run_count = collection["run_count"]
+        warm_up_count = collection["warm_up_count"] if "warm_up_count" in collection else DEFAULT_WARM_UP_COUNT
+        top_k = collection["top_k"]
+        nq = collection["nq"]
+        search_param = collection["search_param"]
+        churns = collection["churn"] if isinstance(collection["churn"], list) else [collection["churn"]]
+        delete_fractions = sorted(collection["delete_fractions"]) if "delete_fractions" in collection \
+            else DEFAULT_DELETE_FRACTIONS
+        insert_batch = collection["insert_batch"] if "insert_batch" in collection else DEFAULT_INSERT_BATCH
+        delete_batch = collection["delete_batch"] if "delete_batch" in collection else DEFAULT_DELETE_BATCH
+        max_ops = collection["max_ops"] if "max_ops" in collection else DEFAULT_MAX_OPS
+        compact = collection["compact"] if "compact" in collection else True
+        compute_recall = collection["recall"] if "recall" in collection else True
+        seed = collection["seed"] if "seed" in collection else DEFAULT_SEED
+        for fraction in delete_fractions:
+            if not 0 < fraction < 1:
+                raise Exception("Invalid delete fraction: %s" % str(fraction))
+
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "other_fields": other_fields
+        }
+        index_info = {
+            "index_type": index_type,
+            "index_param": index_param
+        }
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        if data_type == "local" or not data_type:
+            # seeded, so that the ground truth can be computed from the same generator as the inserted vectors
+            query_vectors = synthetic.VectorGenerator(dimension).queries(nq)
+        else:
+            query_vectors = utils.get_vectors_from_binary(nq, dimension, data_type)
+        query_vectors = utils.read_only(query_vectors)
+        search_info = {
+            "topk": top_k,
+            "query": query_vectors,
+            "metric_type": utils.metric_type_trans(metric_type),
+            "params": search_param}
+        self.init_metric(self.name, collection_info, index_info, None)
+        for churn in churns:
+            parse_churn(churn)
+            case_metric = self.new_case_metric(search={
+                "nq": nq,
+                "topk": top_k,
+                "search_param": search_param,
+                "guarantee_timestamp": guarantee_timestamp
+            }, run_params={
+                "churn": churn,
+                "insert_batch": insert_batch,
+                "delete_batch": delete_batch,
+                "delete_fractions": delete_fractions,
+                "compact": compact
+            })
+            case = {
+                "collection_name": collection_name,
+                "index_field_name": index_field_name,
+                "other_fields": other_fields,
+                "dimension": dimension,
+                "data_type": data_type,
+                "vector_type": vector_type,
+                "collection_size": collection_size,
+                "ni_per": ni_per,
+                "insert_concurrency": insert_concurrency,
+                "build_index": build_index,
+                "index_type": index_type,
+                "index_param": index_param,
+                "metric_type": metric_type,
+                "run_count": run_count,
+                "warm_up_count": warm_up_count,
+                "filter_query": [],
+                "vector_query": {"vector": {index_field_name: search_info}},
+                "guarantee_timestamp": guarantee_timestamp,
+                "churn": churn,
+                "delete_fractions": delete_fractions,
+                "insert_batch": insert_batch,
+                "delete_batch": delete_batch,
+                "max_ops": max_ops,
+                "compact": compact,
+                "recall": compute_recall,
+                "seed": seed
+            }
+            yield case, case_metric
+
+    def prepare(self, **case_param):
+        super(ChurnRunner, self).prepare(**case_param)
+        # the ids of the inserted entities are their positions, the alive mask grows with the churn inserts
+        self._alive = np.ones(case_param["collection_size"], dtype=bool)
+        self._next_id = case_param["collection_size"]
+        self._churn_vectors = []
+        self._base_candidates = None
+
+    def _new_vectors(self, rows, **case_param):
+        data_type = case_param["data_type"]
+        if data_type == "local" or not data_type:
+            return synthetic.VectorGenerator(case_param["dimension"], seed=CHURN_VECTOR_SEED).batch(self._next_id, rows)
+        # the vectors following the inserted ones in the shards
+        return dataset_vectors(data_type, case_param["dimension"], self._next_id, rows)
+
+    def _insert(self, info, rows, **case_param):
+        vectors = self._new_vectors(rows, **case_param)
+        start_id = self._next_id
+        insert_time = self.insert_core(self.milvus, info, start_id,
+                                       utils.as_insert_vectors(vectors, case_param["data_type"]))
+        self._churn_vectors.append((start_id, vectors))
+        self._alive = np.concatenate([self._alive, np.ones(rows, dtype=bool)])
+        self._next_id += rows
+        return insert_time
+
+    def _delete(self, rng, rows):
+        alive_ids = np.flatnonzero(self._alive)
+        ids = rng.choice(alive_ids, min(rows, len(alive_ids)), replace=False)
+        start_time = time.time()
+        self.milvus.delete(ids.tolist())
+        delete_time = time.time() - start_time
+        self._alive[ids] = False
+        return delete_time
+
+    def _search(self, **case_param):
+        start_time = time.time()
+        self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                          guarantee_timestamp=case_param["guarantee_timestamp"])
+        return time.time() - start_time
+
+    def deleted_fraction(self):
+        return round(1 - int(self._alive.sum()) / float(len(self._alive)), 6)
+
+    def base_candidates(self, query_vectors, top_k, **case_param):
+        """
+        The nearest base entities searched once per collection, deep enough to keep top_k alive candidates
+        at the largest delete fraction, as the deletes are spread uniformly
+        """
+        if self._base_candidates is None:
+            depth = int(math.ceil(top_k / (1 - max(case_param["delete_fractions"])) * BASE_CANDIDATE_FACTOR))
+            depth = min(depth, case_param["collection_size"])
+            ids, distances = ground_truth.get_ground_truth(
+                case_param["data_type"], case_param["dimension"], case_param["collection_size"],
+                case_param["metric_type"], query_vectors, depth, ni=case_param["ni_per"])
+            if distances is None:
+                # the ivecs files have no distances to merge with the churn inserts
+                ids, distances = ground_truth.compute_ground_truth(
+                    case_param["data_type"], case_param["dimension"], case_param["collection_size"],
+                    case_param["metric_type"], query_vectors, depth, ni=case_param["ni_per"])
+            self._base_candidates = (ids, distances)
+        return self._base_candidates
+
+    def get_true_ids(self, query_vectors, top_k, **case_param):
+        """
+        Exact top_k among the alive entities: the alive base candidates and the vectors inserted by the churn,
+        the base is searched again only if a query has less than top_k alive candidates
+        """
+        alive = self._alive
+        id_filter = lambda ids: alive[ids]
+        size = case_param["collection_size"]
+        ids, distances = self.base_candidates(query_vectors, top_k, **case_param)
+        alive_ids = np.where((ids >= 0) & alive[np.clip(ids, 0, size - 1)], ids, -1)
+        searcher = ground_truth.ExactSearcher(query_vectors, case_param["metric_type"], top_k)
+        if ((alive_ids >= 0).sum(axis=1) < min(top_k, int(alive[:size].sum()))).any():
+            logger.info("Not enough alive base candidates, search the base vectors again")
+            ground_truth.add_base_vectors(searcher, case_param["data_type"], case_param["dimension"], size,
+                                          ni=case_param["ni_per"], id_filter=id_filter)
+        else:
+            searcher.merge(alive_ids, distances)
+        for start_id, vectors in self._churn_vectors:
+            searcher.add(start_id, vectors, id_filter=id_filter)
+        true_ids, _ = searcher.result()
+        return true_ids
+
+    def measure(self, stage, **case_param):
+        """ Search latency and recall of the collection at the current deleted fraction """
+        min_query_time, avg_query_time, histogram = run_search_rounds(self.milvus, case_param)
+        result = {
+            "stage": stage,
+            "deleted_fraction": self.deleted_fraction(),
+            "alive": int(self._alive.sum()),
+            "search_time": min_query_time,
+            "avc_search_time": avg_query_time
+        }
+        result.update(histogram.summary("search_time"))
+        if case_param["recall"]:
+            top_k = case_param["vector_query"]["vector"][case_param["index_field_name"]]["topk"]
+            query_vectors = case_param["vector_query"]["vector"][case_param["index_field_name"]]["query"]
+            query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                                          guarantee_timestamp=case_param["guarantee_timestamp"])
+            true_ids = self.get_true_ids(query_vectors, top_k, **case_param)
+            per_query = recall.recall_at_k(true_ids, self.milvus.get_ids(query_res, top_k), top_k)
+            result.update(recall.recall_summary(per_query))
+        logger.info(json.dumps(result, default=str))
+        return result
+
+    def churn(self, rng, ops, probabilities, target_fraction, **case_param):
+        """ Run the operations mix until the deleted fraction reaches target_fraction or max_ops are run """
+        info = self.milvus.get_info()
+        histograms = {op: LatencyHistogram() for op in ops}
+        count = 0
+        start_time = time.time()
+        while self.deleted_fraction() < target_fraction and count < case_param["max_ops"]:
+            op = ops[rng.choice(len(ops), p=probabilities)]
+            if op == INSERT:
+                histograms[op].record(self._insert(info, case_param["insert_batch"], **case_param))
+            elif op == DELETE:
+                histograms[op].record(self._delete(rng, case_param["delete_batch"]))
+            else:
+                histograms[op].record(self._search(**case_param))
+            count += 1
+        result = {"ops": count, "churn_time": round(time.time() - start_time, 2)}
+        # prefixed, the search_time fields of the stage are the measured searches
+        for op, histogram in histograms.items():
+            result["churn_%s_count" % op] = histogram.count
+            if histogram.count:
+                result.update(histogram.summary("churn_%s_time" % op, percentiles=[50, 99]))
+        return result
+
+    def compact(self):
+        """ Flush the deletes, trigger the compaction and wait until it is completed """
+        start_time = time.time()
+        self.milvus.flush()
+        flush_time = time.time() - start_time
+        compaction_id = self.milvus.compact()
+        state = self.milvus.wait_for_compaction(compaction_id)
+        return {
+            "flush_time": round(flush_time, 2),
+            "compaction_time": round(time.time() - start_time - flush_time, 2),
+            "compaction_state": state
+        }
+
+    def run_case(self, case_metric, **case_param):
+        ops, probabilities = parse_churn(case_param["churn"])
+        rng = np.random.default_rng(case_param["seed"])
+        baseline = self.measure("baseline", **case_param)
+        stages = [baseline]
+        for fraction in case_param["delete_fractions"]:
+            churn_result = self.churn(rng, ops, probabilities, fraction, **case_param)
+            stage = self.measure("delete_%s" % str(fraction), **case_param)
+            stage.update(churn_result)
+            stages.append(stage)
+            if stage["deleted_fraction"] < fraction:
+                logger.warning("Delete fraction: %s not reached in %d ops" % (str(fraction), case_param["max_ops"]))
+                break
+        compaction = None
+        if case_param["compact"]:
+            compaction = self.compact()
+            stage = self.measure("after_compaction", **case_param)
+            stage.update(compaction)
+            stages.append(stage)
+        for stage in stages:
+            # drift from the baseline: latency ratio and recall difference
+            if baseline["search_time_p50"]:
+                stage["search_time_p50_drift"] = round(stage["search_time_p50"] / baseline["search_time_p50"], 3)
+            if "acc" in baseline:
+                stage["acc_drift"] = round(stage["acc"] - baseline["acc"], 3)
+        tmp_result = {
+            "insert": self.insert_result,
+            "build_time": self.build_time,
+            "load_time": self.load_time,
+            "stages": stages,
+            "compaction": compaction
+        }
+        return tmp_result
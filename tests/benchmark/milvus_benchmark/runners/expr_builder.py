@@ -0,0 +1,134 @@
+import logging
+import numpy as np
+
+from milvus_benchmark import utils as util
+from milvus_benchmark.backend.expr import evaluate as evaluate_expr
+
+logger = logging.getLogger("milvus_benchmark.runners.expr_builder")
+
+RANGE = "range"
+TERM = "term"
+AND = "and"
+OR = "or"
+FILTER_TYPES = [RANGE, TERM, AND, OR]
+DEFAULT_SELECTIVITIES = [0.01, 0.1, 0.5]
+# the values of a term expression are sent in the request, larger terms are built as ranges
+MAX_TERM_VALUES = 100000
+DEFAULT_SEED = 0
+
+
+class FieldDistribution(object):
+    """
+    Distribution of a scalar column: the value of the entity of id i is low + i,
+    which is how generate_values fills the other_fields (the id, as float for the float fields)
+    """
+
+    def __init__(self, name, size, low=0):
+        self.name = name
+        self.size = size
+        self.low = low
+        self.is_float = name.startswith("float") or name.startswith("double")
+
+    def value(self, position):
+        value = self.low + int(position)
+        return float(value) if self.is_float else value
+
+    def values(self, ids):
+        values = self.low + np.asarray(ids, dtype=np.int64)
+        return values.astype(np.float64) if self.is_float else values
+
+
+def field_distributions(other_fields, collection_size):
+    """ The distributions of the `other_fields` of a suite ("int64,float"), inserted by generate_entities """
+    if not other_fields:
+        return []
+    return [FieldDistribution(name, collection_size) for name in other_fields.split(",")]
+
+
+class ExprBuilder(object):
+    """
+    Build boolean expressions over the scalar fields matching a target selectivity (fraction of the entities),
+    the matched ids are known from the distributions, so that the selectivity is exact:
+    range: f >= a && f < b, term: f in [...], and: two overlapping ranges on two fields,
+    or: two disjoint ranges on two fields
+    """
+
+    def __init__(self, distributions, seed=DEFAULT_SEED, max_term_values=MAX_TERM_VALUES):
+        if not distributions:
+            raise Exception("Expression builder needs scalar fields, set other_fields of the collection")
+        self._distributions = distributions
+        self._size = distributions[0].size
+        self._rng = np.random.default_rng(seed)
+        self._max_term_values = max_term_values
+
+    def _count(self, selectivity):
+        if not 0 < selectivity <= 1:
+            raise Exception("Invalid selectivity: %s" % str(selectivity))
+        return max(1, int(round(self._size * selectivity)))
+
+    def _start(self, count):
+        return int(self._rng.integers(0, self._size - count + 1))
+
+    def _range(self, field, start, end):
+        return util.range_expression(field.name, {"GTE": field.value(start), "LT": field.value(end)})
+
+    def _fields(self, number):
+        return [self._distributions[i % len(self._distributions)] for i in range(number)]
+
+    def supports(self, filter_type, selectivity):
+        """ False for the terms with more values than max_term_values """
+        return filter_type != TERM or self._count(selectivity) <= self._max_term_values
+
+    def build(self, filter_type, selectivity):
+        """ Return {"type", "target_selectivity", "selectivity", "count", "expr"} """
+        count = self._count(selectivity)
+        if filter_type == RANGE:
+            field = self._fields(1)[0]
+            start = self._start(count)
+            expression = self._range(field, start, start + count)
+        elif filter_type == TERM:
+            if count > self._max_term_values:
+                raise Exception("Term of %d values over the limit: %d, use a range" % (count, self._max_term_values))
+            field = self._fields(1)[0]
+            positions = np.sort(self._rng.choice(self._size, count, replace=False))
+            expression = util.term_expression(field.name, [field.value(position) for position in positions])
+        elif filter_type == AND:
+            # two ranges covering a span of up to 3 * count entities, overlapping on count entities
+            first, second = self._fields(2)
+            span = min(self._size, 3 * count)
+            start = self._start(span)
+            middle = start + (span + count) // 2
+            expression = "(%s) && (%s)" % (self._range(first, start, middle),
+                                           self._range(second, middle - count, start + span))
+        elif filter_type == OR:
+            # two disjoint ranges of count / 2 entities
+            first, second = self._fields(2)
+            half = count // 2
+            start = self._start(count)
+            expression = "(%s) || (%s)" % (self._range(first, start, start + half),
+                                           self._range(second, start + half, start + count))
+        else:
+            raise Exception("Filter type: %s not supported, supported: %s" % (filter_type, FILTER_TYPES))
+        return {
+            "type": filter_type,
+            "target_selectivity": selectivity,
+            "selectivity": round(count / float(self._size), 6),
+            "count": count,
+            "expr": expression
+        }
+
+    def id_filter(self, expression):
+        """ id -> matched mask of the expression, evaluated on the known values, used for the ground truth """
+        def match(ids):
+            columns = {field.name: field.values(ids) for field in self._distributions}
+            return evaluate_expr(expression, columns)
+        return match
+
+    def measure(self, expression):
+        """ Selectivity of the expression evaluated on all the entities """
+        matched = 0
+        batch = 1000000
+        match = self.id_filter(expression)
+        for start in range(0, self._size, batch):
+            matched += int(match(np.arange(start, min(start + batch, self._size))).sum())
+        return matched / float(self._size)
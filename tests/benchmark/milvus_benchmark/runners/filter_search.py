@@ -0,0 +1,163 @@
+import json
+import hashlib
+import logging
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import recall
+from milvus_benchmark.runners import synthetic
+from milvus_benchmark.runners import ground_truth
+from milvus_benchmark.runners.search import InsertSearchRunner, run_search_rounds, latency_result, DEFAULT_WARM_UP_COUNT
+from milvus_benchmark.runners.expr_builder import ExprBuilder, field_distributions, DEFAULT_SELECTIVITIES, RANGE, \
+    MAX_TERM_VALUES
+
+logger = logging.getLogger("milvus_benchmark.runners.filter_search")
+
+
+class FilterSearchRunner(InsertSearchRunner):
+    """
+    run filtered search at controlled selectivity:
+    1. insert the collection with the scalar other_fields and build the index once
+    2. every case searches with an expression built for a filter type and a target selectivity
+    3. report the latency and the recall against the exact filtered ground truth
+    """
+    name = "filter_search_performance"
+
+    def __init__(self, env, metric):
+        super(FilterSearchRunner, self).__init__(env, metric)
+        # (filter expression, top_k) -> ground truth ids
+        self._true_ids = dict()
+
+    def iter_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        other_fields = collection["other_fields"] if "other_fields" in collection else None
+        if not other_fields:
+            raise Exception("other_fields should be set for filter search: %s" % collection_name)
+        build_index = collection["build_index"] if "build_index" in collection else False
+        index_type = collection["index_type"] if "index_type" in collection else None
+        index_param = collection["index_param"] if "index_param" in collection else None
+        run_count = collection["run_count"]
+        warm_up_count = collection["warm_up_count"] if "warm_up_count" in collection else DEFAULT_WARM_UP_COUNT
+        top_ks = collection["top_ks"]
+        nqs = collection["nqs"]
+        search_params = collection["search_params"]
+        ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
+        guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        selectivities = collection["selectivities"] if "selectivities" in collection else DEFAULT_SELECTIVITIES
+        filter_types = collection["filter_types"] if "filter_types" in collection else [RANGE]
+        compute_recall = collection["recall"] if "recall" in collection else True
+        builder = ExprBuilder(field_distributions(other_fields, collection_size),
+                              seed=collection["seed"] if "seed" in collection else 0)
+
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "other_fields": other_fields
+        }
+        index_info = {
+            "index_type": index_type,
+            "index_param": index_param
+        }
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        if data_type == "local" or not data_type:
+            # seeded, so that the ground truth can be computed from the same generator as the inserted vectors
+            base_query_vectors = synthetic.VectorGenerator(dimension).queries(max(nqs))
+        else:
+            base_query_vectors = utils.get_vectors_from_binary(max(nqs), dimension, data_type)
+        base_query_vectors = utils.read_only(base_query_vectors)
+        self.init_metric(self.name, collection_info, index_info, None)
+        for filter_type in filter_types:
+            for selectivity in selectivities:
+                if not builder.supports(filter_type, selectivity):
+                    logger.warning("Skip filter: %s at selectivity: %s, over %d term values" % (
+                        filter_type, selectivity, MAX_TERM_VALUES))
+                    continue
+                filter_info = builder.build(filter_type, selectivity)
+                logger.info("Filter: %s, selectivity: %s" % (filter_type, filter_info["selectivity"]))
+                for search_param in search_params:
+                    for nq in nqs:
+                        query_vectors = base_query_vectors[0:nq]
+                        for top_k in top_ks:
+                            search_info = {
+                                "topk": top_k,
+                                "query": query_vectors,
+                                "metric_type": utils.metric_type_trans(metric_type),
+                                "params": search_param}
+                            case_metric = self.new_case_metric(search={
+                                "nq": nq,
+                                "topk": top_k,
+                                "search_param": search_param,
+                                "filter": {k: v for k, v in filter_info.items() if k != "expr"},
+                                "guarantee_timestamp": guarantee_timestamp
+                            })
+                            case = {
+                                "collection_name": collection_name,
+                                "index_field_name": index_field_name,
+                                "other_fields": other_fields,
+                                "dimension": dimension,
+                                "data_type": data_type,
+                                "vector_type": vector_type,
+                                "collection_size": collection_size,
+                                "ni_per": ni_per,
+                                "insert_concurrency": insert_concurrency,
+                                "build_index": build_index,
+                                "index_type": index_type,
+                                "index_param": index_param,
+                                "metric_type": metric_type,
+                                "run_count": run_count,
+                                "warm_up_count": warm_up_count,
+                                "filter_query": [{"expr": filter_info["expr"]}],
+                                "filter_info": filter_info,
+                                "id_filter": builder.id_filter(filter_info["expr"]),
+                                "vector_query": {"vector": {index_field_name: search_info}},
+                                "guarantee_timestamp": guarantee_timestamp,
+                                "recall": compute_recall
+                            }
+                            yield case, case_metric
+
+    def get_true_ids(self, query_vectors, top_k, **case_param):
+        """ Exact top_k among the entities matched by the filter, computed once per filter and top_k """
+        expression = case_param["filter_info"]["expr"]
+        key = (expression, top_k, len(query_vectors))
+        if key in self._true_ids:
+            return self._true_ids[key]
+        true_ids, _ = ground_truth.get_ground_truth(
+            case_param["data_type"], case_param["dimension"], case_param["collection_size"],
+            case_param["metric_type"], query_vectors, top_k, id_filter=case_param["id_filter"],
+            id_filter_name=hashlib.md5(expression.encode("utf-8")).hexdigest(), ni=case_param["ni_per"])
+        self._true_ids[key] = true_ids
+        return true_ids
+
+    def run_case(self, case_metric, **case_param):
+        logger.info(case_metric.search)
+        nq = case_metric.search["nq"]
+        top_k = case_metric.search["topk"]
+        filter_info = case_param["filter_info"]
+        min_query_time, avg_query_time, histogram = run_search_rounds(self.milvus, case_param)
+        tmp_result = {
+            "insert": self.insert_result,
+            "build_time": self.build_time,
+            "load_time": self.load_time,
+            "filter_type": filter_info["type"],
+            "selectivity": filter_info["selectivity"],
+            "search_time": min_query_time,
+            "avc_search_time": avg_query_time
+        }
+        tmp_result.update(latency_result(histogram))
+        if case_param["recall"]:
+            query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                                          guarantee_timestamp=case_param["guarantee_timestamp"])
+            query_vectors = case_param["vector_query"]["vector"][case_param["index_field_name"]]["query"]
+            true_ids = self.get_true_ids(query_vectors, top_k, **case_param)
+            # less entities than top_k could match the filter
+            k = max(1, min(top_k, filter_info["count"]))
+            result_ids = self.milvus.get_ids(query_res, top_k)
+            per_query = recall.recall_at_k(true_ids[:nq, :k], result_ids, k)
+            tmp_result.update(recall.recall_summary(per_query))
+        logger.info(json.dumps({k: v for k, v in tmp_result.items() if not k.endswith("_histogram")}, default=str))
+        return tmp_result
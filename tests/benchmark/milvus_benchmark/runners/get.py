@@ -27,6 +27,7 @@ class GetRunner(BaseRunner):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         vector_type = utils.get_vector_type(data_type)
         other_fields = collection["other_fields"] if "other_fields" in collection else None
         ids_length_list = collection["ids_length_list"]
@@ -65,6 +66,7 @@ class GetRunner(BaseRunner):
                 "dimension": dimension,
                 "collection_size": collection_size,
                 "ni_per": ni_per,
+                "insert_concurrency": insert_concurrency,
                 "metric_type": metric_type,
                 "vector_type": vector_type,
                 "other_fields": other_fields,
@@ -112,7 +114,8 @@ class InsertGetRunner(GetRunner):
             time.sleep(utils.DELETE_INTERVAL_TIME)
         self.milvus.create_collection(dimension, data_type=vector_type, other_fields=other_fields)
         self.insert(self.milvus, collection_name, case_param["data_type"], dimension,
-                    case_param["collection_size"], case_param["ni_per"])
+                    case_param["collection_size"], case_param["ni_per"],
+                    insert_concurrency=case_param["insert_concurrency"])
         start_time = time.time()
         self.milvus.flush()
         flush_time = round(time.time() - start_time, 2)
@@ -0,0 +1,252 @@
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from milvus_benchmark import config
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import synthetic
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger("milvus_benchmark.runners.ground_truth")
+
+GROUND_TRUTH_CACHE_DIR = config.RAW_DATA_DIR + 'ground_truth/'
+# rows of the base vectors compared with all the queries at once
+DEFAULT_TILE_SIZE = 65536
+DEFAULT_THREADS = os.cpu_count() or 4
+# bytes of the distance matrices of the tiles searched at the same time
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+# float32 nq x tile matrices alive at once while computing the l2 distances of a tile
+DISTANCE_MATRICES = 4
+BINARY_METRICS = ["hamming", "jaccard"]
+
+
+def _unpack_bits(vectors):
+    """ Packed uint8 binary vectors -> 0/1 float32 matrix, so that the distances can be computed with GEMM """
+    return np.unpackbits(np.ascontiguousarray(vectors, dtype=np.uint8), axis=1).astype(np.float32)
+
+
+def prepare_vectors(vectors, metric_type):
+    """ Convert the query or base vectors to the float32 matrix the distance functions work on """
+    if metric_type in BINARY_METRICS:
+        if len(vectors) and isinstance(vectors[0], bytes):
+            vectors = np.frombuffer(b"".join(vectors), dtype=np.uint8).reshape(len(vectors), -1)
+        return _unpack_bits(vectors)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def pairwise_distances(query, base, metric_type, query_norms=None):
+    """
+    Distances between all the queries and the base vectors of a tile, smaller is closer for every metric:
+    l2: squared euclidean distance, ip: negative inner product,
+    hamming: count of different bits, jaccard: 1 - intersection / union
+    """
+    dot = query @ base.T
+    if metric_type == "l2":
+        query_norms = query_norms if query_norms is not None else (query ** 2).sum(axis=1)
+        dist = query_norms[:, None] - 2 * dot + (base ** 2).sum(axis=1)[None, :]
+        return np.maximum(dist, 0, out=dist)
+    elif metric_type == "ip":
+        return -dot
+    elif metric_type in BINARY_METRICS:
+        query_norms = query_norms if query_norms is not None else query.sum(axis=1)
+        union = query_norms[:, None] + base.sum(axis=1)[None, :]
+        if metric_type == "hamming":
+            return union - 2 * dot
+        union = union - dot
+        return 1 - np.divide(dot, union, out=np.ones_like(dot), where=union > 0)
+    else:
+        raise Exception("metric_type: %s not supported" % metric_type)
+
+
+def tile_rows(nq, tile_size, threads, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """ Rows of a tile, at most tile_size, so that the distances of the threads tiles fit in the memory budget """
+    rows = memory_budget // (max(1, threads) * max(1, nq) * DISTANCE_MATRICES * 4)
+    return int(max(1, min(tile_size, rows)))
+
+
+def merge_top_k(best_dist, best_ids, dist, ids, top_k):
+    """ Merge the candidates of a tile into the current top k of every query, keep the rows sorted """
+    all_dist = np.concatenate([best_dist, dist], axis=1)
+    all_ids = np.concatenate([best_ids, np.broadcast_to(ids, dist.shape)], axis=1)
+    if all_dist.shape[1] > top_k:
+        part = np.argpartition(all_dist, top_k - 1, axis=1)[:, :top_k]
+        all_dist = np.take_along_axis(all_dist, part, axis=1)
+        all_ids = np.take_along_axis(all_ids, part, axis=1)
+    order = np.argsort(all_dist, axis=1, kind="stable")
+    return np.take_along_axis(all_dist, order, axis=1), np.take_along_axis(all_ids, order, axis=1)
+
+
+class ExactSearcher(object):
+    """
+    Blocked brute force kNN: the base vectors are streamed in tiles, every tile is searched
+    by a thread (numpy GEMM or faiss IndexFlat release the GIL) and merged into the per query top k
+    """
+
+    def __init__(self, query_vectors, metric_type, top_k, tile_size=DEFAULT_TILE_SIZE, threads=DEFAULT_THREADS,
+                 memory_budget=DEFAULT_MEMORY_BUDGET):
+        self._metric_type = metric_type
+        self._top_k = top_k
+        self._threads = threads
+        self._query = prepare_vectors(query_vectors, metric_type)
+        self._tile_size = tile_rows(len(self._query), tile_size, threads, memory_budget)
+        if metric_type == "l2":
+            self._query_norms = (self._query ** 2).sum(axis=1)
+        elif metric_type in BINARY_METRICS:
+            self._query_norms = self._query.sum(axis=1)
+        else:
+            self._query_norms = None
+        nq = len(self._query)
+        self._dist = np.full((nq, 0), np.inf, dtype=np.float32)
+        self._ids = np.full((nq, 0), -1, dtype=np.int64)
+
+    def _search_tile(self, start_id, base, id_filter=None):
+        base = prepare_vectors(base, self._metric_type)
+        ids = np.arange(start_id, start_id + len(base), dtype=np.int64)
+        if id_filter is not None:
+            mask = id_filter(ids)
+            base, ids = base[mask], ids[mask]
+            if not len(ids):
+                return None
+        k = min(self._top_k, len(base))
+        if faiss is not None and self._metric_type in ["l2", "ip"]:
+            index = faiss.IndexFlatL2(base.shape[1]) if self._metric_type == "l2" else faiss.IndexFlatIP(base.shape[1])
+            index.add(base)
+            dist, pos = index.search(self._query, k)
+            dist = dist if self._metric_type == "l2" else -dist
+            return dist.astype(np.float32), ids[pos]
+        dist = pairwise_distances(self._query, base, self._metric_type, self._query_norms)
+        if dist.shape[1] > k:
+            pos = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            pos = np.broadcast_to(np.arange(dist.shape[1]), dist.shape)
+        return np.take_along_axis(dist, pos, axis=1).astype(np.float32), ids[pos]
+
+    def add(self, start_id, vectors, id_filter=None):
+        """ Search a block of base vectors whose first id is start_id, the block is split into tiles """
+        offsets = list(range(0, len(vectors), self._tile_size))
+        with ThreadPoolExecutor(max_workers=self._threads) as executor:
+            # at most threads tiles are submitted at once, the tile size keeps them in the memory budget
+            for i in range(0, len(offsets), self._threads):
+                futures = [executor.submit(self._search_tile, start_id + offset,
+                                           vectors[offset:offset + self._tile_size], id_filter)
+                           for offset in offsets[i:i + self._threads]]
+                for future in futures:
+                    res = future.result()
+                    if res is not None:
+                        self._dist, self._ids = merge_top_k(self._dist, self._ids, res[0], res[1], self._top_k)
+
+    def merge(self, ids, distances):
+        """ Merge (nq, m) candidates in the form returned by result, the -1 ids are skipped """
+        ids = np.asarray(ids, dtype=np.int64)
+        dist = np.asarray(distances, dtype=np.float32)
+        if self._metric_type == "ip":
+            dist = -dist
+        dist = np.where(ids == -1, np.inf, dist).astype(np.float32)
+        self._dist, self._ids = merge_top_k(self._dist, self._ids, dist, ids, self._top_k)
+
+    def result(self):
+        """ Return (nq, top_k) ids and distances, sorted from the closest, padded with -1/inf """
+        nq = len(self._query)
+        ids = np.full((nq, self._top_k), -1, dtype=np.int64)
+        dist = np.full((nq, self._top_k), np.inf, dtype=np.float32)
+        ids[:, :self._ids.shape[1]] = self._ids
+        dist[:, :self._dist.shape[1]] = self._dist
+        if self._metric_type == "ip":
+            dist = -dist
+        return ids, dist
+
+
+def fingerprint(data_type, dimension, collection_size, metric_type, top_k, query_vectors, id_filter_name=None):
+    """ md5 key of the ground truth: dataset, size, metric, k and the query vectors themselves """
+    query = prepare_vectors(query_vectors, metric_type)
+    key = {
+        "data_type": data_type,
+        "dimension": dimension,
+        "collection_size": collection_size,
+        "metric_type": metric_type,
+        "top_k": top_k,
+        "nq": len(query),
+        "query_md5": hashlib.md5(query.tobytes()).hexdigest(),
+        "filter": id_filter_name
+    }
+    return hashlib.md5(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def add_base_vectors(searcher, data_type, dimension, collection_size, ni=None, id_filter=None):
+    """
+    Add the collection_size vectors inserted by BaseRunner.insert into the searcher:
+    the seeded synthetic batches of ni rows for the local data type, the data_type shards otherwise
+    """
+    if data_type == "local" or not data_type:
+        if not ni:
+            raise Exception("ni is needed to generate the vectors of data type: local")
+        for start_id, vectors in synthetic.VectorGenerator(dimension).iter_batches(collection_size, ni):
+            searcher.add(start_id, vectors, id_filter=id_filter)
+        return searcher
+    vectors_per_file = utils.get_len_vectors_per_file(data_type, dimension)
+    file_num = (collection_size + vectors_per_file - 1) // vectors_per_file
+    for i in range(file_num):
+        file_name = utils.gen_file_name(i, dimension, data_type)
+        logger.debug("Search ground truth in file: %s" % file_name)
+        data = utils.load_vectors_file(file_name)
+        rows = min(len(data), collection_size - i * vectors_per_file)
+        searcher.add(i * vectors_per_file, data[:rows], id_filter=id_filter)
+    return searcher
+
+
+def compute_ground_truth(data_type, dimension, collection_size, metric_type, query_vectors, top_k,
+                         id_filter=None, ni=None, tile_size=DEFAULT_TILE_SIZE, threads=DEFAULT_THREADS,
+                         memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Exact kNN of the query vectors over the first collection_size vectors of the data_type shards,
+    or of the synthetic batches of ni rows for the local data type
+    """
+    searcher = ExactSearcher(query_vectors, metric_type, top_k, tile_size=tile_size, threads=threads,
+                             memory_budget=memory_budget)
+    return add_base_vectors(searcher, data_type, dimension, collection_size, ni=ni, id_filter=id_filter).result()
+
+
+def get_ground_truth(data_type, dimension, collection_size, metric_type, query_vectors, top_k,
+                     id_filter=None, id_filter_name=None, ni=None, cache_dir=GROUND_TRUTH_CACHE_DIR):
+    """
+    Return the (nq, top_k) ground truth ids and distances:
+    the precomputed ivecs files are used for sift l2 when available, otherwise the result is computed
+    and cached on disk as <cache_dir>/<fingerprint>.npz
+    the local data type is computed from the synthetic batches of ni rows every time, it is not cached
+    """
+    if data_type == "local" or not data_type:
+        return compute_ground_truth(data_type, dimension, collection_size, metric_type, query_vectors, top_k,
+                                    id_filter=id_filter, ni=ni)
+    if data_type == "sift" and metric_type == "l2" and id_filter is None \
+            and str(collection_size) in utils.GROUNDTRUTH_MAP:
+        true_ids = utils.get_ground_truth_ids(collection_size)
+        if true_ids.shape[1] >= top_k:
+            return true_ids[:len(query_vectors), :top_k].astype(np.int64), None
+    if id_filter is not None and id_filter_name is None:
+        raise Exception("id_filter_name is needed to cache the ground truth of a filter")
+    key = fingerprint(data_type, dimension, collection_size, metric_type, top_k, query_vectors, id_filter_name)
+    cache_file = os.path.join(cache_dir, "%s.npz" % key)
+    if os.path.isfile(cache_file):
+        logger.info("Load ground truth from cache: %s" % cache_file)
+        cached = np.load(cache_file)
+        return cached["ids"], cached["distances"]
+    logger.info("Start compute ground truth: %s" % json.dumps({
+        "data_type": data_type, "collection_size": collection_size, "metric_type": metric_type, "top_k": top_k}))
+    ids, distances = compute_ground_truth(data_type, dimension, collection_size, metric_type, query_vectors, top_k,
+                                          id_filter=id_filter)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_file = cache_file + ".tmp.npz"
+        np.savez(tmp_file, ids=ids, distances=distances)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning("Save ground truth cache failed: %s" % str(e))
+    return ids, distances
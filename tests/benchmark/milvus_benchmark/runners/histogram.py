@@ -0,0 +1,153 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.runners.histogram")
+
+# values are recorded in microseconds
+UNIT_SCALE = 1000000
+# the top 7 bits of a value are kept, the leading one included: 2^6 sub buckets per power of two,
+# relative error of a recorded value is less than 1/64
+SUB_BUCKET_BITS = 7
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+
+
+def _percentile_name(percentile):
+    """ 50 -> p50, 99.9 -> p999 """
+    return "p" + ("%g" % percentile).replace(".", "")
+
+
+class LatencyHistogram(object):
+    """
+    HDR style log-linear latency histogram with microsecond resolution:
+    values below 2^SUB_BUCKET_BITS us are exact, larger values are grouped into 2^(SUB_BUCKET_BITS - 1)
+    linear sub buckets per power of two, only the non-empty buckets are stored
+    """
+
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS):
+        self._sub_bucket_bits = sub_bucket_bits
+        self._buckets = dict()
+        self._count = 0
+        self._min = None
+        self._max = None
+        self._total = 0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        """ Mean of the recorded latencies in seconds, exact """
+        return float(self._total) / self._count / UNIT_SCALE if self._count else 0.0
+
+    @property
+    def max(self):
+        """ Max of the recorded latencies in seconds, exact """
+        return float(self._max or 0) / UNIT_SCALE
+
+    def _bucket(self, value):
+        """ Return the lower bound of the bucket of the value (in us) """
+        shift = max(0, int(value).bit_length() - self._sub_bucket_bits)
+        return (value >> shift) << shift
+
+    def _width(self, lower):
+        return 1 << max(0, int(lower).bit_length() - self._sub_bucket_bits)
+
+    def record(self, seconds, count=1):
+        """ Record a latency in seconds """
+        value = max(0, int(round(seconds * UNIT_SCALE)))
+        lower = self._bucket(value)
+        self._buckets[lower] = self._buckets.get(lower, 0) + count
+        self._count += count
+        self._total += value * count
+        self._min = value if self._min is None else min(self._min, value)
+        self._max = value if self._max is None else max(self._max, value)
+
+    def merge(self, other):
+        for lower, count in other._buckets.items():
+            self._buckets[lower] = self._buckets.get(lower, 0) + count
+        self._count += other._count
+        self._total += other._total
+        if other._count:
+            self._min = other._min if self._min is None else min(self._min, other._min)
+            self._max = other._max if self._max is None else max(self._max, other._max)
+
+    def _arrays(self):
+        """ Bucket representative values (highest equivalent value, in us) and counts, ascending """
+        lowers = np.array(sorted(self._buckets), dtype=np.int64)
+        counts = np.array([self._buckets[lower] for lower in lowers], dtype=np.int64)
+        values = lowers + np.array([self._width(lower) for lower in lowers], dtype=np.int64) - 1
+        if self._max is not None and len(values):
+            values[-1] = min(values[-1], self._max)
+        return values, counts
+
+    def value_at_percentile(self, percentile):
+        """ Return the latency in seconds at the percentile """
+        if not self._count:
+            return 0.0
+        values, counts = self._arrays()
+        rank = max(1, int(np.ceil(percentile / 100.0 * self._count)))
+        index = int(np.searchsorted(np.cumsum(counts), rank))
+        return float(values[min(index, len(values) - 1)]) / UNIT_SCALE
+
+    def samples(self):
+        """ Expand the histogram into an array of latencies in seconds, one per recorded value """
+        values, counts = self._arrays()
+        return np.repeat(values, counts).astype(np.float64) / UNIT_SCALE
+
+    def bootstrap_ci(self, percentile, resamples=BOOTSTRAP_RESAMPLES, confidence=BOOTSTRAP_CONFIDENCE, seed=0):
+        """
+        Confidence interval of the latency at the percentile, computed by multinomial resampling
+        of the bucket counts, which is equivalent to resampling the recorded values
+        """
+        if not self._count:
+            return [0.0, 0.0]
+        values, counts = self._arrays()
+        rng = np.random.default_rng(seed)
+        resampled = rng.multinomial(self._count, counts / float(self._count), size=resamples)
+        rank = max(1, int(np.ceil(percentile / 100.0 * self._count)))
+        indexes = np.argmax(np.cumsum(resampled, axis=1) >= rank, axis=1)
+        estimates = values[indexes].astype(np.float64) / UNIT_SCALE
+        alpha = (1 - confidence) / 2 * 100
+        return [round(float(np.percentile(estimates, alpha)), 6), round(float(np.percentile(estimates, 100 - alpha)), 6)]
+
+    def summary(self, prefix, percentiles=None, ci_percentiles=None):
+        """
+        Return the latency distribution fields in seconds, e.g. for prefix `search_time`:
+        search_time_p50, search_time_p90, search_time_p99, search_time_p999, search_time_max,
+        and the bootstrap confidence interval search_time_p99_ci
+        """
+        percentiles = percentiles if percentiles else DEFAULT_PERCENTILES
+        ci_percentiles = ci_percentiles if ci_percentiles else [50, 99]
+        result = dict()
+        for percentile in percentiles:
+            result["%s_%s" % (prefix, _percentile_name(percentile))] = round(self.value_at_percentile(percentile), 6)
+        result["%s_max" % prefix] = round(float(self._max or 0) / UNIT_SCALE, 6)
+        for percentile in ci_percentiles:
+            result["%s_%s_ci" % (prefix, _percentile_name(percentile))] = self.bootstrap_ci(percentile)
+        return result
+
+    def to_dict(self):
+        """ Compact serializable form, stored in the case result """
+        return {
+            "unit": "us",
+            "sub_bucket_bits": self._sub_bucket_bits,
+            "count": self._count,
+            "min": self._min,
+            "max": self._max,
+            "total": self._total,
+            "buckets": [[int(lower), int(self._buckets[lower])] for lower in sorted(self._buckets)]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(sub_bucket_bits=data["sub_bucket_bits"] if "sub_bucket_bits" in data else SUB_BUCKET_BITS)
+        for lower, count in data["buckets"]:
+            histogram._buckets[int(lower)] = histogram._buckets.get(int(lower), 0) + int(count)
+        histogram._count = sum(histogram._buckets.values())
+        histogram._min = data["min"] if "min" in data else None
+        histogram._max = data["max"] if "max" in data else None
+        histogram._total = data["total"] if "total" in data else 0
+        return histogram
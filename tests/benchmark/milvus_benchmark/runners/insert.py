@@ -19,6 +19,7 @@ class InsertRunner(BaseRunner):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         build_index = collection["build_index"] if "build_index" in collection else False
         index_info = None
         vector_type = utils.get_vector_type(data_type)
@@ -58,6 +59,7 @@ class InsertRunner(BaseRunner):
             "dimension": dimension,
             "collection_size": collection_size,
             "ni_per": ni_per,
+            "insert_concurrency": insert_concurrency,
             "metric_type": metric_type,
             "vector_type": vector_type,
             "other_fields": other_fields,
@@ -107,7 +109,7 @@ class InsertRunner(BaseRunner):
         index_field_name = case_param["index_field_name"]
         build_index = case_param["build_index"]
 
-        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"], insert_concurrency=case_param["insert_concurrency"])
         flush_time = 0.0
         build_time = 0.0
         if case_param["flush_after_insert"] is True:
@@ -135,6 +137,7 @@ class BPInsertRunner(BaseRunner):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         ni_pers = collection["ni_pers"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         build_index = collection["build_index"] if "build_index" in collection else False
         index_info = None
         vector_type = utils.get_vector_type(data_type)
@@ -175,6 +178,7 @@ class BPInsertRunner(BaseRunner):
                 "dimension": dimension,
                 "collection_size": collection_size,
                 "ni_per": ni_per,
+                "insert_concurrency": insert_concurrency,
                 "metric_type": metric_type,
                 "vector_type": vector_type,
                 "other_fields": other_fields,
@@ -225,7 +229,7 @@ class BPInsertRunner(BaseRunner):
         index_field_name = case_param["index_field_name"]
         build_index = case_param["build_index"]
         # TODO:
-        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"], insert_concurrency=case_param["insert_concurrency"])
         flush_time = 0.0
         build_time = 0.0
         if case_param["flush_after_insert"] is True:
@@ -0,0 +1,140 @@
+import time
+import queue
+import logging
+import threading
+import traceback
+
+from milvus_benchmark.runners.pool import ConnectionPool, LEAST_LOADED
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.insert_pipeline")
+
+DEFAULT_QUEUE_SIZE_PER_WORKER = 2
+# sentinel put in the queue by the reader once all batches are produced
+_STOP = None
+
+
+def parse_insert_concurrency(insert_concurrency):
+    """
+    Parse the `insert_concurrency` suite key, it could be:
+    - an int: the number of connections, with one worker thread per connection
+    - a dict: {"connections": 4, "workers": 8, "queue_size": 16}
+    Return None if inserts should stay on the single runner connection
+    """
+    if not insert_concurrency:
+        return None
+    if isinstance(insert_concurrency, int):
+        insert_concurrency = {"connections": insert_concurrency}
+    if not isinstance(insert_concurrency, dict):
+        raise Exception("insert_concurrency: %s not supported" % str(insert_concurrency))
+    connections = int(insert_concurrency["connections"]) if "connections" in insert_concurrency else 1
+    workers = int(insert_concurrency["workers"]) if "workers" in insert_concurrency else connections
+    queue_size = int(insert_concurrency["queue_size"]) if "queue_size" in insert_concurrency \
+        else workers * DEFAULT_QUEUE_SIZE_PER_WORKER
+    if connections < 1 or workers < 1 or queue_size < 1:
+        raise Exception("insert_concurrency: %s should be positive" % str(insert_concurrency))
+    if connections == 1 and workers == 1:
+        return None
+    return {"connections": connections, "workers": workers, "queue_size": queue_size}
+
+
+class ParallelInserter(object):
+    """
+    Producer/consumer insert pipeline:
+    one reader thread slices the batches into a bounded queue (backpressure on the reader),
+    the worker threads insert them concurrently over several connections,
+    every batch carries its own start id so the id ranges of the workers are disjoint
+    """
+
+    def __init__(self, host, port, collection_name, info, connections=1, workers=None, queue_size=None):
+        self._collection_name = collection_name
+        self._info = info
+        self._workers = workers if workers else connections
+        self._queue = queue.Queue(maxsize=queue_size if queue_size else self._workers * DEFAULT_QUEUE_SIZE_PER_WORKER)
+        # the workers borrow the least loaded connection for every batch
+        self._pool = ConnectionPool(host, port, collection_name=collection_name, size=connections,
+                                    policy=LEAST_LOADED)
+        self._lock = threading.Lock()
+        self._histogram = LatencyHistogram()
+        self._rows = 0
+        # the first error stops the reader and the workers
+        self._failed = threading.Event()
+        self._error = None
+
+    def _fail(self, e):
+        with self._lock:
+            if self._error is None:
+                self._error = e
+        self._failed.set()
+
+    def _read(self, batches):
+        try:
+            for start_id, vectors in batches:
+                if self._failed.is_set():
+                    break
+                self._queue.put((start_id, vectors))
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            self._fail(e)
+        finally:
+            for _ in range(self._workers):
+                self._queue.put(_STOP)
+
+    def _insert(self, worker_id):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            if self._failed.is_set():
+                continue
+            start_id, vectors = item
+            ids = [k for k in range(start_id, start_id + len(vectors))]
+            entities = utils.generate_entities(self._info, vectors, ids)
+            try:
+                with self._pool.borrow() as milvus:
+                    ni_start_time = time.time()
+                    res_ids = milvus.insert(entities)
+                    ni_time = time.time() - ni_start_time
+                if res_ids is None:
+                    raise Exception("Insert failed, start id: %d, rows: %d" % (start_id, len(vectors)))
+            except Exception as e:
+                logger.error(traceback.format_exc())
+                self._fail(e)
+                continue
+            with self._lock:
+                self._histogram.record(ni_time)
+                self._rows += len(vectors)
+
+    def run(self, batches):
+        """ Insert all (start_id, vectors) batches and return the aggregated result """
+        threads = [threading.Thread(target=self._insert, args=(i,), daemon=True) for i in range(self._workers)]
+        reader = threading.Thread(target=self._read, args=(batches,), daemon=True)
+        start_time = time.time()
+        try:
+            for t in threads:
+                t.start()
+            reader.start()
+            reader.join()
+            for t in threads:
+                t.join()
+        finally:
+            self._pool.close()
+        total_time = time.time() - start_time
+        if self._error is not None:
+            raise self._error
+        histogram = self._histogram
+        result = {
+            "total_time": round(total_time, 2),
+            "rps": round(self._rows / total_time, 2) if total_time else 0.0,
+            "ni_time": round(histogram.mean, 2),
+            "ni_time_p50": round(histogram.value_at_percentile(50), 3),
+            "ni_time_p99": round(histogram.value_at_percentile(99), 3),
+            "ni_time_max": round(histogram.max, 3),
+            "ni_time_histogram": histogram.to_dict(),
+            "connections": self._pool.size,
+            "workers": self._workers
+        }
+        result.update(self._pool.stats())
+        logger.info(result)
+        return result
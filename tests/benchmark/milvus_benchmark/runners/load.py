@@ -0,0 +1,248 @@
+import time
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import synthetic
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.pool import ConnectionPool
+
+logger = logging.getLogger("milvus_benchmark.runners.load")
+
+COLLECTION = "collection"
+PARTITIONS = "partitions"
+DEFAULT_RUN_COUNT = 3
+DEFAULT_PROGRESS_INTERVAL = 0.5
+DEFAULT_LOAD_TIMEOUT = 3000
+PARTITION_PREFIX = "partition_"
+
+
+def partition_names(partition_count):
+    """ The partitions created by the load runner, the default partition is used for a single partition """
+    if partition_count <= 1:
+        return []
+    return ["%s%d" % (PARTITION_PREFIX, i) for i in range(partition_count)]
+
+
+def split_groups(names, groups):
+    """ Split the names into the groups loaded concurrently, round robin """
+    groups = max(1, min(groups, len(names)))
+    return [names[i::groups] for i in range(groups)]
+
+
+class LoadRunner(BaseRunner):
+    """
+    run load and release:
+    1. insert the collection into partition_count partitions, flushed into segment_count rounds, and build the index
+    2. load the collection, or the partitions with load_concurrency concurrent load_partitions calls,
+       poll the loaded rows while loading, and release, run_count times
+    """
+    name = "load_performance"
+    prepare_keys = BaseRunner.prepare_keys + ["segment_count", "partition_count"]
+
+    def __init__(self, env, metric):
+        super(LoadRunner, self).__init__(env, metric)
+        self.build_time = None
+        self._pool = None
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"]
+        other_fields = collection["other_fields"] if "other_fields" in collection else None
+        index_types = collection["index_types"] if "index_types" in collection else [None]
+        index_params = utils.generate_combinations(collection["index_params"]) if "index_params" in collection \
+            else [None]
+        segment_counts = collection["segment_counts"] if "segment_counts" in collection else [1]
+        partition_counts = collection["partition_counts"] if "partition_counts" in collection else [1]
+        load_concurrencies = collection["load_concurrencies"] if "load_concurrencies" in collection else [1]
+        run_count = collection["run_count"] if "run_count" in collection else DEFAULT_RUN_COUNT
+        progress_interval = collection["progress_interval"] if "progress_interval" in collection \
+            else DEFAULT_PROGRESS_INTERVAL
+        load_timeout = collection["load_timeout"] if "load_timeout" in collection else DEFAULT_LOAD_TIMEOUT
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "other_fields": other_fields,
+            "ni_per": ni_per
+        }
+        self.init_metric(self.name, collection_info, {}, search_info=None)
+        case_metrics = list()
+        case_params = list()
+        for index_type in index_types:
+            for index_param in (index_params if index_type else [None]):
+                index_info = {
+                    "index_type": index_type,
+                    "index_param": index_param
+                }
+                for segment_count in segment_counts:
+                    for partition_count in partition_counts:
+                        # load the whole collection, and the partitions with every concurrency
+                        modes = [(COLLECTION, 1)]
+                        if partition_count > 1:
+                            modes.extend([(PARTITIONS, concurrency) for concurrency in load_concurrencies])
+                        for mode, concurrency in modes:
+                            case_metric = self.new_case_metric(index=index_info, run_params={
+                                "segment_count": segment_count,
+                                "partition_count": partition_count,
+                                "load": mode,
+                                "load_concurrency": concurrency
+                            })
+                            case_metrics.append(case_metric)
+                            case_params.append({
+                                "collection_name": collection_name,
+                                "data_type": data_type,
+                                "dimension": dimension,
+                                "collection_size": collection_size,
+                                "ni_per": ni_per,
+                                "metric_type": metric_type,
+                                "vector_type": vector_type,
+                                "other_fields": other_fields,
+                                "index_field_name": index_field_name,
+                                "index_type": index_type,
+                                "index_param": index_param,
+                                "segment_count": segment_count,
+                                "partition_count": partition_count,
+                                "load": mode,
+                                "load_concurrency": concurrency,
+                                "run_count": run_count,
+                                "progress_interval": progress_interval,
+                                "load_timeout": load_timeout
+                            })
+        return case_params, case_metrics
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        data_type = case_param["data_type"]
+        dimension = case_param["dimension"]
+        size = case_param["collection_size"]
+        ni = case_param["ni_per"]
+        segment_count = case_param["segment_count"]
+        partitions = partition_names(case_param["partition_count"]) or [None]
+        if size % ni or (size // ni) % segment_count:
+            raise Exception("Collection size: %d should be divisible into %d segments of batches of %d" % (
+                size, segment_count, ni))
+        self.milvus.set_collection(collection_name)
+        if self.milvus.exists_collection():
+            logger.debug("Start drop collection")
+            self.milvus.drop()
+            time.sleep(utils.DELETE_INTERVAL_TIME)
+        self.milvus.create_collection(dimension, data_type=case_param["vector_type"],
+                                      other_fields=case_param["other_fields"])
+        for partition_name in partitions:
+            if partition_name:
+                self.milvus.create_partition(partition_name)
+        info = self.milvus.get_info(collection_name)
+        if data_type == "local" or not data_type:
+            batches = synthetic.VectorGenerator(dimension).iter_batches(size, ni)
+        else:
+            batches = utils.iter_vector_batches(data_type, dimension, size, ni)
+        # every round of batches is flushed into its own segments, the batches are spread over the partitions
+        batches_per_segment = size // ni // segment_count
+        start_time = time.time()
+        for i, (start_id, vectors) in enumerate(batches):
+            self.insert_core(self.milvus, info, start_id, vectors, partition_name=partitions[i % len(partitions)])
+            if (i + 1) % batches_per_segment == 0:
+                self.milvus.flush()
+        logger.debug({"insert_time": round(time.time() - start_time, 2), "collection count": self.milvus.count()})
+        self.build_time = None
+        if case_param["index_type"]:
+            start_time = time.time()
+            self.milvus.create_index(case_param["index_field_name"], case_param["index_type"],
+                                     case_param["metric_type"], index_param=case_param["index_param"])
+            self.build_time = round(time.time() - start_time, 2)
+            logger.debug({"build_time": self.build_time})
+
+    def _release(self, **case_param):
+        start_time = time.time()
+        if case_param["load"] == COLLECTION:
+            self.milvus.release_collection()
+        else:
+            self.milvus.release_partitions(partition_names(case_param["partition_count"]))
+        return time.time() - start_time
+
+    def _load_group(self, names, **case_param):
+        """ Load the partitions of the group on its own connection, return the load time """
+        with self._pool.borrow() as milvus:
+            start_time = time.time()
+            milvus.load_partitions(names, timeout=case_param["load_timeout"])
+            return time.time() - start_time
+
+    def load(self, **case_param):
+        """
+        Load and poll the loaded rows until the load calls return,
+        return the load time, the load time of every concurrent call and the timeline of the loaded rows
+        """
+        names = partition_names(case_param["partition_count"]) if case_param["load"] == PARTITIONS else None
+        timeline = []
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=case_param["load_concurrency"]) as executor:
+            if names:
+                futures = [executor.submit(self._load_group, group, **case_param)
+                           for group in split_groups(names, case_param["load_concurrency"])]
+            else:
+                futures = [executor.submit(self.milvus.load_collection, timeout=case_param["load_timeout"])]
+            while not all([future.done() for future in futures]):
+                try:
+                    loaded, total = self.milvus.load_progress(tag_names=names)
+                    timeline.append([round(time.time() - start_time, 3), loaded, total])
+                except Exception as e:
+                    # the server does not expose the progress, wait for the load calls
+                    logger.warning("Load progress not available: %s" % str(e))
+                    timeline = None
+                    break
+                time.sleep(case_param["progress_interval"])
+            group_times = [future.result() for future in futures]
+        load_time = time.time() - start_time
+        if names is None:
+            group_times = None
+        else:
+            group_times = [round(t, 3) for t in group_times]
+        if timeline is not None:
+            loaded, total = self.milvus.load_progress(tag_names=names)
+            timeline.append([round(load_time, 3), loaded, total])
+        return load_time, group_times, timeline
+
+    def run_case(self, case_metric, **case_param):
+        self.milvus.set_collection(case_param["collection_name"])
+        # nothing is loaded at the start of a run
+        self._release(**case_param)
+        load_times = []
+        release_times = []
+        group_times = None
+        timeline = None
+        loaded_segments = None
+        # a connection per concurrent load call, shared by the runs of the case
+        self._pool = ConnectionPool(self.hostname, self.port, collection_name=case_param["collection_name"],
+                                    size=case_param["load_concurrency"], max_in_use=1)
+        try:
+            for i in range(case_param["run_count"]):
+                load_time, group_times, timeline = self.load(**case_param)
+                load_times.append(load_time)
+                if i == 0:
+                    loaded_segments = self.milvus.get_loaded_segments()
+                release_times.append(self._release(**case_param))
+                logger.debug("Run %d of %d, load time: %.2f" % (i + 1, case_param["run_count"], load_time))
+        finally:
+            self._pool.close()
+        avg_load_time = sum(load_times) / len(load_times)
+        tmp_result = {
+            "build_time": self.build_time,
+            "load_time": round(avg_load_time, 3),
+            "load_time_min": round(min(load_times), 3),
+            "load_time_max": round(max(load_times), 3),
+            "load_rows_per_second": round(case_param["collection_size"] / avg_load_time, 2) if avg_load_time else None,
+            "release_time": round(sum(release_times) / len(release_times), 3),
+            "loaded_segments": loaded_segments,
+            # the last run
+            "group_load_times": group_times,
+            "load_timeline": timeline
+        }
+        logger.info(json.dumps({k: v for k, v in tmp_result.items() if k != "load_timeline"}))
+        return tmp_result
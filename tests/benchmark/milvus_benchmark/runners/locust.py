@@ -58,6 +58,7 @@ class LocustInsertRunner(LocustRunner):
 
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         build_index = collection["build_index"] if "build_index" in collection else False
         vector_type = runner_utils.get_vector_type(data_type)
         other_fields = collection["other_fields"] if "other_fields" in collection else None
@@ -104,6 +105,7 @@ class LocustInsertRunner(LocustRunner):
             "dimension": dimension,
             "collection_size": collection_size,
             "ni_per": ni_per,
+            "insert_concurrency": insert_concurrency,
             "metric_type": metric_type,
             "vector_type": vector_type,
             "other_fields": other_fields,
@@ -161,6 +163,7 @@ class LocustSearchRunner(LocustRunner):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         build_index = collection["build_index"] if "build_index" in collection else False
         vector_type = runner_utils.get_vector_type(data_type)
         other_fields = collection["other_fields"] if "other_fields" in collection else None
@@ -208,6 +211,7 @@ class LocustSearchRunner(LocustRunner):
             "dimension": dimension,
             "collection_size": collection_size,
             "ni_per": ni_per,
+            "insert_concurrency": insert_concurrency,
             "metric_type": metric_type,
             "vector_type": vector_type,
             "other_fields": other_fields,
@@ -253,7 +257,7 @@ class LocustSearchRunner(LocustRunner):
             else:
                 build_index = False
                 logger.warning("Please specify the index_type")
-        self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"], insert_concurrency=case_param["insert_concurrency"])
         build_time = 0.0
         start_time = time.time()
         self.milvus.flush()
@@ -291,6 +295,7 @@ class LocustRandomRunner(LocustRunner):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
         build_index = collection["build_index"] if "build_index" in collection else False
         vector_type = runner_utils.get_vector_type(data_type)
         other_fields = collection["other_fields"] if "other_fields" in collection else None
@@ -337,6 +342,7 @@ class LocustRandomRunner(LocustRunner):
             "dimension": dimension,
             "collection_size": collection_size,
             "ni_per": ni_per,
+            "insert_concurrency": insert_concurrency,
             "metric_type": metric_type,
             "vector_type": vector_type,
             "other_fields": other_fields,
@@ -381,7 +387,7 @@ class LocustRandomRunner(LocustRunner):
             else:
                 build_index = False
                 logger.warning("Please specify the index_type")
-        self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"], insert_concurrency=case_param["insert_concurrency"])
         build_time = 0.0
         start_time = time.time()
         self.milvus.flush()
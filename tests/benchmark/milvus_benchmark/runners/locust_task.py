@@ -9,19 +9,25 @@ logger = logging.getLogger("milvus_benchmark.runners.locust_task")
 class MilvusTask(object):
     def __init__(self, *args, **kwargs):
         self.request_type = "grpc"
+        self.pool = None
         connection_type = kwargs.get("connection_type")
         if connection_type == "single":
             self.m = kwargs.get("m")
         elif connection_type == "multi":
-            host = kwargs.get("host")
-            port = kwargs.get("port")
-            collection_name = kwargs.get("collection_name")
-            self.m = MilvusClient(host=host, port=port, collection_name=collection_name)
+            # the users borrow a connection of the shared pool for every request
+            self.pool = kwargs.get("pool")
+            if self.pool is None:
+                host = kwargs.get("host")
+                port = kwargs.get("port")
+                collection_name = kwargs.get("collection_name")
+                self.m = MilvusClient(host=host, port=port, collection_name=collection_name)
 
     def __getattr__(self, name):
-        func = getattr(self.m, name)
+        if name in ["m", "pool"]:
+            raise AttributeError(name)
 
-        def wrapper(*args, **kwargs):
+        def request(m, *args, **kwargs):
+            func = getattr(m, name)
             start_time = time.time()
             try:
                 result = func(*args, **kwargs)
@@ -32,5 +38,18 @@ class MilvusTask(object):
                 total_time = int((time.time() - start_time) * 1000)
                 events.request_failure.fire(request_type=self.request_type, name=name, response_time=total_time,
                                             exception=e, response_length=0)
+                return e
+
+        def wrapper(*args, **kwargs):
+            if self.pool is None:
+                request(self.m, *args, **kwargs)
+                return
+            # the pool wait time is reported by the pool, not in the response time
+            conn = self.pool.acquire()
+            error = None
+            try:
+                error = request(conn.client, *args, **kwargs)
+            finally:
+                self.pool.release(conn, error)
 
         return wrapper
@@ -2,7 +2,6 @@ import random
 import logging
 # import math
 from locust import TaskSet, task
-from . import utils
 
 logger = logging.getLogger("milvus_benchmark.runners.locust_tasks")
 
@@ -10,28 +9,8 @@ logger = logging.getLogger("milvus_benchmark.runners.locust_tasks")
 class Tasks(TaskSet):
     @task
     def query(self):
-        """ search interface """
-        op = "query"
-        # X = utils.generate_vectors(self.params[op]["nq"], self.op_info["dimension"])
-        vector_query = {"vector": {self.op_info["vector_field_name"]: {
-            "topk": self.params[op]["top_k"], 
-            "query": self.values["X"][:self.params[op]["nq"]], 
-            "metric_type": self.params[op]["metric_type"] if "metric_type" in self.params[op] else utils.DEFAULT_METRIC_TYPE, 
-            "params": self.params[op]["search_param"]}
-        }}
-        filter_query = []
-        if "filters" in self.params[op]:
-            for filter in self.params[op]["filters"]:
-                if isinstance(filter, dict) and "range" in filter:
-                    filter_query.append(eval(filter["range"]))
-                if isinstance(filter, dict) and "term" in filter:
-                    filter_query.append(eval(filter["term"]))
-
-        guarantee_timestamp = self.params[op]["guarantee_timestamp"] if "guarantee_timestamp" in self.params[op] else None
-
-        # logger.debug(filter_query)
-        self.client.query(vector_query, filter_query=filter_query, log=False, guarantee_timestamp=guarantee_timestamp,
-                          timeout=30)
+        """ search interface, the search params are built at setup by locust_templates """
+        self.client.query(None, search_params=self.templates["query"].next(), log=False, timeout=30)
 
     @task
     def flush(self):
@@ -57,18 +36,13 @@ class Tasks(TaskSet):
     @task
     def insert(self):
         op = "insert"
-        # ids = [random.randint(1000000, 10000000) for _ in range(self.params[op]["ni_per"])]
-        # X = [[random.random() for _ in range(self.op_info["dimension"])] for _ in range(self.params[op]["ni_per"])]
-        entities = utils.generate_entities(self.op_info["collection_info"], self.values["X"][:self.params[op]["ni_per"]], self.values["ids"][:self.params[op]["ni_per"]])
-        self.client.insert(entities, log=False, timeout=300)
+        # the entities are built at setup, the ids and vectors are rotated between the requests
+        self.client.insert(self.templates[op].next(), log=False, timeout=300)
 
     @task
     def insert_flush(self):
         op = "insert_flush"
-        # ids = [random.randint(1000000, 10000000) for _ in range(self.params[op]["ni_per"])]
-        # X = [[random.random() for _ in range(self.op_info["dimension"])] for _ in range(self.params[op]["ni_per"])]
-        entities = utils.generate_entities(self.op_info["collection_info"], self.values["X"][:self.params[op]["ni_per"]], self.values["ids"][:self.params[op]["ni_per"]])
-        self.client.insert(entities, log=False)
+        self.client.insert(self.templates[op].next(), log=False)
         self.client.flush(log=False)
         
     @task
@@ -79,8 +53,7 @@ class Tasks(TaskSet):
     def get(self):
         """ query interface """
         op = "get"
-        # ids = [random.randint(1, 10000000) for _ in range(self.params[op]["ids_length"])]
-        self.client.get(self.values["get_ids"][:self.params[op]["ids_length"]], timeout=300)
+        self.client.get(self.templates[op].next(), timeout=300)
 
     @task
     def scene_test(self):
@@ -0,0 +1,97 @@
+import logging
+import itertools
+
+import utils as util
+from . import utils
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_templates")
+
+# count of the payloads built per op, the requests are replayed from them in turn
+DEFAULT_ROTATIONS = 16
+
+
+def _rotated_slices(values, length, rotations):
+    """ Start offsets of `rotations` slices of `length` rows spread over values """
+    if length >= len(values):
+        return [0]
+    step = max(1, (len(values) - length) // max(1, rotations - 1))
+    return sorted(set([min(i * step, len(values) - length) for i in range(rotations)]))
+
+
+class RequestTemplate(object):
+    """ Payloads built once at setup, next() replays them in turn """
+
+    def __init__(self, payloads):
+        if not payloads:
+            raise Exception("Request template without payload")
+        self._payloads = payloads
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def next(self):
+        return self._payloads[next(self._counter) % len(self._payloads)]
+
+
+def build_filter_query(params):
+    """ Evaluate the `filters` of the task params once """
+    filter_query = []
+    if params and "filters" in params:
+        for filter in params["filters"]:
+            if isinstance(filter, dict) and "range" in filter:
+                filter_query.append(eval(filter["range"]))
+            if isinstance(filter, dict) and "term" in filter:
+                filter_query.append(eval(filter["term"]))
+    return filter_query
+
+
+def build_search_template(op_info, params, vectors, rotations=DEFAULT_ROTATIONS):
+    """
+    The search params of search_param_analysis, computed once for the task params,
+    only the query vectors of the payloads are different
+    """
+    nq = params["nq"]
+    vector_query = {"vector": {op_info["vector_field_name"]: {
+        "topk": params["top_k"],
+        "query": [],
+        "metric_type": params["metric_type"] if "metric_type" in params else utils.DEFAULT_METRIC_TYPE,
+        "params": params["search_param"]}
+    }}
+    base_params = util.search_param_analysis(vector_query, build_filter_query(params))
+    if not base_params:
+        raise Exception("Invalid search params: %s" % str(params))
+    if "guarantee_timestamp" in params and params["guarantee_timestamp"] is not None:
+        base_params["guarantee_timestamp"] = params["guarantee_timestamp"]
+    payloads = []
+    for offset in _rotated_slices(vectors, nq, rotations):
+        payload = dict(base_params)
+        # converted once, the client does not convert the vectors for every request
+        payload["data"] = vectors[offset:offset + nq].tolist()
+        payloads.append(payload)
+    return RequestTemplate(payloads)
+
+
+def build_insert_template(op_info, params, vectors, ids, rotations=DEFAULT_ROTATIONS):
+    """ Insert entities built once, the ids and the vectors of the payloads are rotated """
+    ni_per = params["ni_per"]
+    payloads = []
+    for offset in _rotated_slices(vectors, ni_per, rotations):
+        payloads.append(utils.generate_entities(op_info["collection_info"],
+                                                utils.as_insert_vectors(vectors[offset:offset + ni_per]),
+                                                ids[offset:offset + ni_per]))
+    return RequestTemplate(payloads)
+
+
+def build_templates(op_info, task_params, values, rotations=DEFAULT_ROTATIONS):
+    """ Return {op: RequestTemplate} of the ops whose requests can be built at setup """
+    templates = dict()
+    for op, params in task_params.items():
+        if op == "query":
+            templates[op] = build_search_template(op_info, params, values["X"], rotations=rotations)
+        elif op in ["insert", "insert_flush"]:
+            templates[op] = build_insert_template(op_info, params, values["X"], values["ids"], rotations=rotations)
+        elif op == "get":
+            templates[op] = RequestTemplate([values["get_ids"][:params["ids_length"]]])
+    logger.info("Request templates built: %s" % {op: len(template) for op, template in templates.items()})
+    return templates
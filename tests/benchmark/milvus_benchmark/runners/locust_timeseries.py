@@ -0,0 +1,179 @@
+import os
+import csv
+import time
+import math
+import logging
+import threading
+
+from milvus_benchmark import config
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_timeseries")
+
+DEFAULT_INTERVAL = 1
+TIMESERIES_FORMATS = ["csv", "parquet"]
+PERCENTILES = [50, 90, 99]
+FIELDS = ["time", "elapsed", "name", "user_count", "step", "requests", "failures", "rps", "fail_ratio",
+          "avg_response_time", "max_response_time"] + ["response_time_p%d" % p for p in PERCENTILES]
+
+
+class _Bucket(object):
+    def __init__(self):
+        self.failures = 0
+        self.user_count = 0
+        self.histogram = LatencyHistogram()
+
+
+class LocustTimeSeries(object):
+    """
+    Per interval, per request name stats of a locust run: requests, failures and response time
+    percentiles of every interval, tagged with the user count and the load shape step at the interval
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, step_time=None):
+        if interval <= 0:
+            raise Exception("Invalid timeseries interval: %s" % str(interval))
+        self._interval = interval
+        self._step_time = step_time
+        self._lock = threading.Lock()
+        # (interval index, name) -> _Bucket
+        self._buckets = dict()
+        self._start_time = None
+        self._runner = None
+
+    def attach(self, events, runner=None):
+        """ Listen to the request events, the user count is read from the locust runner """
+        self._runner = runner
+        self._start_time = time.time()
+        events.request_success.add_listener(self._on_success)
+        events.request_failure.add_listener(self._on_failure)
+
+    def detach(self, events):
+        events.request_success.remove_listener(self._on_success)
+        events.request_failure.remove_listener(self._on_failure)
+
+    def _record(self, name, response_time, failure):
+        now = time.time()
+        index = int((now - self._start_time) // self._interval)
+        user_count = self._runner.user_count if self._runner is not None else 0
+        with self._lock:
+            key = (index, name)
+            if key not in self._buckets:
+                self._buckets[key] = _Bucket()
+            bucket = self._buckets[key]
+            # response time of locust is in ms
+            bucket.histogram.record(response_time / 1000.0)
+            bucket.user_count = max(bucket.user_count, user_count)
+            if failure:
+                bucket.failures += 1
+
+    def _on_success(self, request_type, name, response_time, response_length, **kwargs):
+        self._record(name, response_time, False)
+
+    def _on_failure(self, request_type, name, response_time, exception, response_length=0, **kwargs):
+        self._record(name, response_time, True)
+
+    def _step(self, elapsed):
+        if not self._step_time:
+            return None
+        # the same steps as StepLoadShape.tick
+        return int(math.floor(elapsed / self._step_time)) + 1
+
+    def rows(self):
+        """ One row per interval and request name, ordered by time """
+        rows = []
+        with self._lock:
+            items = sorted(self._buckets.items(), key=lambda item: (item[0][0], item[0][1]))
+        for (index, name), bucket in items:
+            histogram = bucket.histogram
+            elapsed = index * self._interval
+            row = {
+                "time": round(self._start_time + elapsed, 3),
+                "elapsed": elapsed,
+                "name": name,
+                "user_count": bucket.user_count,
+                "step": self._step(elapsed),
+                "requests": histogram.count,
+                "failures": bucket.failures,
+                "rps": round(histogram.count / float(self._interval), 2),
+                "fail_ratio": round(bucket.failures / float(histogram.count), 4),
+                "avg_response_time": round(histogram.mean * 1000, 3),
+                "max_response_time": round(histogram.max * 1000, 3)
+            }
+            for percentile in PERCENTILES:
+                row["response_time_p%d" % percentile] = round(histogram.value_at_percentile(percentile) * 1000, 3)
+            rows.append(row)
+        return rows
+
+    def step_summary(self):
+        """ Stats of every load shape step and request name, the response times are in ms """
+        steps = dict()
+        with self._lock:
+            items = list(self._buckets.items())
+        for (index, name), bucket in items:
+            step = self._step(index * self._interval)
+            key = (step, name)
+            if key not in steps:
+                steps[key] = {"histogram": LatencyHistogram(), "failures": 0, "user_count": 0, "intervals": set()}
+            steps[key]["histogram"].merge(bucket.histogram)
+            steps[key]["failures"] += bucket.failures
+            steps[key]["user_count"] = max(steps[key]["user_count"], bucket.user_count)
+            steps[key]["intervals"].add(index)
+        summary = []
+        for (step, name), value in sorted(steps.items(), key=lambda item: (item[0][0] or 0, item[0][1])):
+            histogram = value["histogram"]
+            summary.append({
+                "step": step,
+                "name": name,
+                "user_count": value["user_count"],
+                "requests": histogram.count,
+                "failures": value["failures"],
+                "rps": round(histogram.count / float(len(value["intervals"]) * self._interval), 2),
+                "response_time_p50": round(histogram.value_at_percentile(50) * 1000, 3),
+                "response_time_p99": round(histogram.value_at_percentile(99) * 1000, 3)
+            })
+        return summary
+
+    def export(self, path, file_format="csv"):
+        """ Write the rows into path, parquet needs pandas and pyarrow """
+        if file_format not in TIMESERIES_FORMATS:
+            raise Exception("Timeseries format: %s not supported" % file_format)
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+        rows = self.rows()
+        if file_format == "csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            import pandas as pd
+            pd.DataFrame(rows, columns=FIELDS).to_parquet(path, index=False)
+        logger.info("%d timeseries rows exported to: %s" % (len(rows), path))
+        return path
+
+    def result(self, path=None, file_format="csv"):
+        """ The timeseries fields of the case result: file path, interval and per step stats """
+        with self._lock:
+            intervals = len(set([index for index, _ in self._buckets]))
+        result = {
+            "interval": self._interval,
+            "intervals": intervals,
+            "steps": self.step_summary()
+        }
+        if path:
+            # the stats of the run are kept if the file can not be written
+            try:
+                result["path"] = self.export(path, file_format=file_format)
+            except Exception as e:
+                logger.error("Export timeseries failed: %s" % str(e))
+        return result
+
+
+def timeseries_path(collection_name, file_format, path=None):
+    """ The export file of a run, path could be a directory or a file """
+    if path and os.path.splitext(path)[1]:
+        return path
+    dir_name = path if path else os.path.join(config.LOG_PATH, "timeseries")
+    return os.path.join(dir_name, "%s_%s.%s" % (collection_name, time.strftime("%Y%m%d%H%M%S"), file_format))
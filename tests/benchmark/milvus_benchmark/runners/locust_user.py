@@ -1,5 +1,4 @@
 import logging
-import random
 import gevent
 # import gevent.monkey
 # gevent.monkey.patch_all()
@@ -7,13 +6,17 @@ from locust import User, between, events, stats
 from locust.env import Environment
 import locust.stats
 import math
+import numpy as np
 from locust import LoadTestShape
 from locust.stats import stats_printer, print_stats
 # from locust.log import setup_logging, greenlet_exception_logger
 from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.runners.pool import ConnectionPool, ROUND_ROBIN
 from .locust_task import MilvusTask
 from .locust_tasks import Tasks
-from . import utils
+from .locust_templates import build_templates
+from .locust_timeseries import LocustTimeSeries, timeseries_path, DEFAULT_INTERVAL
+from . import synthetic
 
 locust.stats.CONSOLE_STATS_INTERVAL_SEC = 20
 logger = logging.getLogger("milvus_benchmark.runners.locust_user")
@@ -72,15 +75,22 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
         ni_per = MyUser.params["insert"]["ni_per"]
         _nq = ni_per + 10 if ni_per > nq else _nq
 
+    rng = np.random.default_rng(synthetic.DEFAULT_SEED)
     MyUser.values = {
-        "ids": [random.randint(1000000, 10000000) for _ in range(nb)],
-        "get_ids": [random.randint(1, 10000000) for _ in range(nb)],
-        "X": utils.generate_vectors(_nq, MyUser.op_info["dimension"])
+        "ids": rng.integers(1000000, 10000000, nb, endpoint=True).tolist(),
+        "get_ids": rng.integers(1, 10000000, nb, endpoint=True).tolist(),
+        "X": synthetic.VectorGenerator(MyUser.op_info["dimension"]).queries(_nq)
     }
+    # requests of the ops are built once here, the tasks only replay them
+    MyUser.templates = build_templates(MyUser.op_info, MyUser.params, MyUser.values)
 
     # MyUser.tasks = {Tasks.query: 1, Tasks.flush: 1}
+    pool = None
+    if connection_type == "multi":
+        pool = ConnectionPool(host, port, collection_name=collection_name, size=run_params["connection_num"],
+                              policy=run_params["connection_policy"] if "connection_policy" in run_params else ROUND_ROBIN)
     MyUser.client = MilvusTask(host=host, port=port, collection_name=collection_name, connection_type=connection_type,
-                               m=m)
+                               m=m, pool=pool)
     if "load_shape" in run_params and run_params["load_shape"]:
         test = StepLoadShape() 
         test.init(run_params["step_time"], run_params["step_load"], run_params["spawn_rate"], run_params["during_time"])
@@ -90,6 +100,11 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
     else:
         env = Environment(events=events, user_classes=[MyUser])
         runner = env.create_local_runner()
+    # per interval stats of every request name, tagged with the user count and the step of the load shape
+    timeseries = LocustTimeSeries(
+        interval=run_params["timeseries_interval"] if "timeseries_interval" in run_params else DEFAULT_INTERVAL,
+        step_time=run_params["step_time"] if "load_shape" in run_params and run_params["load_shape"] else None)
+    timeseries.attach(events, runner)
     # setup logging
     # setup_logging("WARNING", "/dev/null")
     # greenlet_exception_logger(logger=logger)
@@ -105,6 +120,7 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
     runner.start(clients_num, spawn_rate=spawn_rate)
     gevent.spawn_later(during_time, lambda: runner.quit())
     runner.greenlet.join()
+    timeseries.detach(events)
     print_stats(env.stats)
     result = {
         "rps": round(env.stats.total.current_rps, 1),  # Number of interface requests per second
@@ -112,5 +128,14 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
         "max_response_time": round(env.stats.total.max_response_time, 1),  # Maximum interface response time
         "avg_response_time": round(env.stats.total.avg_response_time, 1)  # ratio of average response time
     }
+    if pool is not None:
+        # time the users waited for a pooled connection, not included in the response time
+        result.update(pool.stats())
+        pool.close()
+    timeseries_format = run_params["timeseries_format"] if "timeseries_format" in run_params else "csv"
+    result["timeseries"] = timeseries.result(
+        path=timeseries_path(collection_name, timeseries_format,
+                             run_params["timeseries_path"] if "timeseries_path" in run_params else None),
+        file_format=timeseries_format)
     runner.stop()
     return result
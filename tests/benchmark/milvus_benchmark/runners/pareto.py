@@ -0,0 +1,216 @@
+import time
+import logging
+import numpy as np
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import recall
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.accuracy import AccAccuracyRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.pareto")
+
+DEFAULT_RUN_COUNT = 10
+DEFAULT_WARM_UP_COUNT = 2
+DEFAULT_TARGET_RECALL = 0.95
+
+
+def pareto_frontier(points, x_key="acc", y_key="qps"):
+    """
+    Return the points not dominated by any other point, i.e. no other point has both
+    a higher or equal x_key and a higher or equal y_key (one of them strictly), sorted by x_key ascending
+    """
+    frontier = []
+    best_y = None
+    for point in sorted(points, key=lambda p: (-p[x_key], -p[y_key])):
+        if best_y is None or point[y_key] > best_y:
+            frontier.append(point)
+            best_y = point[y_key]
+    return sorted(frontier, key=lambda p: p[x_key])
+
+
+def cheapest_setting(points, target_recall, x_key="acc", y_key="qps"):
+    """ Return the point with the highest throughput among the ones reaching the target recall """
+    candidates = [point for point in points if point[x_key] >= target_recall]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda p: p[y_key])
+
+
+def sweep_point(milvus, search_param, **case_param):
+    """
+    Measure recall and latency of one search param on the loaded collection,
+    case_param: query_vectors, true_ids, nq, top_k, run_count, warm_up_count, metric_type, index_field_name,
+                guarantee_timestamp
+    """
+    nq = case_param["nq"]
+    top_k = case_param["top_k"]
+    search_info = {
+        "topk": top_k,
+        "query": case_param["query_vectors"],
+        "metric_type": utils.metric_type_trans(case_param["metric_type"]),
+        "params": search_param}
+    vector_query = {"vector": {case_param["index_field_name"]: search_info}}
+    for i in range(case_param["warm_up_count"]):
+        milvus.query(vector_query, guarantee_timestamp=case_param["guarantee_timestamp"])
+    histogram = LatencyHistogram()
+    total_time = 0.0
+    query_res = None
+    for i in range(case_param["run_count"]):
+        start_time = time.time()
+        query_res = milvus.query(vector_query, guarantee_timestamp=case_param["guarantee_timestamp"])
+        interval_time = time.time() - start_time
+        histogram.record(interval_time)
+        total_time += interval_time
+    result_ids = milvus.get_ids(query_res, top_k)
+    per_query = recall.recall_at_k(case_param["true_ids"][:nq, :top_k], result_ids, top_k)
+    point = {"search_param": search_param}
+    point.update(recall.recall_summary(per_query))
+    point.update({
+        "qps": round(nq * case_param["run_count"] / total_time, 2) if total_time else 0.0,
+        "search_time_p50": round(histogram.value_at_percentile(50), 6),
+        "search_time_p99": round(histogram.value_at_percentile(99), 6)
+    })
+    logger.info(point)
+    return point
+
+
+class AnnParetoRunner(AccAccuracyRunner):
+    """
+    run recall and throughput sweep on the same loaded collection:
+    1. entities from hdf5, inserted once
+    2. one case per index, the index is rebuilt when the case changes
+    3. every search param of the case measures recall and latency/qps
+    """
+    name = "ann_pareto"
+    # the index is rebuilt by run_case, the dataset is inserted once for all the index types
+    prepare_keys = ["collection_name", "metric_type"]
+    # one case per index, the cases are extracted up front
+    lazy_cases = False
+    iter_cases = BaseRunner.iter_cases
+
+    def __init__(self, env, metric):
+        super(AnnParetoRunner, self).__init__(env, metric)
+        self._built_index = None
+        # the index built by prepare is reported by the first case using it
+        self._prepare_build_time = None
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, dimension, metric_type) = parser.parse_ann_collection_name(collection_name)
+        hdf5_source_file = collection["source_file"]
+        index_types = collection["index_types"]
+        index_params = utils.generate_combinations(collection["index_params"])
+        search_params = utils.generate_combinations(collection["search_params"])
+        top_k = collection["top_k"] if "top_k" in collection else 10
+        nq = collection["nq"] if "nq" in collection else 10000
+        run_count = collection["run_count"] if "run_count" in collection else DEFAULT_RUN_COUNT
+        warm_up_count = collection["warm_up_count"] if "warm_up_count" in collection else DEFAULT_WARM_UP_COUNT
+        target_recall = collection["target_recall"] if "target_recall" in collection else DEFAULT_TARGET_RECALL
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
+        guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        dataset = utils.get_dataset(hdf5_source_file)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name
+        }
+        run_params = {
+            "search_params": search_params,
+            "run_count": run_count,
+            "warm_up_count": warm_up_count,
+            "target_recall": target_recall
+        }
+        self.init_metric(self.name, collection_info, {}, None, run_params)
+        true_ids = np.array(dataset["neighbors"])
+        query_vectors = utils.normalize(metric_type, np.array(dataset["test"][:nq]))
+        dataset.close()
+        nq = len(query_vectors)
+        cases = list()
+        case_metrics = list()
+        for index_type in index_types:
+            for index_param in index_params:
+                case_metric = self.new_case_metric(index={
+                    "index_type": index_type,
+                    "index_param": index_param
+                }, search={
+                    "nq": nq,
+                    "topk": top_k,
+                    "search_param": search_params,
+                    "guarantee_timestamp": guarantee_timestamp
+                })
+                case = {
+                    "collection_name": collection_name,
+                    "source_file": hdf5_source_file,
+                    "index_field_name": index_field_name,
+                    "dimension": dimension,
+                    "data_type": data_type,
+                    "metric_type": metric_type,
+                    "vector_type": vector_type,
+                    "index_type": index_type,
+                    "index_param": index_param,
+                    "search_params": search_params,
+                    "query_vectors": query_vectors,
+                    "nq": nq,
+                    "top_k": top_k,
+                    "run_count": run_count,
+                    "warm_up_count": warm_up_count,
+                    "target_recall": target_recall,
+                    "true_ids": true_ids,
+                    "insert_concurrency": insert_concurrency,
+                    "guarantee_timestamp": guarantee_timestamp
+                }
+                cases.append(case)
+                case_metrics.append(case_metric)
+        return cases, case_metrics
+
+    def prepare(self, **case_param):
+        super(AnnParetoRunner, self).prepare(**case_param)
+        self._built_index = (case_param["index_type"], case_param["index_param"])
+        self._prepare_build_time = self.build_time
+
+    def rebuild_index(self, **case_param):
+        """
+        Rebuild the index of the collection if the case uses another index than the loaded one,
+        return the build time, or None if the loaded index is reused
+        """
+        index = (case_param["index_type"], case_param["index_param"])
+        if self._built_index == index:
+            return None
+        index_field_name = case_param["index_field_name"]
+        logger.info("Re-create index: %s, %s" % index)
+        self.milvus.release_collection()
+        self.milvus.drop_index(index_field_name)
+        start_time = time.time()
+        self.milvus.create_index(index_field_name, case_param["index_type"], case_param["metric_type"],
+                                 index_param=case_param["index_param"])
+        build_time = round(time.time() - start_time, 2)
+        self.milvus.load_collection(timeout=600)
+        self._built_index = index
+        return build_time
+
+    def sweep_point(self, search_param, **case_param):
+        """ Measure recall and latency of one search param """
+        return sweep_point(self.milvus, search_param, **case_param)
+
+    def run_case(self, case_metric, **case_param):
+        build_time = self.rebuild_index(**case_param)
+        if build_time is None:
+            build_time = self._prepare_build_time
+        self._prepare_build_time = None
+        points = [self.sweep_point(search_param, **case_param) for search_param in case_param["search_params"]]
+        frontier = pareto_frontier(points)
+        best = cheapest_setting(points, case_param["target_recall"])
+        if best is None:
+            logger.warning("No search param reaches the target recall: %s" % case_param["target_recall"])
+        tmp_result = {
+            "build_time": build_time,
+            "points": points,
+            "pareto_frontier": frontier,
+            "target_recall": case_param["target_recall"],
+            "best": best
+        }
+        return tmp_result
@@ -0,0 +1,175 @@
+import json
+import queue
+import hashlib
+import logging
+import traceback
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from milvus_benchmark.runners import breakdown
+
+logger = logging.getLogger("milvus_benchmark.runners.planner")
+
+DEFAULT_MAX_PARALLEL_GROUPS = 1
+
+
+def prepare_fingerprint(case, prepare_keys):
+    """ md5 of the case params that decide what prepare() builds """
+    key = {k: case[k] for k in prepare_keys if k in case}
+    return hashlib.md5(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def plan_cases(cases, prepare_keys):
+    """
+    Group the case indexes by prepare fingerprint, the groups are ordered by their first case,
+    and the groups of the same collection are put into the same lane, since their prepare rebuilds the collection
+    return the lanes: [[group, ...], ...], a group is {"fingerprint": str, "indexes": [int, ...]}
+    """
+    groups = OrderedDict()
+    for index, case in enumerate(cases):
+        fingerprint = prepare_fingerprint(case, prepare_keys)
+        if fingerprint not in groups:
+            groups[fingerprint] = {
+                "fingerprint": fingerprint,
+                "collection_name": case["collection_name"] if "collection_name" in case else None,
+                "indexes": []
+            }
+        groups[fingerprint]["indexes"].append(index)
+    lanes = OrderedDict()
+    for group in groups.values():
+        lanes.setdefault(group["collection_name"], []).append(group)
+    logger.info("Planned %d cases into %d groups and %d lanes" % (len(cases), len(groups), len(lanes)))
+    return list(lanes.values())
+
+
+class CaseScheduler(object):
+    """
+    Run the cases of a suite: every group of cases sharing the same prepare is prepared once,
+    the lanes (groups of different collections) run concurrently on their own runner,
+    up to max_parallel_groups lanes at the same time
+    runner_factory: returns a new runner for the extra lanes
+    sampler: optional ResourceSampler, the server resources of the prepare and run_case phases
+             are added into the case result as `server_resources`
+    latency_breakdown: add the client call phases recorded during run_case into the case result,
+                       see runners.breakdown
+    """
+
+    def __init__(self, runner, runner_factory, max_parallel_groups=DEFAULT_MAX_PARALLEL_GROUPS, sampler=None,
+                 latency_breakdown=False):
+        self._runner = runner
+        self._runner_factory = runner_factory
+        self._max_parallel_groups = max(1, int(max_parallel_groups))
+        self._sampler = sampler
+        self._latency_breakdown = latency_breakdown
+
+    @contextmanager
+    def _breakdown(self):
+        if not self._latency_breakdown:
+            yield None
+            return
+        with breakdown.recording() as recorder:
+            yield recorder
+
+    @contextmanager
+    def _phase(self, phase, index):
+        if self._sampler is None:
+            yield
+            return
+        with self._sampler.phase(phase, index):
+            yield
+
+    def _prepare(self, runner, case, index, fingerprint):
+        """ Prepare the runner for the case, return the error message if failed """
+        try:
+            logger.info("Prepare group: %s, collection: %s" % (fingerprint, case.get("collection_name")))
+            with self._phase("prepare", index):
+                runner.prepare(**case)
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            return "Prepare failed: " + str(e) + "\n" + traceback.format_exc()
+        return None
+
+    def _run_case(self, runner, case, case_metric, index):
+        """ Return (result, err_message) of the case """
+        result = None
+        err_message = ""
+        try:
+            with self._phase("run_case", index), self._breakdown() as recorder:
+                result = runner.run_case(case_metric, **case)
+            if isinstance(result, dict) and recorder is not None:
+                result["latency_breakdown"] = recorder.summary()
+            if isinstance(result, dict) and self._sampler is not None:
+                result["server_resources"] = self._sampler.case_resources(index)
+        except Exception as e:
+            err_message = str(e) + "\n" + traceback.format_exc()
+            logger.error(traceback.format_exc())
+        return result, err_message
+
+    def _run_group(self, runner, group, cases, case_metrics):
+        """ Yield (index, result, err_message) of the cases of the group """
+        first = group["indexes"][0]
+        err_message = self._prepare(runner, cases[first], first, group["fingerprint"])
+        if err_message:
+            for index in group["indexes"]:
+                yield index, None, err_message
+            return
+        for index in group["indexes"]:
+            result, err_message = self._run_case(runner, cases[index], case_metrics[index], index)
+            yield index, result, err_message
+
+    def _run_lane(self, runner, lane, cases, case_metrics):
+        for group in lane:
+            for item in self._run_group(runner, group, cases, case_metrics):
+                yield item
+
+    def run(self, cases, case_metrics):
+        """ Yield (index, result, err_message) of every case, in the case order if the lanes run concurrently """
+        lanes = plan_cases(cases, self._runner.prepare_keys)
+        if self._max_parallel_groups == 1 or len(lanes) == 1:
+            for lane in lanes:
+                for item in self._run_lane(self._runner, lane, cases, case_metrics):
+                    yield item
+            return
+        runners = queue.Queue()
+        runners.put(self._runner)
+        for _ in range(min(len(lanes), self._max_parallel_groups) - 1):
+            runners.put(self._runner_factory())
+
+        def run_lane(lane):
+            # a runner is used by one lane at a time, there are as many runners as workers
+            runner = runners.get()
+            try:
+                return list(self._run_lane(runner, lane, cases, case_metrics))
+            finally:
+                runners.put(runner)
+
+        results = dict()
+        with ThreadPoolExecutor(max_workers=runners.qsize()) as executor:
+            for items in executor.map(run_lane, lanes):
+                for index, result, err_message in items:
+                    results[index] = (index, result, err_message)
+        for index in sorted(results):
+            yield results[index]
+
+    def run_lazy(self, case_iter):
+        """
+        Yield (index, case_metric, result, err_message) of the (case, case_metric) generated by case_iter,
+        the cases are consumed one by one and the runner is prepared again when the prepare fingerprint changes,
+        so the cases sharing a prepare should be consecutive, see BaseRunner.lazy_cases
+        """
+        fingerprint = None
+        prepare_error = None
+        groups = 0
+        for index, (case, case_metric) in enumerate(case_iter):
+            case_fingerprint = prepare_fingerprint(case, self._runner.prepare_keys)
+            if case_fingerprint != fingerprint:
+                fingerprint = case_fingerprint
+                groups += 1
+                prepare_error = self._prepare(self._runner, case, index, fingerprint)
+            if prepare_error:
+                yield index, case_metric, None, prepare_error
+                continue
+            result, err_message = self._run_case(self._runner, case, case_metric, index)
+            yield index, case_metric, result, err_message
+        logger.info("Run %d groups of generated cases" % groups)
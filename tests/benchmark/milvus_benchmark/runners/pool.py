@@ -0,0 +1,161 @@
+import time
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+import grpc
+
+from milvus_benchmark.client import MilvusClient
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.pool")
+
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+POLICIES = [ROUND_ROBIN, LEAST_LOADED]
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+DEFAULT_CONNECT_TIMEOUT = 60
+
+
+class PooledConnection(object):
+    def __init__(self, index):
+        self.index = index
+        self.client = None
+        self.in_use = 0
+        self.healthy = True
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of `size` client connections shared by the locust users and the runner threads:
+    the connections are opened by the first borrow, chosen round robin or least loaded,
+    checked every health_check_interval seconds and reopened after a failed check or a grpc error
+    max_in_use: borrowers of one connection at the same time, unbounded if None
+    the time waiting for a connection (including the lazy connect) is recorded as the pool wait time
+    """
+
+    def __init__(self, host, port, collection_name=None, size=1, policy=ROUND_ROBIN, max_in_use=None,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL, connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+        if policy not in POLICIES:
+            raise Exception("Connection policy: %s not supported" % policy)
+        if size < 1:
+            raise Exception("Connection pool size: %s should be positive" % str(size))
+        self._host = host
+        self._port = port
+        self._collection_name = collection_name
+        self._policy = policy
+        self._max_in_use = max_in_use
+        self._health_check_interval = health_check_interval
+        self._connect_timeout = connect_timeout
+        self._connections = [PooledConnection(i) for i in range(size)]
+        self._condition = threading.Condition()
+        self._next = 0
+        self._wait_histogram = LatencyHistogram()
+        self._connects = 0
+        self._reconnects = 0
+
+    @property
+    def size(self):
+        return len(self._connections)
+
+    def _select(self):
+        available = [conn for conn in self._connections
+                     if self._max_in_use is None or conn.in_use < self._max_in_use]
+        if not available:
+            return None
+        if self._policy == LEAST_LOADED:
+            return min(available, key=lambda conn: conn.in_use)
+        for i in range(len(self._connections)):
+            conn = self._connections[(self._next + i) % len(self._connections)]
+            if conn in available:
+                self._next = (conn.index + 1) % len(self._connections)
+                return conn
+
+    def _connect(self, conn):
+        """ Open the connection if it is not opened or not healthy, and check it if the interval elapsed """
+        with conn.lock:
+            if conn.client is not None and conn.healthy \
+                    and time.time() - conn.last_check > self._health_check_interval:
+                try:
+                    conn.client.show_collections()
+                except Exception as e:
+                    logger.warning("Health check of connection: %d failed: %s" % (conn.index, str(e)))
+                    conn.healthy = False
+                conn.last_check = time.time()
+            if conn.client is None or not conn.healthy:
+                if conn.client is not None:
+                    self._reconnects += 1
+                    logger.info("Reconnect connection: %d" % conn.index)
+                conn.client = MilvusClient(collection_name=self._collection_name, host=self._host, port=self._port,
+                                           timeout=self._connect_timeout)
+                conn.healthy = True
+                conn.last_check = time.time()
+                self._connects += 1
+
+    def acquire(self):
+        start_time = time.time()
+        with self._condition:
+            conn = self._select()
+            while conn is None:
+                self._condition.wait()
+                conn = self._select()
+            conn.in_use += 1
+        try:
+            self._connect(conn)
+        except Exception:
+            self.release(conn)
+            raise
+        wait_time = time.time() - start_time
+        with self._condition:
+            self._wait_histogram.record(wait_time)
+        return conn
+
+    def release(self, conn, error=None):
+        with self._condition:
+            conn.in_use -= 1
+            if isinstance(error, grpc.RpcError):
+                # the channel is reopened by the next borrow
+                logger.debug("Connection: %d marked unhealthy: %s" % (conn.index, str(error)))
+                conn.healthy = False
+            self._condition.notify()
+
+    @contextmanager
+    def borrow(self):
+        """ with pool.borrow() as client: ..., the connection is returned to the pool at exit """
+        conn = self.acquire()
+        try:
+            yield conn.client
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            self.release(conn, e)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """ Close the opened connections, a later borrow opens them again """
+        with self._condition:
+            for conn in self._connections:
+                with conn.lock:
+                    if conn.client is not None:
+                        conn.client.close()
+                        conn.client = None
+                        conn.healthy = True
+
+    def stats(self, prefix="pool_wait", reset=False):
+        """ Pool wait time distribution and connection counters """
+        with self._condition:
+            result = {k: v for k, v in self._wait_histogram.summary(prefix, percentiles=[50, 99]).items()
+                      if not k.endswith("_ci")}
+            result.update({
+                "pool_size": len(self._connections),
+                "pool_policy": self._policy,
+                "pool_connects": self._connects,
+                "pool_reconnects": self._reconnects,
+                "pool_borrows": self._wait_histogram.count
+            })
+            if reset:
+                self._wait_histogram = LatencyHistogram()
+        return result
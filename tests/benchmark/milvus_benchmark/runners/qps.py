@@ -0,0 +1,233 @@
+import time
+import copy
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
+from milvus_benchmark.runners.pool import ConnectionPool, ROUND_ROBIN
+
+logger = logging.getLogger("milvus_benchmark.runners.qps")
+
+DEFAULT_DURATION = 30
+DEFAULT_WORKERS = 32
+DEFAULT_ARRIVAL = "poisson"
+# the rate is not sustainable any more if the achieved throughput is lower than this ratio of the offered rate
+DEFAULT_THROUGHPUT_RATIO = 0.95
+DEFAULT_LATENCY_PERCENTILE = 99
+
+
+def gen_rates(rates=None, rate_step=None):
+    """
+    Target rates (requests per second) of the steps:
+    rates: [100, 200, 400]
+    rate_step: {"start": 100, "step": 100, "max": 2000}
+    """
+    if rates:
+        return [float(rate) for rate in rates]
+    if not rate_step:
+        raise Exception("rates or rate_step should be specified")
+    start = float(rate_step["start"])
+    step = float(rate_step["step"])
+    max_rate = float(rate_step["max"])
+    if start <= 0 or step <= 0:
+        raise Exception("rate_step: %s should be positive" % str(rate_step))
+    return [float(rate) for rate in np.arange(start, max_rate + step / 2, step)]
+
+
+def gen_schedule(rate, duration, arrival=DEFAULT_ARRIVAL, seed=0):
+    """ Return the send time offsets (seconds from the step start) of the requests of one step """
+    if arrival == "constant":
+        return np.arange(0, duration, 1.0 / rate)
+    elif arrival == "poisson":
+        rng = np.random.default_rng(seed)
+        # draw more intervals than needed then cut the ones scheduled after duration
+        count = int(rate * duration * 1.2) + 10
+        offsets = np.cumsum(rng.exponential(1.0 / rate, count))
+        while offsets[-1] < duration:
+            offsets = np.concatenate([offsets, offsets[-1] + np.cumsum(rng.exponential(1.0 / rate, count))])
+        return offsets[offsets < duration]
+    else:
+        raise Exception("arrival: %s not supported" % arrival)
+
+
+class QPSRunner(BaseRunner):
+    """
+    run search with open-loop arrivals:
+    the requests are sent at the scheduled time whether the previous ones are finished or not,
+    latency is measured from the scheduled send time so that queueing in the client is not omitted
+    """
+    name = "qps_performance"
+
+    def __init__(self, env, metric):
+        super(QPSRunner, self).__init__(env, metric)
+        self._pool = None
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        nq = collection["nq"] if "nq" in collection else 1
+        top_k = collection["top_k"] if "top_k" in collection else 10
+        search_param = collection["search_param"] if "search_param" in collection else {}
+        rates = gen_rates(collection["rates"] if "rates" in collection else None,
+                          collection["rate_step"] if "rate_step" in collection else None)
+        duration = collection["duration"] if "duration" in collection else DEFAULT_DURATION
+        arrival = collection["arrival"] if "arrival" in collection else DEFAULT_ARRIVAL
+        workers = collection["workers"] if "workers" in collection else DEFAULT_WORKERS
+        connections = collection["connections"] if "connections" in collection else 1
+        connection_policy = collection["connection_policy"] if "connection_policy" in collection else ROUND_ROBIN
+        knee = collection["knee"] if "knee" in collection else {}
+        guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size
+        }
+        index_info = self.milvus.describe_index(index_field_name, collection_name)
+        query_vectors = utils.get_vectors_from_binary(nq, dimension, data_type)
+        search_info = {
+            "topk": top_k,
+            "query": query_vectors,
+            "metric_type": utils.metric_type_trans(metric_type),
+            "params": search_param}
+        run_params = {
+            "rates": rates,
+            "duration": duration,
+            "arrival": arrival,
+            "workers": workers,
+            "connections": connections,
+            "knee": knee
+        }
+        self.init_metric(self.name, collection_info, index_info, None, run_params)
+        case_metric = copy.deepcopy(self.metric)
+        # set metric type as case
+        case_metric.set_case_metric_type()
+        case_metric.search = {
+            "nq": nq,
+            "topk": top_k,
+            "search_param": search_param,
+            "guarantee_timestamp": guarantee_timestamp
+        }
+        case_param = {
+            "collection_name": collection_name,
+            "index_field_name": index_field_name,
+            "vector_query": {"vector": {index_field_name: search_info}},
+            "filter_query": [],
+            "guarantee_timestamp": guarantee_timestamp,
+            "rates": rates,
+            "duration": duration,
+            "arrival": arrival,
+            "workers": workers,
+            "connections": connections,
+            "connection_policy": connection_policy,
+            "throughput_ratio": knee["throughput_ratio"] if "throughput_ratio" in knee else DEFAULT_THROUGHPUT_RATIO,
+            "latency_percentile": knee["latency_percentile"] if "latency_percentile" in knee else DEFAULT_LATENCY_PERCENTILE,
+            "latency_threshold": knee["latency_threshold"] if "latency_threshold" in knee else None
+        }
+        return [case_param], [case_metric]
+
+    def prepare(self, **case_param):
+        collection_name = case_param["collection_name"]
+        self.milvus.set_collection(collection_name)
+        if not self.milvus.exists_collection():
+            logger.error("collection name: {} not existed".format(collection_name))
+            return False
+        logger.info("Start load collection")
+        self.milvus.load_collection(timeout=1200)
+        # the pool of the previous collection is not used anymore
+        if self._pool is not None:
+            self._pool.close()
+        self._pool = ConnectionPool(self.hostname, self.port, collection_name=collection_name,
+                                    size=case_param["connections"], policy=case_param["connection_policy"])
+
+    def search(self, case_param):
+        with self._pool.borrow() as milvus:
+            milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                         guarantee_timestamp=case_param["guarantee_timestamp"])
+
+    def run_step(self, rate, seed, **case_param):
+        """ Send the requests of one rate on schedule and return the latency histogram and the throughput """
+        schedule = gen_schedule(rate, case_param["duration"], case_param["arrival"], seed=seed)
+        histogram = LatencyHistogram()
+        lock = threading.Lock()
+        stats = {"errors": 0, "last_done": 0.0}
+
+        def _request(scheduled_time):
+            try:
+                self.search(case_param)
+                done_time = time.perf_counter()
+                with lock:
+                    histogram.record(done_time - scheduled_time)
+                    stats["last_done"] = max(stats["last_done"], done_time)
+            except Exception as e:
+                logger.debug(traceback.format_exc())
+                with lock:
+                    stats["errors"] += 1
+
+        with ThreadPoolExecutor(max_workers=case_param["workers"]) as executor:
+            start_time = time.perf_counter()
+            late = 0
+            for offset in schedule:
+                scheduled_time = start_time + offset
+                wait_time = scheduled_time - time.perf_counter()
+                if wait_time > 0:
+                    time.sleep(wait_time)
+                elif wait_time < -0.001:
+                    late += 1
+                executor.submit(_request, scheduled_time)
+        elapsed = max(stats["last_done"], start_time + case_param["duration"]) - start_time
+        step = {
+            "target_rate": rate,
+            "sent": len(schedule),
+            "completed": histogram.count,
+            "errors": stats["errors"],
+            "late_sends": late,
+            "offered_qps": round(len(schedule) / case_param["duration"], 2),
+            "qps": round(histogram.count / elapsed, 2) if elapsed else 0.0
+        }
+        step.update(histogram.summary("latency"))
+        step.update(self._pool.stats(reset=True))
+        return step, histogram
+
+    def is_saturated(self, step, **case_param):
+        """ The knee: achieved throughput falls behind the offered rate, or the tail latency exceeds the threshold """
+        if step["errors"] or step["qps"] < case_param["throughput_ratio"] * step["offered_qps"]:
+            return True
+        latency_threshold = case_param["latency_threshold"]
+        if latency_threshold is not None:
+            latency_key = "latency_p%s" % ("%g" % case_param["latency_percentile"]).replace(".", "")
+            if latency_key not in step:
+                latency_key = "latency_p99"
+            return step[latency_key] > latency_threshold
+        return False
+
+    def run_case(self, case_metric, **case_param):
+        steps = []
+        knee_rate = None
+        max_sustained_rate = None
+        for i, rate in enumerate(case_param["rates"]):
+            logger.info("Start qps step: %d, target rate: %s, arrival: %s" % (i+1, rate, case_param["arrival"]))
+            step, histogram = self.run_step(rate, i, **case_param)
+            step["latency_histogram"] = histogram.to_dict()
+            logger.info({k: v for k, v in step.items() if k != "latency_histogram"})
+            steps.append(step)
+            if self.is_saturated(step, **case_param):
+                knee_rate = rate
+                logger.info("Saturation knee found at rate: %s" % rate)
+                break
+            max_sustained_rate = rate
+        tmp_result = {
+            "steps": steps,
+            "max_sustained_rate": max_sustained_rate,
+            "knee_rate": knee_rate,
+            "max_qps": max([step["qps"] for step in steps]) if steps else 0.0
+        }
+        return tmp_result
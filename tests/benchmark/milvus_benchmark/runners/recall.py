@@ -0,0 +1,140 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.runners.recall")
+
+# ids used to pad result rows that returned less than top_k entities
+PAD_ID = -1
+# tolerance used when comparing distances of the returned entities with the k-th ground truth distance
+DISTANCE_EPSILON = 1e-3
+
+
+def to_id_matrix(ids, k=None):
+    """
+    Convert the ids returned by query (list of lists, possibly ragged) to a (nq, k) int64 array,
+    short rows are padded with PAD_ID
+    """
+    if isinstance(ids, np.ndarray) and ids.ndim == 2:
+        matrix = ids.astype(np.int64, copy=False)
+        if k is not None and matrix.shape[1] < k:
+            matrix = np.hstack([matrix, np.full((matrix.shape[0], k - matrix.shape[1]), PAD_ID, dtype=np.int64)])
+        return matrix[:, :k] if k is not None else matrix
+    rows = [np.asarray(row, dtype=np.int64).reshape(-1) for row in ids]
+    width = k if k is not None else max([len(row) for row in rows] or [0])
+    matrix = np.full((len(rows), width), PAD_ID, dtype=np.int64)
+    for i, row in enumerate(rows):
+        row = row[:width]
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def to_distance_matrix(distances, k=None):
+    """ Same as to_id_matrix for distances, short rows are padded with inf """
+    if isinstance(distances, np.ndarray) and distances.ndim == 2:
+        matrix = distances.astype(np.float32, copy=False)
+        if k is not None and matrix.shape[1] < k:
+            matrix = np.hstack([matrix, np.full((matrix.shape[0], k - matrix.shape[1]), np.inf, dtype=np.float32)])
+        return matrix[:, :k] if k is not None else matrix
+    rows = [np.asarray(row, dtype=np.float32).reshape(-1) for row in distances]
+    width = k if k is not None else max([len(row) for row in rows] or [0])
+    matrix = np.full((len(rows), width), np.inf, dtype=np.float32)
+    for i, row in enumerate(rows):
+        row = row[:width]
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def _row_keys(matrix, low, span):
+    """ Shift the ids of every row into a disjoint range so that all rows can be searched at once """
+    offsets = np.arange(matrix.shape[0], dtype=np.int64).reshape(-1, 1) * span
+    return matrix - low + offsets
+
+
+def _dense_ids(true_ids, result_ids):
+    """ Replace the ids by their rank among all the ids, the order and the equality of the ids are kept """
+    _, inverse = np.unique(np.concatenate([true_ids.reshape(-1), result_ids.reshape(-1)]), return_inverse=True)
+    inverse = inverse.astype(np.int64).reshape(-1)
+    return inverse[:true_ids.size].reshape(true_ids.shape), inverse[true_ids.size:].reshape(result_ids.shape)
+
+
+def recall_at_k(true_ids, result_ids, k=None):
+    """
+    Per query recall@k computed on whole arrays
+    true_ids: (nq, >=k) ground truth neighbors
+    result_ids: (nq, >=k) ids returned by query, padded with PAD_ID
+    return: (nq,) float64 array of |result[:k] & true[:k]| / k
+    """
+    true_ids = to_id_matrix(true_ids)
+    if k is None:
+        k = to_id_matrix(result_ids).shape[1]
+    k = min(k, true_ids.shape[1])
+    result_ids = to_id_matrix(result_ids, k)
+    true_ids = true_ids[:len(result_ids), :k]
+    nq = result_ids.shape[0]
+    if nq == 0 or k == 0:
+        return np.zeros(nq, dtype=np.float64)
+    valid = result_ids != PAD_ID
+    # python ints, the span of 64 bits ids does not fit in int64
+    low = int(min(true_ids.min(), result_ids.min()))
+    span = int(max(true_ids.max(), result_ids.max())) - low + 1
+    if span * nq > np.iinfo(np.int64).max:
+        # the row keys of sparse ids (e.g. timestamp auto ids) would overflow, the ranks of the ids are dense
+        true_ids, result_ids = _dense_ids(true_ids, result_ids)
+        low = 0
+        span = int(max(true_ids.max(), result_ids.max())) + 1
+    true_keys = np.sort(_row_keys(true_ids, low, span), axis=None)
+    # duplicated ids in one result row are only counted once
+    result_keys = _row_keys(result_ids, low, span)
+    order = np.argsort(result_keys, axis=1)
+    result_keys = np.take_along_axis(result_keys, order, axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    first = np.ones_like(valid)
+    first[:, 1:] = result_keys[:, 1:] != result_keys[:, :-1]
+    flat_keys = result_keys.reshape(-1)
+    pos = np.searchsorted(true_keys, flat_keys)
+    pos = np.minimum(pos, len(true_keys) - 1)
+    hit = (true_keys[pos] == flat_keys).reshape(nq, k) & valid & first
+    return hit.sum(axis=1) / float(k)
+
+
+def convert_distances(distances, metric_type):
+    """
+    Convert the distances returned by server to the definition used by the hdf5 datasets:
+    squared l2 -> euclidean, inner product -> angular (1 - ip)
+    """
+    distances = np.asarray(distances, dtype=np.float32)
+    if metric_type == "l2":
+        return np.sqrt(np.maximum(distances, 0))
+    elif metric_type in ["ip", "angular"]:
+        return 1 - distances
+    return distances
+
+
+def tie_aware_recall(true_distances, result_distances, k=None, epsilon=DISTANCE_EPSILON):
+    """
+    Per query recall counting every returned entity whose distance is not larger than the k-th
+    ground truth distance, so that entities tied with the k-th neighbor are not counted as misses
+    true_distances: (nq, >=k) ground truth distances, ascending
+    result_distances: (nq, >=k) returned distances in the same definition, padded with inf
+    """
+    true_distances = to_distance_matrix(true_distances)
+    if k is None:
+        k = to_distance_matrix(result_distances).shape[1]
+    k = min(k, true_distances.shape[1])
+    result_distances = to_distance_matrix(result_distances, k)
+    if result_distances.shape[0] == 0 or k == 0:
+        return np.zeros(result_distances.shape[0], dtype=np.float64)
+    threshold = true_distances[:len(result_distances), k - 1:k] + epsilon
+    return (result_distances <= threshold).sum(axis=1) / float(k)
+
+
+def recall_summary(per_query, prefix="acc"):
+    """ Summarize the per query recall distribution: mean, p5 and min """
+    per_query = np.asarray(per_query, dtype=np.float64)
+    if not len(per_query):
+        return {prefix: 0.0, prefix + "_p5": 0.0, prefix + "_min": 0.0}
+    return {
+        prefix: round(float(per_query.mean()), 3),
+        prefix + "_p5": round(float(np.percentile(per_query, 5)), 3),
+        prefix + "_min": round(float(per_query.min()), 3)
+    }
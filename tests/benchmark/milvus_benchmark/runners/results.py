@@ -0,0 +1,64 @@
+import logging
+import numpy as np
+
+from .recall import PAD_ID, to_id_matrix, to_distance_matrix
+
+logger = logging.getLogger("milvus_benchmark.runners.results")
+
+
+def _raw_results(result):
+    """ The SearchResultData messages of a pymilvus search result, None if it does not carry them """
+    if hasattr(result, "_raw_list"):
+        return [raw.results for raw in result._raw_list]
+    if hasattr(result, "_raw") and hasattr(result._raw, "results"):
+        return [result._raw.results]
+    return None
+
+
+def _scatter(values, topks, width, fill, dtype):
+    """ Put the flattened values of the queries (topks[i] values of query i) into a (nq, width) array """
+    nq = len(topks)
+    if nq and (topks == topks[0]).all() and topks[0] >= width:
+        return values.reshape(nq, topks[0])[:, :width].astype(dtype, copy=False)
+    matrix = np.full((nq, width), fill, dtype=dtype)
+    starts = np.cumsum(topks) - topks
+    rows = np.repeat(np.arange(nq), topks)
+    cols = np.arange(len(values)) - np.repeat(starts, topks)
+    keep = cols < width
+    matrix[rows[keep], cols[keep]] = values[keep]
+    return matrix
+
+
+def _raw_arrays(data, k):
+    nq = data.num_queries
+    ids = np.fromiter(data.ids.int_id.data, dtype=np.int64, count=len(data.ids.int_id.data))
+    scores = np.fromiter(data.scores, dtype=np.float32, count=len(data.scores))
+    if len(data.topks):
+        topks = np.fromiter(data.topks, dtype=np.int64, count=len(data.topks))
+    else:
+        # the servers without topks return top_k entities of every query
+        topks = np.full(nq, len(ids) // nq if nq else 0, dtype=np.int64)
+    width = k if k is not None else int(topks.max() if len(topks) else 0)
+    return _scatter(ids, topks, width, PAD_ID, np.int64), _scatter(scores, topks, width, np.inf, np.float32)
+
+
+def result_arrays(result, k=None):
+    """
+    Convert a search response into (nq, k) int64 ids and float32 distances arrays without walking the hits:
+    the rows of the queries returning less than k entities are padded with PAD_ID and inf,
+    k is the longest row if not given
+    """
+    if hasattr(result, "id_array"):
+        # the local backend keeps the arrays of the search
+        return to_id_matrix(result.id_array, k), to_distance_matrix(result.distance_array, k)
+    raws = _raw_results(result)
+    if raws is None or any(len(data.ids.int_id.data) != len(data.scores) for data in raws):
+        # string primary keys or an unknown result type
+        return to_id_matrix([hits.ids for hits in result], k), to_distance_matrix([hits.distances for hits in result], k)
+    if k is None:
+        k = max([int(max(data.topks)) if len(data.topks) else data.top_k for data in raws] or [0])
+    arrays = [_raw_arrays(data, k) for data in raws]
+    if len(arrays) == 1:
+        return arrays[0]
+    # the chunks of a result are the batches of the queries
+    return np.concatenate([ids for ids, _ in arrays]), np.concatenate([distances for _, distances in arrays])
@@ -0,0 +1,147 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from milvus_benchmark.client import MilvusClient
+
+logger = logging.getLogger("milvus_benchmark.runners.sampler")
+
+DEFAULT_SAMPLE_INTERVAL = 5
+SYSTEM_INFO = "system_info"
+SYSTEM_STATISTICS = "system_statistics"
+# bytes -> GB
+MEMORY_UNIT = 1024 * 1024 * 1024
+
+
+def parse_nodes(metrics):
+    """ Return {node name: {"type", "cpu", "memory", "memory_total"}} of a system_info response, cpu in percent """
+    nodes = dict()
+    for node in metrics.get("nodes_info") or []:
+        infos = node.get("infos") or {}
+        hardware = infos.get("hardware_infos") or {}
+        name = infos.get("name") or str(node.get("identifier"))
+        nodes[name] = {
+            "type": infos.get("type"),
+            "cpu": hardware.get("cpu_core_usage"),
+            "memory": round(hardware["memory_usage"] / float(MEMORY_UNIT), 3) if "memory_usage" in hardware else None,
+            "memory_total": round(hardware["memory"] / float(MEMORY_UNIT), 3) if "memory" in hardware else None
+        }
+    return nodes
+
+
+class ResourceSampler(object):
+    """
+    Poll GetMetrics of every node in a background thread, every interval seconds:
+    the samples are tagged with the phases (prepare/run_case) and the case indexes running when they are taken,
+    so that the server cpu and memory of a case can be reported next to its latency results
+    """
+
+    def __init__(self, host, port, interval=DEFAULT_SAMPLE_INTERVAL, statistics=False):
+        self._host = host
+        self._port = port
+        self._interval = interval
+        self._statistics = statistics
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._client = None
+        # thread id -> (phase, case index), the lanes of the scheduler run in their own thread
+        self._phases = dict()
+        self._samples = []
+        self._statistics_samples = []
+
+    def start(self):
+        try:
+            self._client = MilvusClient(host=self._host, port=self._port)
+            self._client.get_metrics(SYSTEM_INFO)
+        except Exception as e:
+            logger.warning("Resource sampling disabled, get metrics failed: %s" % str(e))
+            return False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info("Resource sampling started, interval: %s" % self._interval)
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def phase(self, phase, index):
+        """ Tag the samples taken in the block with the phase and the case index """
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._phases[thread_id] = (phase, index)
+        # a sample at the start, the short phases are not missed
+        self.sample()
+        try:
+            yield
+        finally:
+            self.sample()
+            with self._lock:
+                self._phases.pop(thread_id, None)
+
+    def sample(self):
+        if self._thread is None:
+            return
+        with self._lock:
+            tags = list(self._phases.values())
+        try:
+            nodes = parse_nodes(self._client.get_metrics(SYSTEM_INFO))
+        except Exception as e:
+            logger.debug("Get metrics failed: %s" % str(e))
+            return
+        statistics = None
+        if self._statistics:
+            # system_statistics is not served by every server version, the node samples are kept
+            try:
+                statistics = self._client.get_metrics(SYSTEM_STATISTICS)
+            except Exception as e:
+                logger.debug("Get statistics failed: %s" % str(e))
+        now = time.time()
+        with self._lock:
+            self._samples.append({"time": now, "tags": tags, "nodes": nodes})
+            if statistics is not None:
+                self._statistics_samples.append({"time": now, "tags": tags, "statistics": statistics})
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            self.sample()
+
+    def case_resources(self, index):
+        """
+        The per node time series of the phases of the case, e.g.
+        {"run_case": {"start_time": t, "nodes": {name: {"type", "elapsed": [..], "cpu": [..], "memory": [..],
+                                                        "cpu_max", "cpu_avg", "memory_max"}}}, "prepare": ...}
+        """
+        with self._lock:
+            samples = list(self._samples)
+        result = dict()
+        for sample in samples:
+            for phase, case_index in sample["tags"]:
+                if case_index != index:
+                    continue
+                phase_result = result.setdefault(phase, {"start_time": sample["time"], "nodes": dict()})
+                for name, node in sample["nodes"].items():
+                    series = phase_result["nodes"].setdefault(name, {"type": node["type"], "elapsed": [],
+                                                                     "cpu": [], "memory": []})
+                    series["elapsed"].append(round(sample["time"] - phase_result["start_time"], 2))
+                    series["cpu"].append(node["cpu"])
+                    series["memory"].append(node["memory"])
+        for phase_result in result.values():
+            for series in phase_result["nodes"].values():
+                cpu = [value for value in series["cpu"] if value is not None]
+                memory = [value for value in series["memory"] if value is not None]
+                series["cpu_max"] = max(cpu) if cpu else None
+                series["cpu_avg"] = round(sum(cpu) / len(cpu), 2) if cpu else None
+                series["memory_max"] = max(memory) if memory else None
+        if self._statistics:
+            with self._lock:
+                statistics = [sample for sample in self._statistics_samples
+                              if any(case_index == index for _, case_index in sample["tags"])]
+            result["statistics"] = [{"time": sample["time"], "statistics": sample["statistics"]}
+                                    for sample in statistics]
+        return result
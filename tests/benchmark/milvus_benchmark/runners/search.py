@@ -1,29 +1,77 @@
 import time
-import copy
 import json
 import logging
 from milvus_benchmark import parser
 from milvus_benchmark.runners import utils
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram
+from milvus_benchmark.runners.async_search import PipelinedSearcher, parse_search_concurrency, DEFAULT_DURATION
 
 logger = logging.getLogger("milvus_benchmark.runners.search")
 
+DEFAULT_WARM_UP_COUNT = 1
+
+
+def run_search_rounds(milvus, case_param):
+    """
+    Run warm_up_count discarded queries and then run_count timed queries,
+    return the min/avg query time and the latency histogram of the timed queries
+    """
+    run_count = case_param["run_count"]
+    warm_up_count = case_param["warm_up_count"] if "warm_up_count" in case_param else DEFAULT_WARM_UP_COUNT
+    for i in range(warm_up_count):
+        logger.debug("Start warm up query, run %d of %s" % (i+1, warm_up_count))
+        milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                     guarantee_timestamp=case_param["guarantee_timestamp"])
+    histogram = LatencyHistogram()
+    min_query_time = 0.0
+    total_query_time = 0.0
+    for i in range(run_count):
+        logger.debug("Start run query, run %d of %s" % (i+1, run_count))
+        start_time = time.time()
+        _query_res = milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                                  guarantee_timestamp=case_param["guarantee_timestamp"])
+        interval_time = time.time() - start_time
+        histogram.record(interval_time)
+        total_query_time += interval_time
+        if (i == 0) or (min_query_time > interval_time):
+            min_query_time = round(interval_time, 2)
+    avg_query_time = round(total_query_time/run_count, 2)
+    return min_query_time, avg_query_time, histogram
+
+
+def latency_result(histogram, prefix="search_time"):
+    """ Latency percentiles, bootstrap confidence intervals and the compact histogram of a case """
+    result = histogram.summary(prefix)
+    result["%s_histogram" % prefix] = histogram.to_dict()
+    return result
+
 
 class SearchRunner(BaseRunner):
     """run search"""
     name = "search_performance"
 
+    lazy_cases = True
+
     def __init__(self, env, metric):
         super(SearchRunner, self).__init__(env, metric)
 
     def extract_cases(self, collection):
+        return self.collect_cases(collection)
+
+    def iter_cases(self, collection):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         run_count = collection["run_count"]
+        warm_up_count = collection["warm_up_count"] if "warm_up_count" in collection else DEFAULT_WARM_UP_COUNT
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
         filters = collection["filters"] if "filters" in collection else []
         guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        search_concurrency = parse_search_concurrency(collection["search_concurrency"]) \
+            if "search_concurrency" in collection else []
+        search_connections = collection["search_connections"] if "search_connections" in collection else 1
+        pipeline_duration = collection["pipeline_duration"] if "pipeline_duration" in collection else DEFAULT_DURATION
         
         search_params = collection["search_params"]
         # TODO: get fields by describe_index
@@ -40,9 +88,7 @@ class SearchRunner(BaseRunner):
         index_info = None
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
-        cases = list()
-        case_metrics = list()
+        base_query_vectors = utils.read_only(utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type))
         self.init_metric(self.name, collection_info, index_info, None)
         for search_param in search_params:
             logger.info("Search param: %s" % json.dumps(search_param))
@@ -60,6 +106,7 @@ class SearchRunner(BaseRunner):
                         raise Exception("%s not supported" % filter)
                 logger.info("filter param: %s" % json.dumps(filter_param))
                 for nq in nqs:
+                    # a view of the query vectors shared by the cases
                     query_vectors = base_query_vectors[0:nq]
                     for top_k in top_ks:
                         search_info = {
@@ -67,28 +114,27 @@ class SearchRunner(BaseRunner):
                             "query": query_vectors, 
                             "metric_type": utils.metric_type_trans(metric_type), 
                             "params": search_param}
-                        # TODO: only update search_info
-                        case_metric = copy.deepcopy(self.metric)
-                        case_metric.set_case_metric_type()
-                        case_metric.search = {
+                        case_metric = self.new_case_metric(search={
                             "nq": nq,
                             "topk": top_k,
                             "search_param": search_param,
                             "filter": filter_param,
                             "guarantee_timestamp": guarantee_timestamp
-                        }
+                        })
                         vector_query = {"vector": {index_field_name: search_info}}
                         case = {
                             "collection_name": collection_name,
                             "index_field_name": index_field_name,
                             "run_count": run_count,
+                            "warm_up_count": warm_up_count,
                             "filter_query": filter_query,
                             "vector_query": vector_query,
-                            "guarantee_timestamp": guarantee_timestamp
+                            "guarantee_timestamp": guarantee_timestamp,
+                            "search_concurrency": search_concurrency,
+                            "search_connections": search_connections,
+                            "pipeline_duration": pipeline_duration
                         }
-                        cases.append(case)
-                        case_metrics.append(case_metric)
-        return cases, case_metrics
+                        yield case, case_metric
 
     def prepare(self, **case_param):
         collection_name = case_param["collection_name"]
@@ -104,21 +150,17 @@ class SearchRunner(BaseRunner):
 
     def run_case(self, case_metric, **case_param):
         # index_field_name = case_param["index_field_name"]
-        run_count = case_param["run_count"]
-        avg_query_time = 0.0
-        min_query_time = 0.0
-        total_query_time = 0.0        
-        for i in range(run_count):
-            logger.debug("Start run query, run %d of %s" % (i+1, run_count))
-            start_time = time.time()
-            _query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
-                                           guarantee_timestamp=case_param["guarantee_timestamp"])
-            interval_time = time.time() - start_time
-            total_query_time += interval_time
-            if (i == 0) or (min_query_time > interval_time):
-                min_query_time = round(interval_time, 2)
-        avg_query_time = round(total_query_time/run_count, 2)
+        min_query_time, avg_query_time, histogram = run_search_rounds(self.milvus, case_param)
         tmp_result = {"search_time": min_query_time, "avc_search_time": avg_query_time}
+        tmp_result.update(latency_result(histogram))
+        if case_param["search_concurrency"]:
+            # throughput with the requests pipelined on the connections, one point per concurrency
+            tmp_result["pipelined"] = [
+                PipelinedSearcher(self.hostname, self.port, case_param["collection_name"],
+                                  connections=case_param["search_connections"], concurrency=concurrency)
+                .run(case_param["vector_query"], filter_query=case_param["filter_query"],
+                     guarantee_timestamp=case_param["guarantee_timestamp"], duration=case_param["pipeline_duration"])
+                for concurrency in case_param["search_concurrency"]]
         return tmp_result
 
 
@@ -126,18 +168,25 @@ class InsertSearchRunner(BaseRunner):
     """run insert and search"""
     name = "insert_search_performance"
 
+    lazy_cases = True
+
     def __init__(self, env, metric):
         super(InsertSearchRunner, self).__init__(env, metric)
         self.build_time = None
+        self.load_time = None
         self.insert_result = None
 
     def extract_cases(self, collection):
+        return self.collect_cases(collection)
+
+    def iter_cases(self, collection):
         collection_name = collection["collection_name"] if "collection_name" in collection else None
         (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
         build_index = collection["build_index"] if "build_index" in collection else False
         index_type = collection["index_type"] if "index_type" in collection else None
         index_param = collection["index_param"] if "index_param" in collection else None
         run_count = collection["run_count"]
+        warm_up_count = collection["warm_up_count"] if "warm_up_count" in collection else DEFAULT_WARM_UP_COUNT
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
         guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
@@ -146,6 +195,7 @@ class InsertSearchRunner(BaseRunner):
         filter_query = []
         search_params = collection["search_params"]
         ni_per = collection["ni_per"]
+        insert_concurrency = collection["insert_concurrency"] if "insert_concurrency" in collection else None
 
         # TODO: get fields by describe_index
         # fields = self.get_fields(self.milvus, collection_name)
@@ -163,9 +213,7 @@ class InsertSearchRunner(BaseRunner):
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
         # Get the path of the query.npy file stored on the NAS and get its data
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
-        cases = list()
-        case_metrics = list()
+        base_query_vectors = utils.read_only(utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type))
         self.init_metric(self.name, collection_info, index_info, None)
         
         for search_param in search_params:
@@ -182,7 +230,7 @@ class InsertSearchRunner(BaseRunner):
                     # filter_param.append(filter["term"])
                 # logger.info("filter param: %s" % json.dumps(filter_param))
                 for nq in nqs:
-                    # Take nq groups of data for query
+                    # Take nq groups of data for query, a view shared by the cases
                     query_vectors = base_query_vectors[0:nq]
                     for top_k in top_ks:
                         search_info = {
@@ -190,17 +238,13 @@ class InsertSearchRunner(BaseRunner):
                             "query": query_vectors, 
                             "metric_type": utils.metric_type_trans(metric_type), 
                             "params": search_param}
-                        # TODO: only update search_info
-                        case_metric = copy.deepcopy(self.metric)
-                        # set metric type as case
-                        case_metric.set_case_metric_type()
-                        case_metric.search = {
+                        case_metric = self.new_case_metric(search={
                             "nq": nq,
                             "topk": top_k,
                             "search_param": search_param,
                             "filter": filter_query,
                             "guarantee_timestamp": guarantee_timestamp
-                        }
+                        })
                         vector_query = {"vector": {index_field_name: search_info}}
                         case = {
                             "collection_name": collection_name,
@@ -211,18 +255,18 @@ class InsertSearchRunner(BaseRunner):
                             "vector_type": vector_type,
                             "collection_size": collection_size,
                             "ni_per": ni_per,
+                            "insert_concurrency": insert_concurrency,
                             "build_index": build_index,
                             "index_type": index_type,
                             "index_param": index_param,
                             "metric_type": metric_type,
                             "run_count": run_count,
+                            "warm_up_count": warm_up_count,
                             "filter_query": filter_query,
                             "vector_query": vector_query,
                             "guarantee_timestamp": guarantee_timestamp
                         }
-                        cases.append(case)
-                        case_metrics.append(case_metric)
-        return cases, case_metrics
+                        yield case, case_metric
 
     def prepare(self, **case_param):
         collection_name = case_param["collection_name"]
@@ -254,7 +298,7 @@ class InsertSearchRunner(BaseRunner):
             else:
                 build_index = False
                 logger.warning("Please specify the index_type")
-        insert_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        insert_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"], insert_concurrency=case_param["insert_concurrency"])
         self.insert_result = insert_result
         build_time = 0.0
         start_time = time.time()
@@ -273,27 +317,16 @@ class InsertSearchRunner(BaseRunner):
         logger.info("Start load collection")
         load_start_time = time.time() 
         self.milvus.load_collection(timeout=1200)
-        logger.debug({"load_time": round(time.time()-load_start_time, 2)})
+        self.load_time = round(time.time()-load_start_time, 2)
+        logger.debug({"load_time": self.load_time})
         
     def run_case(self, case_metric, **case_param):
-        run_count = case_param["run_count"]
-        min_query_time = 0.0
-        total_query_time = 0.0        
-        for i in range(run_count):
-            # Number of successive queries
-            logger.debug("Start run query, run %d of %s" % (i+1, run_count))
-            logger.info(case_metric.search)
-            start_time = time.time()
-            _query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
-                                           guarantee_timestamp=case_param["guarantee_timestamp"])
-            interval_time = time.time() - start_time
-            total_query_time += interval_time
-            if (i == 0) or (min_query_time > interval_time):
-                min_query_time = round(interval_time, 2)
-        avg_query_time = round(total_query_time/run_count, 2)
+        logger.info(case_metric.search)
+        min_query_time, avg_query_time, histogram = run_search_rounds(self.milvus, case_param)
         logger.info("Min query time: %.2f, avg query time: %.2f" % (min_query_time, avg_query_time))
         # insert_result: "total_time", "rps", "ni_time"
-        tmp_result = {"insert": self.insert_result, "build_time": self.build_time, "search_time": min_query_time, "avc_search_time": avg_query_time}
+        tmp_result = {"insert": self.insert_result, "build_time": self.build_time, "load_time": self.load_time, "search_time": min_query_time, "avc_search_time": avg_query_time}
+        tmp_result.update(latency_result(histogram))
         # 
         # logger.info("Start load collection")
         # self.milvus.load_collection(timeout=1200)
@@ -0,0 +1,121 @@
+import os
+import logging
+import numpy as np
+
+from milvus_benchmark.runners import utils
+
+logger = logging.getLogger("milvus_benchmark.runners.synthetic")
+
+DEFAULT_SEED = 19530
+DEFAULT_DISTRIBUTION = "uniform"
+DEFAULT_CLUSTERS = 100
+DEFAULT_CLUSTER_STD = 0.05
+# used as batch index of the query vectors, so that they never overlap with the base batches
+QUERY_BATCH_INDEX = -1
+DISTRIBUTIONS = ["uniform", "gaussian_mixture", "normalized", "binary"]
+
+
+class VectorGenerator(object):
+    """
+    Seeded synthetic vectors: every batch is generated by its own generator seeded with (seed, batch index),
+    so a batch is the same whatever the order or the thread it is generated in
+    distribution:
+        uniform: float32 uniform in [0, 1)
+        gaussian_mixture: float32 gaussian clusters around uniform centers
+        normalized: uniform vectors normalized to unit length, for ip
+        binary: packed uint8 vectors of dimension bits
+    """
+
+    def __init__(self, dimension, distribution=DEFAULT_DISTRIBUTION, seed=DEFAULT_SEED,
+                 clusters=DEFAULT_CLUSTERS, cluster_std=DEFAULT_CLUSTER_STD):
+        if distribution not in DISTRIBUTIONS:
+            raise Exception("distribution: %s not supported" % distribution)
+        if distribution == "binary" and dimension % 8:
+            raise Exception("dimension: %s of binary vectors should be divisible by 8" % str(dimension))
+        self._dimension = dimension
+        self._distribution = distribution
+        self._seed = seed
+        self._cluster_std = cluster_std
+        self._centers = None
+        if distribution == "gaussian_mixture":
+            self._centers = np.random.default_rng([seed, clusters]).random((clusters, dimension), dtype=np.float32)
+
+    @property
+    def dimension(self):
+        return self._dimension
+
+    @property
+    def distribution(self):
+        return self._distribution
+
+    def _rng(self, batch_index):
+        # the sign of the batch index is moved into the seed entropy, since seeds must be non negative
+        return np.random.default_rng([self._seed, abs(batch_index), 1 if batch_index < 0 else 0])
+
+    def batch(self, batch_index, size):
+        """ Return the vectors of the batch: (size, dimension) float32, or (size, dimension / 8) uint8 """
+        rng = self._rng(batch_index)
+        if self._distribution == "uniform":
+            return rng.random((size, self._dimension), dtype=np.float32)
+        elif self._distribution == "gaussian_mixture":
+            labels = rng.integers(0, len(self._centers), size)
+            noise = rng.standard_normal((size, self._dimension), dtype=np.float32) * self._cluster_std
+            return self._centers[labels] + noise
+        elif self._distribution == "normalized":
+            vectors = rng.random((size, self._dimension), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            return vectors
+        else:
+            return rng.integers(0, 256, (size, self._dimension // 8), dtype=np.uint8)
+
+    def queries(self, nq):
+        """ Query vectors drawn from the same distribution, independent of the base batches """
+        return self.batch(QUERY_BATCH_INDEX, nq)
+
+    def iter_batches(self, size, ni, start_id=0):
+        """ Yield (start_id, vectors) batches of ni rows, the batch index is derived from the ids """
+        if ni <= 0:
+            raise Exception("ni: %s should be positive" % str(ni))
+        for offset in range(0, size, ni):
+            rows = min(ni, size - offset)
+            yield start_id + offset, self.batch((start_id + offset) // ni, rows)
+
+    def write_shards(self, data_type, size, nq=utils.MAX_NQ, overwrite=False):
+        """
+        Write size vectors as .npy shards in the layout of gen_file_name, and the query file
+        read by get_vectors_from_binary, so that the file data types work with any dimension
+        """
+        vectors_per_file = utils.get_len_vectors_per_file(data_type, self._dimension)
+        if size % vectors_per_file:
+            raise Exception("size: %d should be a multiple of vectors per file: %d" % (size, vectors_per_file))
+        for i in range(size // vectors_per_file):
+            file_name = utils.gen_file_name(i, self._dimension, data_type)
+            if os.path.exists(file_name) and not overwrite:
+                logger.info("Skip existed file: %s" % file_name)
+                continue
+            dir_name = os.path.dirname(file_name)
+            if dir_name and not os.path.isdir(dir_name):
+                os.makedirs(dir_name)
+            # shards are generated in batches of vectors_per_file rows, the batch index is the file index
+            np.save(file_name, self.batch(i, vectors_per_file))
+            logger.info("Write npy file: %s" % file_name)
+        query_file = utils.get_query_file_name(self._dimension, data_type)
+        if query_file and (overwrite or not os.path.exists(query_file)):
+            np.save(query_file, self.queries(nq))
+            logger.info("Write query file: %s" % query_file)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Write synthetic .npy shards in the layout of gen_file_name")
+    arg_parser.add_argument("--data-type", default="random", help="data type of the shards, e.g. random")
+    arg_parser.add_argument("--dimension", type=int, required=True)
+    arg_parser.add_argument("--size", type=int, required=True, help="total count of vectors")
+    arg_parser.add_argument("--distribution", default=DEFAULT_DISTRIBUTION, choices=DISTRIBUTIONS)
+    arg_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    arg_parser.add_argument("--overwrite", action="store_true")
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    VectorGenerator(args.dimension, distribution=args.distribution, seed=args.seed) \
+        .write_shards(args.data_type, args.size, overwrite=args.overwrite)
@@ -0,0 +1,309 @@
+import math
+import time
+import json
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from milvus_benchmark import parser
+from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import synthetic
+from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.pool import ConnectionPool
+from milvus_benchmark.runners.sampler import parse_nodes, SYSTEM_INFO
+from milvus_benchmark.runners.histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.tenant")
+
+SEARCH = "search"
+INSERT = "insert"
+TENANT_OPS = [SEARCH, INSERT]
+TENANT_SUFFIX = "_tenant_"
+DEFAULT_LOADED_FRACTION = 0.2
+DEFAULT_DURATION = 30
+DEFAULT_CONCURRENCY = 8
+DEFAULT_INSERT_BATCH = 100
+DEFAULT_WORKLOAD = {SEARCH: 9, INSERT: 1}
+# collections of the control plane calls timed at every step
+DEFAULT_CONTROL_SAMPLES = 20
+PERCENTILES = [50, 99]
+
+
+def tenant_name(collection_name, index):
+    return "%s%s%d" % (collection_name, TENANT_SUFFIX, index)
+
+
+def latency_summary(histogram, prefix):
+    """ count, p50 and p99 of the histogram, the empty histograms are reported by their count """
+    result = {"%s_count" % prefix: histogram.count}
+    if histogram.count:
+        result.update(histogram.summary(prefix, percentiles=PERCENTILES, ci_percentiles=PERCENTILES))
+    return result
+
+
+class TenantScalingRunner(BaseRunner):
+    """
+    run a collection per tenant, the count of the collections is ramped by the steps:
+    1. every step creates, inserts, indexes the new tenants and loads the loaded_fraction of all the tenants
+    2. the control plane calls (list/has/describe collection) are timed on the tenants
+    3. a mixed search/insert load on random loaded tenants runs for duration seconds
+    4. the memory of every server node is reported at the end of the step
+    the steps reuse the tenants of the previous steps, they are run in the order of collection_counts
+    """
+    name = "tenant_scaling_performance"
+    # the tenants are created by the steps, only the stale tenants are dropped by prepare
+    prepare_keys = ["collection_name", "data_type", "dimension", "collection_size", "ni_per", "other_fields",
+                    "metric_type", "index_type", "index_param"]
+
+    def __init__(self, env, metric):
+        super(TenantScalingRunner, self).__init__(env, metric)
+        self._tenants = []
+        self._loaded = []
+        self._info = None
+
+    def extract_cases(self, collection):
+        collection_name = collection["collection_name"] if "collection_name" in collection else None
+        (data_type, collection_size, dimension, metric_type) = parser.collection_parser(collection_name)
+        ni_per = collection["ni_per"]
+        other_fields = collection["other_fields"] if "other_fields" in collection else None
+        index_type = collection["index_type"] if "index_type" in collection else None
+        index_param = collection["index_param"] if "index_param" in collection else None
+        collection_counts = sorted(collection["collection_counts"])
+        loaded_fraction = collection["loaded_fraction"] if "loaded_fraction" in collection \
+            else DEFAULT_LOADED_FRACTION
+        workload = collection["workload"] if "workload" in collection else DEFAULT_WORKLOAD
+        duration = collection["duration"] if "duration" in collection else DEFAULT_DURATION
+        concurrency = collection["concurrency"] if "concurrency" in collection else DEFAULT_CONCURRENCY
+        insert_batch = collection["insert_batch"] if "insert_batch" in collection else DEFAULT_INSERT_BATCH
+        control_samples = collection["control_samples"] if "control_samples" in collection \
+            else DEFAULT_CONTROL_SAMPLES
+        top_k = collection["top_k"] if "top_k" in collection else 10
+        nq = collection["nq"] if "nq" in collection else 1
+        search_param = collection["search_param"] if "search_param" in collection else {}
+        guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        for op in workload:
+            if op not in TENANT_OPS:
+                raise Exception("Workload operation: %s not supported, supported: %s" % (op, TENANT_OPS))
+        if not 0 < loaded_fraction <= 1:
+            raise Exception("Invalid loaded fraction: %s" % str(loaded_fraction))
+        vector_type = utils.get_vector_type(data_type)
+        index_field_name = utils.get_default_field_name(vector_type)
+        collection_info = {
+            "dimension": dimension,
+            "metric_type": metric_type,
+            "dataset_name": collection_name,
+            "collection_size": collection_size,
+            "other_fields": other_fields,
+            "ni_per": ni_per
+        }
+        index_info = {
+            "index_type": index_type,
+            "index_param": index_param
+        }
+        if data_type == "local" or not data_type:
+            query_vectors = synthetic.VectorGenerator(dimension).queries(nq)
+        else:
+            query_vectors = utils.get_vectors_from_binary(nq, dimension, data_type)
+        search_info = {
+            "topk": top_k,
+            "query": utils.read_only(query_vectors),
+            "metric_type": utils.metric_type_trans(metric_type),
+            "params": search_param}
+        self.init_metric(self.name, collection_info, index_info, None)
+        case_metrics = list()
+        case_params = list()
+        for collection_count in collection_counts:
+            case_metrics.append(self.new_case_metric(search={
+                "nq": nq,
+                "topk": top_k,
+                "search_param": search_param,
+                "guarantee_timestamp": guarantee_timestamp
+            }, run_params={
+                "collection_count": collection_count,
+                "loaded_fraction": loaded_fraction,
+                "workload": workload,
+                "duration": duration,
+                "concurrency": concurrency
+            }))
+            case_params.append({
+                "collection_name": collection_name,
+                "data_type": data_type,
+                "dimension": dimension,
+                "collection_size": collection_size,
+                "ni_per": ni_per,
+                "metric_type": metric_type,
+                "vector_type": vector_type,
+                "other_fields": other_fields,
+                "index_field_name": index_field_name,
+                "index_type": index_type,
+                "index_param": index_param,
+                "collection_count": collection_count,
+                "loaded_fraction": loaded_fraction,
+                "workload": workload,
+                "duration": duration,
+                "concurrency": concurrency,
+                "insert_batch": insert_batch,
+                "control_samples": control_samples,
+                "vector_query": {"vector": {index_field_name: search_info}},
+                "guarantee_timestamp": guarantee_timestamp
+            })
+        return case_params, case_metrics
+
+    def prepare(self, **case_param):
+        """ Drop the tenants left by a previous run, the tenants are created by the steps """
+        prefix = case_param["collection_name"] + TENANT_SUFFIX
+        stale = [name for name in self.milvus.show_collections() if name.startswith(prefix)]
+        for name in stale:
+            self.milvus.drop(collection_name=name)
+        if stale:
+            logger.info("Dropped %d stale tenants" % len(stale))
+            time.sleep(utils.DELETE_INTERVAL_TIME)
+        self._tenants = []
+        self._loaded = []
+        self._info = None
+
+    def _tenant_batches(self, **case_param):
+        data_type = case_param["data_type"]
+        dimension = case_param["dimension"]
+        if data_type == "local" or not data_type:
+            return synthetic.VectorGenerator(dimension).iter_batches(case_param["collection_size"],
+                                                                      case_param["ni_per"])
+        return utils.iter_vector_batches(data_type, dimension, case_param["collection_size"], case_param["ni_per"])
+
+    def add_tenants(self, count, **case_param):
+        """ Create, insert and index the tenants up to count, return the histograms of the steps """
+        histograms = {name: LatencyHistogram() for name in ["create_time", "tenant_insert_time", "build_time"]}
+        while len(self._tenants) < count:
+            name = tenant_name(case_param["collection_name"], len(self._tenants))
+            self.milvus.set_collection(name)
+            start_time = time.time()
+            self.milvus.create_collection(case_param["dimension"], data_type=case_param["vector_type"],
+                                          other_fields=case_param["other_fields"])
+            histograms["create_time"].record(time.time() - start_time)
+            if self._info is None:
+                self._info = self.milvus.get_info(name)
+            start_time = time.time()
+            for start_id, vectors in self._tenant_batches(**case_param):
+                self.insert_core(self.milvus, self._info, start_id, vectors)
+            self.milvus.flush()
+            histograms["tenant_insert_time"].record(time.time() - start_time)
+            if case_param["index_type"]:
+                start_time = time.time()
+                self.milvus.create_index(case_param["index_field_name"], case_param["index_type"],
+                                         case_param["metric_type"], index_param=case_param["index_param"])
+                histograms["build_time"].record(time.time() - start_time)
+            self._tenants.append(name)
+        return histograms
+
+    def load_tenants(self, count):
+        """ Load the first count tenants, return the histogram of the load times """
+        histogram = LatencyHistogram()
+        for name in self._tenants[len(self._loaded):count]:
+            start_time = time.time()
+            self.milvus.load_collection(collection_name=name, timeout=1200)
+            histogram.record(time.time() - start_time)
+            self._loaded.append(name)
+        return histogram
+
+    def control_plane(self, samples):
+        """ Time the list/has/describe collection calls on a sample of the tenants """
+        histograms = {name: LatencyHistogram() for name in ["list_collections_time", "has_collection_time",
+                                                            "describe_collection_time"]}
+        for name in random.sample(self._tenants, min(samples, len(self._tenants))):
+            start_time = time.time()
+            self.milvus.show_collections()
+            histograms["list_collections_time"].record(time.time() - start_time)
+            start_time = time.time()
+            self.milvus.exists_collection(collection_name=name)
+            histograms["has_collection_time"].record(time.time() - start_time)
+            start_time = time.time()
+            self.milvus.get_info(collection_name=name)
+            histograms["describe_collection_time"].record(time.time() - start_time)
+        return histograms
+
+    def workload(self, **case_param):
+        """ Run the mixed search/insert load on random loaded tenants, every worker on its own connection """
+        ops = [op for op in TENANT_OPS if case_param["workload"].get(op)]
+        weights = [case_param["workload"][op] for op in ops]
+        histograms = {op: LatencyHistogram() for op in ops}
+        failures = {op: 0 for op in ops}
+        lock = threading.Lock()
+        # the ids of the inserted entities continue after the ids of the tenant data
+        next_ids = iter(range(case_param["collection_size"], 2 ** 62, case_param["insert_batch"]))
+        stop_time = time.time() + case_param["duration"]
+
+        # a connection per worker, closed at the end of the step
+        pool = ConnectionPool(self.hostname, self.port, size=case_param["concurrency"], max_in_use=1)
+
+        def worker(index):
+            rng = random.Random(index)
+            with pool.borrow() as milvus:
+                while time.time() < stop_time:
+                    op = rng.choices(ops, weights=weights)[0]
+                    name = rng.choice(self._loaded)
+                    start_time = time.time()
+                    try:
+                        if op == SEARCH:
+                            milvus.query(case_param["vector_query"], collection_name=name,
+                                         guarantee_timestamp=case_param["guarantee_timestamp"])
+                            ok = True
+                        else:
+                            with lock:
+                                start_id = next(next_ids)
+                            vectors = utils.generate_vectors(case_param["insert_batch"], case_param["dimension"])
+                            ids = list(range(start_id, start_id + case_param["insert_batch"]))
+                            ok = milvus.insert(utils.generate_entities(self._info, vectors, ids),
+                                               collection_name=name) is not None
+                    except Exception as e:
+                        logger.debug("%s on tenant: %s failed: %s" % (op, name, str(e)))
+                        ok = False
+                    interval_time = time.time() - start_time
+                    with lock:
+                        if ok:
+                            histograms[op].record(interval_time)
+                        else:
+                            failures[op] += 1
+
+        start_time = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=case_param["concurrency"]) as executor:
+                list(executor.map(worker, range(case_param["concurrency"])))
+        finally:
+            pool.close()
+        total_time = time.time() - start_time
+        result = {"workload_time": round(total_time, 2)}
+        for op in ops:
+            result.update(latency_summary(histograms[op], "%s_time" % op))
+            result["%s_failures" % op] = failures[op]
+            result["%s_rps" % op] = round(histograms[op].count / total_time, 2) if total_time else 0.0
+        return result
+
+    def server_memory(self):
+        """ The memory (GB) of every node and their sum, None if the server does not serve the metrics """
+        try:
+            nodes = parse_nodes(self.milvus.get_metrics(SYSTEM_INFO))
+        except Exception as e:
+            logger.warning("Get metrics failed: %s" % str(e))
+            return None
+        memory = [node["memory"] for node in nodes.values() if node["memory"] is not None]
+        return {
+            "memory": round(sum(memory), 3),
+            "nodes": {name: {"type": node["type"], "memory": node["memory"]} for name, node in nodes.items()}
+        }
+
+    def run_case(self, case_metric, **case_param):
+        collection_count = case_param["collection_count"]
+        loaded_count = max(1, int(math.ceil(collection_count * case_param["loaded_fraction"])))
+        tmp_result = {"collection_count": collection_count, "loaded_count": loaded_count}
+        start_time = time.time()
+        for name, histogram in self.add_tenants(collection_count, **case_param).items():
+            tmp_result.update(latency_summary(histogram, name))
+        tmp_result["add_tenants_time"] = round(time.time() - start_time, 2)
+        tmp_result.update(latency_summary(self.load_tenants(loaded_count), "load_time"))
+        for name, histogram in self.control_plane(case_param["control_samples"]).items():
+            tmp_result.update(latency_summary(histogram, name))
+        tmp_result.update(self.workload(**case_param))
+        tmp_result["server_memory"] = self.server_memory()
+        logger.info(json.dumps({k: v for k, v in tmp_result.items() if k != "server_memory"}, default=str))
+        return tmp_result
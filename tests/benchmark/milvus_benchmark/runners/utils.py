@@ -1,9 +1,10 @@
 import os
+import mmap
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import sklearn.preprocessing
 import h5py
-import random
 from itertools import product
 
 from pymilvus import DataType
@@ -14,6 +15,7 @@ logger = logging.getLogger("milvus_benchmark.runners.utils")
 DELETE_INTERVAL_TIME = 2
 
 VECTORS_PER_FILE = 1000000
+RANDOM_BYTES_PER_FILE = 2 ** 31
 SIFT_VECTORS_PER_FILE = 100000
 BINARY_VECTORS_PER_FILE = 2000000
 
@@ -72,7 +74,11 @@ def get_len_vectors_per_file(data_type, dimension):
         elif dimension == 16384:
             vectors_per_file = 10000
         else:
-            raise Exception("dimension: %s not supported" % str(dimension))
+            # the largest power of 10 that keeps a float32 shard under RANDOM_BYTES_PER_FILE
+            vectors_per_file = RANDOM_BYTES_PER_FILE // (dimension * 4)
+            if vectors_per_file < 1:
+                raise Exception("dimension: %s not supported" % str(dimension))
+            vectors_per_file = min(VECTORS_PER_FILE, 10 ** (len(str(vectors_per_file)) - 1))
     elif data_type == "sift":
         vectors_per_file = SIFT_VECTORS_PER_FILE
     elif data_type in ["binary"]:
@@ -84,13 +90,9 @@ def get_len_vectors_per_file(data_type, dimension):
     return vectors_per_file
 
 
-def get_vectors_from_binary(nq, dimension, data_type):
-    # use the first file, nq should be less than VECTORS_PER_FILE 10001
-    if nq > MAX_NQ:
-        raise Exception("Over size nq")
-    if data_type == "local":
-        return generate_vectors(nq, dimension)
-    elif data_type == "random":
+def get_query_file_name(dimension, data_type):
+    """ Return the path of the query vectors file of the data type """
+    if data_type == "random":
         file_name = RANDOM_SRC_DATA_DIR + 'query_%d.npy' % dimension
     elif data_type == "sift":
         file_name = SIFT_SRC_DATA_DIR + 'query.npy'
@@ -100,13 +102,31 @@ def get_vectors_from_binary(nq, dimension, data_type):
         file_name = BINARY_SRC_DATA_DIR + 'query.npy'
     else:
         raise Exception("There is no corresponding file for this data type %s." % str(data_type))
+    return file_name
+
+
+def get_vectors_from_binary(nq, dimension, data_type):
+    # use the first file, nq should be less than VECTORS_PER_FILE 10001
+    if nq > MAX_NQ:
+        raise Exception("Over size nq")
+    if data_type == "local":
+        return generate_vectors(nq, dimension)
+    file_name = get_query_file_name(dimension, data_type)
     data = np.load(file_name)
     vectors = data[0:nq].tolist()
     return vectors
 
 
-def generate_vectors(nb, dim):
-    return [[random.random() for _ in range(dim)] for _ in range(nb)]
+def read_only(vectors):
+    """ Vectors as a read-only array, the slices of the cases are views sharing its memory """
+    vectors = np.asarray(vectors)
+    vectors.setflags(write=False)
+    return vectors
+
+
+def generate_vectors(nb, dim, seed=None):
+    """ Uniform float32 vectors in [0, 1), pass a seed to get the same vectors in every run """
+    return np.random.default_rng(seed).random((nb, dim), dtype=np.float32)
 
 
 def generate_values(data_type, vectors, ids):
@@ -232,6 +252,65 @@ def gen_file_name(idx, dimension, data_type):
     return fname
 
 
+def load_vectors_file(file_name, prefetch=False):
+    """
+    Memory-map a .npy shard instead of reading it into memory,
+    pages are only faulted in when the slices handed to the client are read
+    """
+    data = np.load(file_name, mmap_mode="r")
+    raw_mmap = getattr(data, "_mmap", None)
+    if raw_mmap is not None and hasattr(raw_mmap, "madvise"):
+        try:
+            raw_mmap.madvise(mmap.MADV_SEQUENTIAL)
+            raw_mmap.madvise(mmap.MADV_WILLNEED)
+        except (OSError, AttributeError) as e:
+            logger.debug("madvise not applied on %s: %s" % (file_name, str(e)))
+    if prefetch and data.size:
+        # touch one element per page so the shard is in the page cache before use
+        flat = data.reshape(-1)
+        step = max(1, mmap.PAGESIZE // data.itemsize)
+        int(np.asarray(flat[::step]).sum())
+    return data
+
+
+def as_insert_vectors(vectors, data_type=None):
+    """ Return a contiguous array view that can be passed to the client without list conversion """
+    if data_type in ["binary", "jaccard", "hamming", "sub", "super"]:
+        # binary vectors are sent as packed bytes per row
+        packed = np.ascontiguousarray(vectors, dtype=np.uint8)
+        return [row.tobytes() for row in packed]
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def iter_vector_batches(data_type, dimension, size, ni):
+    """
+    Yield (start_id, vectors) batches of ni rows read from the memory-mapped shards of data_type,
+    the next shard is mapped and prefetched on a background thread while the current one is inserted
+    """
+    vectors_per_file = get_len_vectors_per_file(data_type, dimension)
+    file_num = size // vectors_per_file
+    if vectors_per_file >= ni:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(load_vectors_file, gen_file_name(0, dimension, data_type), True)
+            for i in range(file_num):
+                data = future.result()
+                if i + 1 < file_num:
+                    future = executor.submit(load_vectors_file, gen_file_name(i + 1, dimension, data_type), True)
+                for j in range(vectors_per_file // ni):
+                    vectors = as_insert_vectors(data[j * ni:(j + 1) * ni], data_type)
+                    if len(vectors):
+                        yield i * vectors_per_file + j * ni, vectors
+                del data
+    else:
+        # a single batch spans several shards, concatenating is the only copy made
+        loops = ni // vectors_per_file
+        for i in range(0, file_num, loops):
+            shards = [load_vectors_file(gen_file_name(i + j, dimension, data_type)) for j in range(loops)]
+            vectors = as_insert_vectors(np.concatenate(shards), data_type)
+            if len(vectors):
+                yield i * vectors_per_file, vectors
+
+
 def get_recall_value(true_ids, result_ids):
     """
     Use the intersection length
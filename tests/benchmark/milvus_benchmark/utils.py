@@ -172,6 +172,53 @@ def update_dict_value(server_resource, values_dict):
     return target
 
 
+# operators of the range filters of the suites
+RANGE_OPS = {"GT": ">", "GTE": ">=", "LT": "<", "LTE": "<=", "EQ": "==", "NE": "!="}
+
+
+def range_expression(field_name, bounds):
+    """ {'GT': 1, 'LT': 5} -> 'field > 1 && field < 5' """
+    expressions = []
+    for op in sorted(bounds):
+        if op not in RANGE_OPS:
+            raise Exception("Range operator: %s not supported" % op)
+        expressions.append("%s %s %s" % (field_name, RANGE_OPS[op], str(bounds[op])))
+    return " && ".join(expressions)
+
+
+def term_expression(field_name, values):
+    """ [1, 2] -> 'field in [1, 2]' """
+    return "%s in [%s]" % (field_name, ", ".join([str(value) for value in values]))
+
+
+def filter_expression(filter_query):
+    """
+    Boolean expression of the evaluated filters of a suite, the filters are joined by &&:
+    {'range': {field: {'GT': x, 'LT': y}}}, {'term': {field: {'values': [...]}}} or {'expr': 'raw expression'}
+    return False if a filter is not supported
+    """
+    expressions = []
+    for filter in filter_query:
+        if not isinstance(filter, dict):
+            logger.error("[search_param_analysis] filter not dict: %s" % str(filter))
+            return False
+        if "range" in filter and isinstance(filter["range"], dict):
+            for field_name, bounds in filter["range"].items():
+                expressions.append(range_expression(field_name, bounds))
+        elif "term" in filter and isinstance(filter["term"], dict):
+            for field_name, term in filter["term"].items():
+                values = term["values"] if isinstance(term, dict) else term
+                expressions.append(term_expression(field_name, values))
+        elif "expr" in filter:
+            expressions.append(filter["expr"])
+        else:
+            logger.error("[search_param_analysis] filter not supported: %s" % str(filter))
+            return False
+    if len(expressions) == 1:
+        return expressions[0]
+    return " && ".join(["(%s)" % expression for expression in expressions]) if expressions else None
+
+
 def search_param_analysis(vector_query, filter_query):
     """ Search parameter adjustment, applicable pymilvus version >= 2.0.0rc7.dev24 """
 
@@ -196,27 +243,9 @@ def search_param_analysis(vector_query, filter_query):
         logger.error("[search_param_analysis] vector not dict or len != 1: %s" % str(vector))
         return False
 
-    if isinstance(filter_query, list) and len(filter_query) != 0 and "range" in filter_query[0]:
-        filter_range = filter_query[0]["range"]
-        if isinstance(filter_range, dict) and len(filter_range) == 1:
-            for key in filter_range:
-                field_name = filter_range[key]
-                expression = None
-                if 'GT' in filter_range[key]:
-                    exp1 = "%s > %s" % (field_name, str(filter_range[key]['GT']))
-                    expression = exp1
-                if 'LT' in filter_range[key]:
-                    exp2 = "%s < %s" % (field_name, str(filter_range[key]['LT']))
-                    if expression:
-                        expression = expression + ' && ' + exp2
-                    else:
-                        expression = exp2
-        else:
-            logger.error("[search_param_analysis] filter_range not dict or len != 1: %s" % str(filter_range))
-            return False
-    else:
-        # logger.debug("[search_param_analysis] range not in filter_query: %s" % str(filter_query))
-        expression = None
+    expression = filter_expression(filter_query) if filter_query else None
+    if expression is False:
+        return False
 
     result = {
         "data": data,